@@ -0,0 +1,114 @@
+"""Compare the read strategies of `hash_file` for throughput and peak RSS.
+
+Each measurement runs in a fresh interpreter, so that `ru_maxrss` reflects only
+the strategy being measured.
+
+Usage:
+    python benchmarks/bench_file_hash.py --sizes 1M,10M,100M,1G,10G
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from hashlib import md5
+from pathlib import Path
+from time import perf_counter_ns
+
+from pfmsoft_trips.snippets.hash.file_hash import hash_file
+
+STRATEGIES = ("read", "readinto")
+SIZE_SUFFIXES = {"K": 2**10, "M": 2**20, "G": 2**30}
+WRITE_CHUNK = 2**20
+
+
+def parse_size(value: str) -> int:
+    """Parse a size like `64K`, `10M` or `1G` into bytes."""
+    value = value.strip().upper()
+    if value[-1] in SIZE_SUFFIXES:
+        return int(value[:-1]) * SIZE_SUFFIXES[value[-1]]
+    return int(value)
+
+
+def make_file(directory: Path, size: int) -> Path:
+    """Write a file of `size` pseudo-random bytes."""
+    file_path = directory / f"bench_{size}.bin"
+    chunk = os.urandom(WRITE_CHUNK)
+    with open(file_path, "wb") as file_out:
+        remaining = size
+        while remaining > 0:
+            remaining -= file_out.write(chunk[: min(remaining, WRITE_CHUNK)])
+    return file_path
+
+
+def measure(file_path: Path, strategy: str, block_size: int) -> dict:
+    """Hash a file in this process and report elapsed time and peak RSS."""
+    start = perf_counter_ns()
+    hash_file(file_path, md5(), block_size=block_size, strategy=strategy)  # type: ignore[arg-type]
+    elapsed_ns = perf_counter_ns() - start
+    # ru_maxrss is KiB on Linux.
+    maxrss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"elapsed_ns": elapsed_ns, "maxrss_kib": maxrss_kib}
+
+
+def run_child(file_path: Path, strategy: str, block_size: int) -> dict:
+    """Run `measure` in a fresh interpreter."""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--child",
+            str(file_path),
+            strategy,
+            str(block_size),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main() -> None:
+    """Print a table of throughput and peak RSS, per size and strategy."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1M,10M,100M,1G,10G")
+    parser.add_argument("--block-size", default="64K")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", type=Path, default=None)
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path_str, strategy, block_size = args.child
+        print(json.dumps(measure(Path(path_str), strategy, int(block_size))))
+        return
+
+    block_size = parse_size(args.block_size)
+    print(f"{'size':>8} {'strategy':>9} {'MB/s':>10} {'peak RSS MiB':>13}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as temp_dir:
+        for size_str in args.sizes.split(","):
+            size = parse_size(size_str)
+            file_path = make_file(Path(temp_dir), size)
+            # Warm the page cache so the strategies are compared on equal terms.
+            run_child(file_path, "read", block_size)
+            for strategy in STRATEGIES:
+                runs = [
+                    run_child(file_path, strategy, block_size)
+                    for _ in range(args.repeat)
+                ]
+                best_ns = min(run["elapsed_ns"] for run in runs)
+                peak_kib = max(run["maxrss_kib"] for run in runs)
+                throughput = size / 2**20 / (best_ns / 1e9)
+                print(
+                    f"{size_str:>8} {strategy:>9} {throughput:>10.1f}"
+                    f" {peak_kib / 1024:>13.1f}"
+                )
+            file_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare the memory used to hold hashed file results, per store.
+
+Each store runs in a fresh interpreter and is measured with tracemalloc, so one
+store's garbage does not count against the next.
+
+Usage:
+    python benchmarks/bench_result_store.py --count 1000000
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tracemalloc
+from collections.abc import Sized
+from hashlib import md5
+from pathlib import Path
+from time import perf_counter_ns
+
+from pfmsoft_trips.snippets.hash.file_hash import hashed_file_result_factory
+from pfmsoft_trips.snippets.hash.hashed_file_table import (
+    HashedFileTable,
+    compact_hashed_file_result_factory,
+)
+
+STORES = ("HashedFile", "CompactHashedFile", "HashedFileTable")
+
+
+def fake_results(count: int):
+    """Yield (path, hex digest) pairs, shaped like a real tree of files."""
+    for index in range(count):
+        file_path = Path(f"/data/archive/{index // 10_000:04d}/{index // 100:06d}")
+        yield file_path / f"file_{index:08d}.bin", md5(str(index).encode()).hexdigest()
+
+
+def measure(store: str, count: int) -> dict:
+    """Build one store in this process and report its memory use."""
+    tracemalloc.start()
+    start = perf_counter_ns()
+    results: Sized
+    if store == "HashedFileTable":
+        results = HashedFileTable("md5")
+        for file_path, file_hash in fake_results(count):
+            results.append(file_path, file_hash)
+    else:
+        factory = (
+            hashed_file_result_factory
+            if store == "HashedFile"
+            else compact_hashed_file_result_factory
+        )
+        results = [
+            factory(file_path, file_hash, "md5")
+            for file_path, file_hash in fake_results(count)
+        ]
+    elapsed_ns = perf_counter_ns() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(results) == count
+    return {"elapsed_ns": elapsed_ns, "current": current, "peak": peak}
+
+
+def run_child(store: str, count: int) -> dict:
+    """Run `measure` in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", store, str(count)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main() -> None:
+    """Print a table of the memory used by each store, for `--count` results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        store, count = args.child
+        print(json.dumps(measure(store, int(count))))
+        return
+
+    print(f"{'store':>18} {'MiB':>10} {'peak MiB':>10} {'bytes/file':>11} {'s':>7}")
+    for store in STORES:
+        result = run_child(store, args.count)
+        print(
+            f"{store:>18} {result['current'] / 2**20:>10.1f}"
+            f" {result['peak'] / 2**20:>10.1f}"
+            f" {result['current'] / args.count:>11.1f}"
+            f" {result['elapsed_ns'] / 1e9:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
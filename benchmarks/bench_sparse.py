@@ -0,0 +1,92 @@
+"""Compare the read strategies of `hash_file` on a generated sparse file.
+
+The file is mostly holes, with `--extents` pseudo-random extents spread evenly
+through it that add up to `--data` of its logical size. Throughput is of the
+logical size, so the strategies that read the holes and "sparse", which only
+hashes them, are compared on equal terms.
+
+Usage:
+    python benchmarks/bench_sparse.py --size 4G --data 0.01 --algos md5,blake2b
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from bench_file_hash import parse_size
+from bench_suite import best_ns
+from pfmsoft_trips.snippets.hash.file_hash import (
+    SPARSE_SUPPORTED,
+    hash_file,
+    sparse_file_stats,
+)
+
+STRATEGIES = ("readinto", "mmap", "sparse")
+
+
+def make_sparse_file(
+    directory: Path, size: int, data_fraction: float, extents: int
+) -> Path:
+    """Write a sparse file of `size` bytes, with `extents` extents of data."""
+    file_path = directory / f"sparse_{size}.bin"
+    extent_size = int(size * data_fraction) // extents
+    stride = size // extents
+    with open(file_path, "wb") as file_out:
+        file_out.truncate(size)
+        for index in range(extents):
+            file_out.seek(index * stride + stride // 2)
+            file_out.write(os.urandom(extent_size))
+    return file_path
+
+
+def hash_once(file_path: Path, algo: str, block_size: int, strategy: str) -> None:
+    """Hash a file once, with a new hasher."""
+    hash_file(
+        file_path,
+        hashlib.new(algo),
+        block_size=block_size,
+        strategy=strategy,  # type: ignore[arg-type]
+    )
+
+
+def main() -> int:
+    """Print the throughput per algo and strategy, or return 1 without SEEK_DATA."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="1G")
+    parser.add_argument("--data", type=float, default=0.01)
+    parser.add_argument("--extents", type=int, default=16)
+    parser.add_argument("--block-size", default="64K")
+    parser.add_argument("--algos", default="md5,blake2b")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", type=Path, default=None)
+    args = parser.parse_args()
+
+    if not SPARSE_SUPPORTED:
+        print("SEEK_DATA is not supported on this platform.", file=sys.stderr)
+        return 1
+    block_size = parse_size(args.block_size)
+    with tempfile.TemporaryDirectory(dir=args.dir) as temp_dir:
+        file_path = make_sparse_file(
+            Path(temp_dir), parse_size(args.size), args.data, args.extents
+        )
+        stats = sparse_file_stats(file_path)
+        print(
+            f"{stats.logical_bytes} logical bytes, {stats.allocated_bytes} allocated,"
+            f" {stats.data_bytes} data in {stats.extents} extents"
+        )
+        print(f"{'algo':>8} {'strategy':>9} {'MB/s':>10}")
+        for algo in args.algos.split(","):
+            for strategy in STRATEGIES:
+                run = partial(hash_once, file_path, algo, block_size, strategy)
+                elapsed_ns = best_ns(run, args.repeat)
+                throughput = stats.logical_bytes / 2**20 / (elapsed_ns / 1e9)
+                print(f"{algo:>8} {strategy:>9} {throughput:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
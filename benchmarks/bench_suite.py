@@ -0,0 +1,213 @@
+"""Benchmark the hash functions and the CLI, and compare against a baseline.
+
+Measures `hash_file`, `hash_binary_file` and `bytes_iterator_hash` across file
+sizes, block sizes and algorithms, plus end to end `pfmsoft-trips_typer
+hash-md5` runs. `chunk_file` measures hashing and content defined chunking in
+the same read pass. Each result is the best throughput of `--repeat` runs, on a
+warm page cache.
+
+The default sizes stop at 100M. A 1G size is opt-in: with the default algos,
+block sizes and repeats, every function reads it 27 times, which takes minutes
+rather than seconds. Add it to `--sizes` on a quiet machine, as below.
+
+Results are written as JSON. Given a baseline from an earlier run, any result
+slower than the baseline by more than `--threshold` is reported, and the exit
+code is 1. Baselines are only comparable on the same machine.
+
+Usage:
+    python benchmarks/bench_suite.py --save benchmarks/baseline.json
+    python benchmarks/bench_suite.py --compare benchmarks/baseline.json
+    python benchmarks/bench_suite.py --sizes 64K,1M,1G --algos md5,blake2b
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections.abc import Callable, Iterator
+from datetime import UTC, datetime
+from functools import partial
+from pathlib import Path
+from time import perf_counter_ns
+
+from bench_file_hash import make_file, parse_size
+from pfmsoft_trips.snippets.hash.bytes_iterator_hash import bytes_iterator_hash
+from pfmsoft_trips.snippets.hash.chunking import chunk_file
+from pfmsoft_trips.snippets.hash.file_hash import hash_binary_file, hash_file
+
+CLI_NAME = "pfmsoft-trips_typer"
+
+
+def best_ns(run: Callable[[], object], repeat: int) -> int:
+    """The fastest of `repeat` calls, in nanoseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        run()
+        timings.append(perf_counter_ns() - start)
+    return min(timings)
+
+
+def iter_file_blocks(file_path: Path, block_size: int) -> Iterator[bytes]:
+    """The blocks of a file, as fed to `bytes_iterator_hash`."""
+    with open(file_path, "rb") as file_in:
+        while block := file_in.read(block_size):
+            yield block
+
+
+def hash_file_once(file_path: Path, algo: str, block_size: int) -> None:
+    """Hash a file once with `hash_file`, with a new hasher."""
+    hash_file(file_path, hashlib.new(algo), block_size=block_size)
+
+
+def hash_binary_file_once(file_path: Path, algo: str, block_size: int) -> None:
+    """Hash a file once with `hash_binary_file`, with a new hasher."""
+    with open(file_path, "rb") as file_in:
+        hash_binary_file(file_in, hashlib.new(algo), block_size)
+
+
+def bytes_iterator_hash_once(file_path: Path, algo: str, block_size: int) -> None:
+    """Hash a file once with `bytes_iterator_hash`, with a new hasher."""
+    bytes_iterator_hash(iter_file_blocks(file_path, block_size), hashlib.new(algo))
+
+
+def chunk_file_once(file_path: Path, algo: str, block_size: int) -> None:
+    """Hash and chunk a file once with `chunk_file`."""
+    chunk_file(file_path, algo, block_size, strategy="read")
+
+
+FUNCTIONS: dict[str, Callable[[Path, str, int], None]] = {
+    "hash_file": hash_file_once,
+    "hash_binary_file": hash_binary_file_once,
+    "bytes_iterator_hash": bytes_iterator_hash_once,
+    "chunk_file": chunk_file_once,
+}
+
+
+def run_command(command: list[str]) -> None:
+    """Run a command once, checking that it succeeds."""
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def cli_command() -> list[str]:
+    """The installed console script, or the module if it is not on PATH."""
+    script = shutil.which(CLI_NAME)
+    if script is not None:
+        return [script]
+    return [sys.executable, "-m", "pfmsoft_trips.cli.main_typer"]
+
+
+def run_benchmarks(
+    file_paths: dict[str, Path],
+    algos: list[str],
+    block_sizes: list[str],
+    repeat: int,
+    cli: bool,
+) -> dict[str, dict]:
+    """Run every benchmark, keyed by `function/algo/block size/file size`."""
+    results: dict[str, dict] = {}
+
+    def record(key: str, size: int, elapsed_ns: int) -> None:
+        throughput = size / 2**20 / (max(elapsed_ns, 1) / 1e9)
+        results[key] = {"size": size, "best_ns": elapsed_ns, "mb_per_s": throughput}
+        print(f"{key:<50} {throughput:>10.1f} MB/s", file=sys.stderr)
+
+    for size_str, file_path in file_paths.items():
+        size = file_path.stat().st_size
+        for algo in algos:
+            for block_str in block_sizes:
+                block_size = parse_size(block_str)
+                suffix = f"{algo}/{block_str}/{size_str}"
+                for name, function in FUNCTIONS.items():
+                    run = partial(function, file_path, algo, block_size)
+                    record(f"{name}/{suffix}", size, best_ns(run, repeat))
+        if cli:
+            command = [*cli_command(), "hash-md5", "--no-cache", str(file_path)]
+            run = partial(run_command, command)
+            record(f"cli/hash-md5/{size_str}", size, best_ns(run, repeat))
+    return results
+
+
+def compare(
+    baseline: dict[str, dict], current: dict[str, dict], threshold: float
+) -> list[str]:
+    """List the results slower than the baseline by more than `threshold`."""
+    regressions = []
+    for key, result in current.items():
+        if key not in baseline:
+            continue
+        ratio = result["mb_per_s"] / baseline[key]["mb_per_s"]
+        if ratio < 1 - threshold:
+            regressions.append(
+                f"{key}: {result['mb_per_s']:.1f} MB/s, baseline"
+                f" {baseline[key]['mb_per_s']:.1f} MB/s ({ratio - 1:+.1%})"
+            )
+    return regressions
+
+
+def main() -> int:
+    """Run the suite, returning 1 if there are regressions against `--compare`."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default="64K,1M,100M", help="File sizes, add 1G for a long run."
+    )
+    parser.add_argument("--block-sizes", default="4K,64K,1M")
+    parser.add_argument("--algos", default="md5,sha256,blake2b")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-cli", dest="cli", action="store_false")
+    parser.add_argument("--dir", type=Path, default=None)
+    parser.add_argument("--save", type=Path, help="Write the results here.")
+    parser.add_argument("--compare", type=Path, help="A baseline to compare to.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="The allowed slowdown, as a fraction. Defaults to 0.10.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as temp_dir:
+        file_paths = {
+            size_str: make_file(Path(temp_dir), parse_size(size_str))
+            for size_str in args.sizes.split(",")
+        }
+        results = run_benchmarks(
+            file_paths,
+            algos=args.algos.split(","),
+            block_sizes=args.block_sizes.split(","),
+            repeat=args.repeat,
+            cli=args.cli,
+        )
+    document = {
+        "created": datetime.now(UTC).isoformat(),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.save is not None:
+        args.save.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    if args.compare is None:
+        return 0
+    baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+    regressions = compare(baseline["results"], results, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    print(
+        f"{len(regressions)} regression(s) above {args.threshold:.0%} against"
+        f" {args.compare}",
+        file=sys.stderr,
+    )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -36,6 +36,17 @@ def tests(session: nox.Session):
     session.run("pytest")
 
 
+@nox.session(default=False)
+def benchmarks(session: nox.Session) -> None:
+    """
+    Run the benchmark suite, arguments after -- are passed on.
+
+    e.g. nox -s benchmarks -- --compare benchmarks/baseline.json
+    """
+    session.install(".")
+    session.run("python", "benchmarks/bench_suite.py", *session.posargs)
+
+
 # It's a good idea to keep your dev session out of the default list
 # so it's not run twice accidentally
 @nox.session(default=False)
@@ -1,37 +1,1006 @@
-"""Command-line interface."""
+"""Command-line interface.
 
-from hashlib import md5
+The hashing modules are imported inside the commands that use them, so that
+`--help`, and commands that do not need them, start quickly.
+"""
+
+import sys
+from contextlib import nullcontext
+from enum import StrEnum
 from pathlib import Path
 from time import perf_counter_ns
 from typing import Annotated
 
 import typer
-from pfmsoft_trips.snippets.hash.file_hash import hash_file
+from pfmsoft_trips.cli.manifest_typer import app as manifest_app
+from pfmsoft_trips.cli.options import (
+    DEFAULT_BLOCK_SIZE_FILE,
+    DEFAULT_CACHE_FILE,
+    DEFAULT_CHUNK_INDEX_FILE,
+    DEFAULT_MERKLE_CHUNK_SIZE,
+    AlgoOption,
+    BlockSizeFileOption,
+    BlockSizeOption,
+    CacheFileOption,
+    CacheOption,
+    CacheStatsOption,
+    ChunkIndexFileOption,
+    IoPolicyChoice,
+    IoPolicyOption,
+    JournalOption,
+    ProcessesOption,
+    RefreshOption,
+    ResumeOption,
+    ShowBlockSizeOption,
+    WorkersOption,
+    block_size_tuning,
+    digest_cache,
+    expand_paths,
+    hash_journal,
+    parse_size,
+    read_path_list,
+    validate_hash_method_list,
+    validate_size,
+)
+from pfmsoft_trips.cli.profiling import ProfilerChoice, start_profiling
+
+DEBUG_HANDLER_NAME = "pfmsoft_trips_cli_debug"
+
+
+def _enable_debug_logging():
+    """Send the package's debug logging to stderr."""
+    import logging
+
+    package_logger = logging.getLogger("pfmsoft_trips")
+    # Replace rather than reuse, the handler binds to the current sys.stderr.
+    for handler in list(package_logger.handlers):
+        if handler.get_name() == DEBUG_HANDLER_NAME:
+            package_logger.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.set_name(DEBUG_HANDLER_NAME)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s: %(message)s"))
+    package_logger.addHandler(handler)
+    package_logger.setLevel(logging.DEBUG)
+
+
+def _enable_metrics_logging(ctx: typer.Context, metrics_file: Path):
+    """
+    Write a JSON line per hashed file, from a background thread.
+
+    The queue is a multiprocessing queue, so that process pool workers can log
+    to it too, see :func:`_pool_logging`.
+    """
+    import logging
+
+    from pfmsoft_trips.snippets.hash.file_hash import metrics_logger
+    from pfmsoft_trips.snippets.logging.logging import (
+        QueueLogging,
+        json_lines_file_handler,
+    )
+
+    handler = json_lines_file_handler(
+        metrics_file.parent, metrics_file.name, logging.INFO
+    )
+    queue_logging = QueueLogging([handler], multiprocess=True)
+    queue_logging.start()
+    ctx.obj["METRICS_LOGGING"] = queue_logging
+    metrics_logger.addHandler(queue_logging.handler)
+    metrics_logger.setLevel(logging.INFO)
+
+    def stop():
+        queue_logging.stop()
+        metrics_logger.removeHandler(queue_logging.handler)
+        metrics_logger.setLevel(logging.WARNING)
+        handler.close()
+
+    ctx.call_on_close(stop)
+
+
+def _pool_logging(ctx: typer.Context, processes: bool) -> dict:
+    """The pool `initializer` and `initargs` that send worker metrics back."""
+    queue_logging = ctx.obj.get("METRICS_LOGGING")
+    if not processes or queue_logging is None:
+        return {}
+    import logging
+
+    from pfmsoft_trips.snippets.hash.file_hash import metrics_logger
+    from pfmsoft_trips.snippets.logging.logging import init_queue_logging_worker
+
+    return {
+        "initializer": init_queue_logging_worker,
+        "initargs": (*queue_logging.worker_initargs, metrics_logger.name, logging.INFO),
+    }
+
+
+def _enable_stats(ctx: typer.Context, stats_json: Path | None, verbosity: int):
+    """Time the hashing phases, and report them when the command is done."""
+    import json
+
+    from pfmsoft_trips.snippets.hash.instrument import (
+        HashStats,
+        start_stats,
+        stop_stats,
+    )
+
+    start_stats(HashStats(start_ns=ctx.obj["START_TIME"]))
+    ctx.obj["STATS_JSON"] = stats_json
+
+    def report():
+        stats = stop_stats()
+        if stats is None:
+            return
+        summary = stats.summary()
+        if verbosity >= 2:
+            typer.echo(
+                f"{summary['files']} files, {summary['bytes']} bytes,"
+                f" {summary['cache_hits']} cache hits in"
+                f" {summary['total_ns'] / 1e9:.3f}s: {summary['files_per_s']:.1f}"
+                f" files/s, {summary['mb_per_s']:.1f} MB/s",
+                err=True,
+            )
+            phases = ", ".join(
+                f"{phase} {summary[f'{phase}_ns'] / 1e6:.1f}ms"
+                for phase in ("startup", "open", "read", "update", "output")
+            )
+            typer.echo(f"Phases: {phases}", err=True)
+        if stats_json is not None:
+            with open(stats_json, "w", encoding="utf-8") as json_out:
+                json.dump(summary, json_out, indent=2)
+
+    ctx.call_on_close(report)
+
+
+def _check_stats_pool(ctx: typer.Context, processes: bool) -> None:
+    """Refuse --stats-json with --processes, the workers are not timed."""
+    from pfmsoft_trips.snippets.hash.instrument import active_stats, stop_stats
+
+    if not processes or active_stats() is None:
+        return
+    if ctx.obj.get("STATS_JSON") is not None:
+        stop_stats()
+        raise typer.BadParameter(
+            "Files hashed with --processes are not counted, use --threads.",
+            param_hint="--stats-json",
+        )
+    typer.echo("Files hashed with --processes are not counted in the stats.", err=True)
 
 
 def default_options(
     ctx: typer.Context,
     debug: Annotated[bool, typer.Option(help="Enable debug output.")] = False,
     verbosity: Annotated[int, typer.Option("-v", help="Verbosity.", count=True)] = 1,
+    metrics_file: Annotated[
+        Path | None,
+        typer.Option(
+            help="Append a JSON line per hashed file, with its size, digest and "
+            "timing. A .jsonl suffix is added if missing.",
+            dir_okay=False,
+        ),
+    ] = None,
+    stats_json: Annotated[
+        Path | None,
+        typer.Option(
+            help="Write timings, file and byte counts, and rates as JSON. "
+            "They are also printed to stderr with -vv.",
+            dir_okay=False,
+        ),
+    ] = None,
+    profile: Annotated[
+        Path | None,
+        typer.Option(
+            help="Profile the command, saving a pstats file here and printing the "
+            "hottest functions to stderr. Only the main thread is profiled.",
+            dir_okay=False,
+        ),
+    ] = None,
+    profiler: Annotated[
+        ProfilerChoice,
+        typer.Option(help="The profiler, auto uses pyinstrument if installed."),
+    ] = ProfilerChoice.auto,
+    profile_top: Annotated[
+        int, typer.Option(help="The number of functions to print.", min=1)
+    ] = 20,
 ):
     """Hash a file."""
 
     ctx.ensure_object(dict)
     ctx.obj["START_TIME"] = perf_counter_ns()
     ctx.obj["DEBUG"] = debug
+    if profile is not None:
+        start_profiling(ctx, profile, profiler, profile_top)
+    if debug:
+        _enable_debug_logging()
+    if metrics_file is not None:
+        _enable_metrics_logging(ctx, metrics_file)
+    if stats_json is not None or verbosity >= 2:
+        _enable_stats(ctx, stats_json, verbosity)
     typer.echo(f"Verbosity: {verbosity}")
     ctx.obj["VERBOSITY"] = verbosity
 
 
 app = typer.Typer(callback=default_options)
+app.add_typer(manifest_app, name="manifest")
 
 
 @app.command()
 def hash_md5(
-    ctx: typer.Context, path_in: Annotated[Path, typer.Argument(help="file to hash.")]
+    ctx: typer.Context,
+    path_in: Annotated[
+        Path | None,
+        typer.Argument(help="file to hash, or - to hash stdin.", allow_dash=True),
+    ] = None,
+    files_from: Annotated[
+        Path | None,
+        typer.Option(
+            help="Hash the files listed in this file, or - for stdin. The list is "
+            "NUL or newline separated, e.g. from `find -print0`.",
+            allow_dash=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    tee: Annotated[
+        Path | None,
+        typer.Option(help="With -, also copy stdin to this file while hashing it."),
+    ] = None,
+    throughput: Annotated[
+        bool,
+        typer.Option(help="With -, print the bytes hashed and throughput to stderr."),
+    ] = False,
+    use_mmap: Annotated[
+        bool | None,
+        typer.Option(
+            "--mmap/--no-mmap",
+            help="Force or disable memory mapped reads. Chosen by file size if unset.",
+        ),
+    ] = None,
+    allocation: Annotated[
+        bool,
+        typer.Option(
+            help="Print the logical, allocated and data bytes of each file to "
+            "stderr. Holes in sparse files are hashed without being read."
+        ),
+    ] = False,
+    use_cache: CacheOption = True,
+    refresh: RefreshOption = False,
+    cache_file: CacheFileOption = DEFAULT_CACHE_FILE,
+    cache_stats: CacheStatsOption = False,
+    block_size: BlockSizeOption = "64K",
+    block_size_file: BlockSizeFileOption = DEFAULT_BLOCK_SIZE_FILE,
+    show_block_size: ShowBlockSizeOption = False,
+    io_policy: IoPolicyOption = IoPolicyChoice.default,
 ):
-    hashcode = hash_file(path_in, md5())
-    typer.echo(f"{hashcode}  {path_in.name}")
+    """Hash a file, or a list of files, printing md5sum style lines."""
+    from hashlib import md5
+
+    from pfmsoft_trips.snippets.hash.file_hash import (
+        StreamStats,
+        hash_stream,
+        make_hashed_file,
+        sparse_file_stats,
+    )
+    from pfmsoft_trips.snippets.hash.instrument import timed_phase
+
+    def echo_allocation(file_path: Path) -> None:
+        stats = sparse_file_stats(file_path)
+        typer.echo(
+            f"{file_path}: {stats.logical_bytes} bytes, {stats.allocated_bytes}"
+            f" allocated, {stats.data_bytes} data in {stats.extents} extents",
+            err=True,
+        )
+
+    if (path_in is None) == (files_from is None):
+        raise typer.BadParameter("Give either a file to hash, or --files-from.")
+    if str(path_in) == "-":
+        stats = StreamStats()
+        with open(tee, "wb") if tee is not None else nullcontext() as tee_out:
+            file_hash = hash_stream(sys.stdin.buffer, md5(), tee=tee_out, stats=stats)
+        typer.echo(f"{file_hash}  -")
+        if throughput:
+            typer.echo(
+                f"{stats.bytes_read} bytes in {stats.elapsed_ns / 1e9:.3f}s,"
+                f" {stats.throughput:.1f} MB/s",
+                err=True,
+            )
+        return
+    if use_mmap is None:
+        strategy = "auto"
+    else:
+        strategy = "mmap" if use_mmap else "readinto"
+    with (
+        block_size_tuning(block_size, block_size_file, show_block_size) as size,
+        digest_cache(use_cache, refresh, cache_file, cache_stats) as cache,
+    ):
+        if path_in is not None:
+            result = make_hashed_file(
+                path_in,
+                md5(),
+                block_size=size,
+                strategy=strategy,
+                cache=cache,
+                io_policy=io_policy.value,
+            )
+            with timed_phase("output"):
+                typer.echo(f"{result.file_hash}  {path_in.name}")
+            if allocation:
+                echo_allocation(path_in)
+            return
+        failed = 0
+        # One buffer for every file, unless the block size varies by device.
+        buffer = bytearray(size) if size != "auto" else None
+        with (
+            open(files_from, "rb")
+            if str(files_from) != "-"
+            else nullcontext(sys.stdin.buffer)
+        ) as list_in:
+            for file_path in read_path_list(list_in):
+                try:
+                    result = make_hashed_file(
+                        file_path,
+                        md5(),
+                        block_size=size,
+                        strategy=strategy,
+                        buffer=buffer,
+                        cache=cache,
+                        io_policy=io_policy.value,
+                    )
+                except OSError as error:
+                    failed += 1
+                    typer.echo(f"{file_path}: {error}", err=True)
+                    continue
+                with timed_phase("output"):
+                    typer.echo(f"{result.file_hash}  {file_path}")
+                if allocation:
+                    echo_allocation(file_path)
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def hash_files(
+    ctx: typer.Context,
+    paths_in: Annotated[
+        list[Path], typer.Argument(help="Files, or directories to hash recursively.")
+    ],
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    processes: ProcessesOption = False,
+    ordered: Annotated[
+        bool,
+        typer.Option(help="Output in input order instead of completion order."),
+    ] = False,
+    use_cache: CacheOption = True,
+    refresh: RefreshOption = False,
+    cache_file: CacheFileOption = DEFAULT_CACHE_FILE,
+    cache_stats: CacheStatsOption = False,
+    block_size: BlockSizeOption = "64K",
+    block_size_file: BlockSizeFileOption = DEFAULT_BLOCK_SIZE_FILE,
+    show_block_size: ShowBlockSizeOption = False,
+    journal_file: JournalOption = None,
+    resume: ResumeOption = False,
+    io_policy: IoPolicyOption = IoPolicyChoice.default,
+):
+    """Hash many files concurrently, printing md5sum style lines."""
+    _check_stats_pool(ctx, processes)
+    from functools import partial
+
+    from pfmsoft_trips.snippets.hash.instrument import timed_phase
+    from pfmsoft_trips.snippets.hash.parallel_hash import (
+        hash_file_job,
+        hash_files_concurrently,
+    )
+
+    failed = 0
+
+    def report_error(file_path: Path, error: BaseException):
+        nonlocal failed
+        failed += 1
+        typer.echo(f"{file_path}: {error}", err=True)
+
+    with (
+        hash_journal(journal_file, resume, algo) as journal,
+        block_size_tuning(block_size, block_size_file, show_block_size) as size,
+        digest_cache(use_cache, refresh, cache_file, cache_stats) as cache,
+    ):
+        file_paths = expand_paths(paths_in)
+        if journal is not None:
+            for completed in journal.completed:
+                typer.echo(f"{completed.file_hash}  {completed.file_path}")
+            file_paths = journal.pending(file_paths)
+        results = hash_files_concurrently(
+            file_paths,
+            hash_method=algo,
+            max_workers=workers,
+            pool="process" if processes else "thread",
+            ordered=ordered,
+            block_size=size,
+            on_error=report_error,
+            cache=cache,
+            job=partial(hash_file_job, io_policy=io_policy.value),
+            **_pool_logging(ctx, processes),
+        )
+        if journal is not None:
+            results = journal.record(results)
+        for result in results:
+            with timed_phase("output"):
+                typer.echo(f"{result.file_hash}  {result.file_path}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command(name="hash")
+def hash_multi(
+    ctx: typer.Context,
+    paths_in: Annotated[
+        list[Path], typer.Argument(help="Files, or directories to hash recursively.")
+    ],
+    algo: Annotated[
+        str,
+        typer.Option(
+            help="Comma separated hash algorithms, e.g. md5,sha256,blake2b.",
+            callback=validate_hash_method_list,
+        ),
+    ] = "md5",
+):
+    """Compute several digests per file from a single read, as BSD style tags."""
+    import hashlib
+
+    from pfmsoft_trips.snippets.hash.file_hash import make_multi_hashed_file
+
+    hash_methods = algo.split(",")
+    buffer = bytearray(2**10 * 64)
+    failed = 0
+    for file_path in expand_paths(paths_in):
+        try:
+            result = make_multi_hashed_file(
+                file_path,
+                [hashlib.new(hash_method) for hash_method in hash_methods],
+                strategy="auto",
+                buffer=buffer,
+            )
+        except OSError as error:
+            failed += 1
+            typer.echo(f"{file_path}: {error}", err=True)
+            continue
+        for hash_method, file_hash in result.file_hashes.items():
+            typer.echo(f"{hash_method.upper()} ({file_path}) = {file_hash}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+class SymlinkChoice(StrEnum):
+    """The symlink policies of :func:`tree_walk.walk_entries`."""
+
+    skip = "skip"
+    files = "files"
+    follow = "follow"
+
+
+@app.command(name="hash-tree")
+def hash_tree_command(
+    ctx: typer.Context,
+    roots: Annotated[
+        list[Path],
+        typer.Argument(help="Directories to hash.", exists=True, file_okay=False),
+    ],
+    include: Annotated[
+        list[str] | None,
+        typer.Option(help="Only hash files matching this glob. Repeatable."),
+    ] = None,
+    exclude: Annotated[
+        list[str] | None,
+        typer.Option(help="Skip files and directories matching this glob. Repeatable."),
+    ] = None,
+    symlinks: Annotated[
+        SymlinkChoice,
+        typer.Option(help="Skip symlinks, follow links to files only, or follow all."),
+    ] = SymlinkChoice.skip,
+    min_size: Annotated[
+        int | None, typer.Option(help="Skip files smaller than this, in bytes.")
+    ] = None,
+    max_size: Annotated[
+        int | None, typer.Option(help="Skip files larger than this, in bytes.")
+    ] = None,
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    processes: ProcessesOption = False,
+    use_cache: CacheOption = True,
+    refresh: RefreshOption = False,
+    cache_file: CacheFileOption = DEFAULT_CACHE_FILE,
+    cache_stats: CacheStatsOption = False,
+    block_size: BlockSizeOption = "64K",
+    block_size_file: BlockSizeFileOption = DEFAULT_BLOCK_SIZE_FILE,
+    show_block_size: ShowBlockSizeOption = False,
+    journal_file: JournalOption = None,
+    resume: ResumeOption = False,
+    io_policy: IoPolicyOption = IoPolicyChoice.default,
+):
+    """Walk directory trees and hash the files, printing md5sum style lines."""
+    _check_stats_pool(ctx, processes)
+    from functools import partial
+
+    from pfmsoft_trips.snippets.hash.instrument import timed_phase
+    from pfmsoft_trips.snippets.hash.parallel_hash import hash_file_job
+    from pfmsoft_trips.snippets.hash.tree_walk import hash_tree
+
+    failed = 0
+
+    def report_error(file_path: Path, error: BaseException):
+        nonlocal failed
+        failed += 1
+        typer.echo(f"{file_path}: {error}", err=True)
+
+    with (
+        hash_journal(journal_file, resume, algo) as journal,
+        block_size_tuning(block_size, block_size_file, show_block_size) as size,
+        digest_cache(use_cache, refresh, cache_file, cache_stats) as cache,
+    ):
+        if journal is not None:
+            for completed in journal.completed:
+                typer.echo(f"{completed.file_hash}  {completed.file_path}")
+        for root in roots:
+            results = hash_tree(
+                root,
+                hash_method=algo,
+                include=include or (),
+                exclude=exclude or (),
+                symlinks=symlinks.value,
+                min_size=min_size,
+                max_size=max_size,
+                max_workers=workers,
+                pool="process" if processes else "thread",
+                block_size=size,
+                on_error=report_error,
+                cache=cache,
+                skip_paths=journal if journal is not None else (),
+                job=partial(hash_file_job, io_policy=io_policy.value),
+                **_pool_logging(ctx, processes),
+            )
+            if journal is not None:
+                results = journal.record(results)
+            for result in results:
+                with timed_phase("output"):
+                    typer.echo(f"{result.file_hash}  {result.file_path}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+class DuplicateFormat(StrEnum):
+    """The output formats of the `dedupe` report."""
+
+    json = "json"
+    csv = "csv"
+
+
+@app.command()
+def dedupe(
+    ctx: typer.Context,
+    roots: Annotated[
+        list[Path],
+        typer.Argument(help="Directories to search.", exists=True, file_okay=False),
+    ],
+    output_format: Annotated[
+        DuplicateFormat, typer.Option("--format", help="The output format.")
+    ] = DuplicateFormat.json,
+    output: Annotated[
+        Path | None,
+        typer.Option("--output", "-o", help="Write the report here, not stdout."),
+    ] = None,
+    edge_size: Annotated[
+        int,
+        typer.Option(help="Bytes compared at each end of a file before a full hash."),
+    ] = 2**10 * 64,
+    min_size: Annotated[
+        int, typer.Option(help="Ignore files smaller than this, in bytes.")
+    ] = 1,
+    include: Annotated[
+        list[str] | None,
+        typer.Option(help="Only consider files matching this glob. Repeatable."),
+    ] = None,
+    exclude: Annotated[
+        list[str] | None,
+        typer.Option(help="Skip files and directories matching this glob. Repeatable."),
+    ] = None,
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    processes: ProcessesOption = False,
+):
+    """Find duplicate files, by size, then partial hash, then full hash."""
+    _check_stats_pool(ctx, processes)
+    from pfmsoft_trips.snippets.hash.dedupe import (
+        DedupeStats,
+        find_duplicates,
+        reclaimable_bytes,
+        write_duplicates_csv,
+        write_duplicates_json,
+    )
+
+    stats = DedupeStats()
+    groups = find_duplicates(
+        roots,
+        hash_method=algo,
+        edge_size=edge_size,
+        min_size=min_size,
+        include=include or (),
+        exclude=exclude or (),
+        max_workers=workers,
+        pool="process" if processes else "thread",
+        stats=stats,
+    )
+    writer = (
+        write_duplicates_json
+        if output_format is DuplicateFormat.json
+        else write_duplicates_csv
+    )
+    if output is None:
+        writer(groups, sys.stdout)
+    else:
+        with open(output, "w", encoding="utf-8", newline="") as report_out:
+            writer(groups, report_out)
+    for file_path, error in stats.errors:
+        typer.echo(f"{file_path}: {error}", err=True)
+    typer.echo(
+        f"{len(groups)} duplicate groups, {reclaimable_bytes(groups)} bytes"
+        f" reclaimable. {stats.files_seen} files seen, {stats.edge_hashed}"
+        f" partially hashed, {stats.full_hashed} fully hashed.",
+        err=True,
+    )
+    if stats.errors:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def merkle_hash(
+    ctx: typer.Context,
+    path_in: Annotated[
+        Path, typer.Argument(help="File to hash.", exists=True, dir_okay=False)
+    ],
+    record: Annotated[
+        Path | None,
+        typer.Option(help="Save the chunk digests here, for merkle-verify."),
+    ] = None,
+    chunk_size: Annotated[
+        int, typer.Option(help="The size of the chunks hashed in parallel.", min=1)
+    ] = DEFAULT_MERKLE_CHUNK_SIZE,
+    algo: AlgoOption = "blake2b",
+    workers: WorkersOption = None,
+):
+    """Hash one large file in parallel chunks, as a Merkle tree.
+
+    The root digest is not the plain digest of the file.
+    """
+    from pfmsoft_trips.snippets.hash.merkle_hash import merkle_hash_file
+
+    try:
+        result = merkle_hash_file(
+            path_in, hash_method=algo, chunk_size=chunk_size, max_workers=workers
+        )
+    except EOFError as error:
+        typer.echo(f"{path_in}: changed while hashing. {error}", err=True)
+        raise typer.Exit(code=1) from error
+    if record is not None:
+        result.save(record)
+    typer.echo(f"{result.root_hash}  {path_in}")
+
+
+@app.command()
+def merkle_verify(
+    ctx: typer.Context,
+    record: Annotated[
+        Path,
+        typer.Argument(help="A record saved by merkle-hash.", exists=True),
+    ],
+    path_in: Annotated[
+        Path, typer.Argument(help="File to check.", exists=True, dir_okay=False)
+    ],
+    offset: Annotated[
+        int | None, typer.Option(help="Only check the chunks from this byte.")
+    ] = None,
+    length: Annotated[
+        int | None, typer.Option(help="Only check this many bytes from --offset.")
+    ] = None,
+    workers: WorkersOption = None,
+):
+    """Check a file against its chunk digests, listing corrupted byte ranges."""
+    from pfmsoft_trips.snippets.hash.merkle_hash import MerkleHash, verify_chunks
+
+    merkle_record = MerkleHash.load(record)
+    chunk_indexes = None
+    if offset is not None or length is not None:
+        start = offset or 0
+        chunk_indexes = merkle_record.chunks_for_range(
+            start, length if length is not None else merkle_record.size - start
+        )
+    try:
+        corrupted = verify_chunks(
+            path_in, merkle_record, chunk_indexes=chunk_indexes, max_workers=workers
+        )
+    except EOFError as error:
+        typer.echo(f"{path_in}: changed while verifying. {error}", err=True)
+        raise typer.Exit(code=1) from error
+    for chunk_offset, chunk_length in corrupted:
+        typer.echo(f"{path_in}: corrupted at {chunk_offset}, {chunk_length} bytes")
+    if corrupted:
+        raise typer.Exit(code=1)
+    typer.echo(f"{path_in}: OK")
+
+
+@app.command()
+def chunk_index(
+    ctx: typer.Context,
+    paths_in: Annotated[
+        list[Path], typer.Argument(help="Files, or directories to index recursively.")
+    ],
+    index_file: ChunkIndexFileOption = DEFAULT_CHUNK_INDEX_FILE,
+    min_chunk: Annotated[
+        str | None,
+        typer.Option(
+            help="The smallest chunk. Defaults to 2K.", callback=validate_size
+        ),
+    ] = None,
+    avg_chunk: Annotated[
+        str | None,
+        typer.Option(
+            help="The average chunk, a power of two. Defaults to 8K.",
+            callback=validate_size,
+        ),
+    ] = None,
+    max_chunk: Annotated[
+        str | None,
+        typer.Option(
+            help="The largest chunk. Defaults to 64K.", callback=validate_size
+        ),
+    ] = None,
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    processes: ProcessesOption = False,
+    block_size: BlockSizeOption = "64K",
+    block_size_file: BlockSizeFileOption = DEFAULT_BLOCK_SIZE_FILE,
+):
+    """Split files into content defined chunks, and add them to the chunk index.
+
+    Files are hashed in the same read pass, printing md5sum style lines. Files
+    already indexed and unchanged are skipped. The chunk sizes are fixed when
+    the index is created.
+    """
+    _check_stats_pool(ctx, processes)
+    import os
+    from functools import partial
+
+    from pfmsoft_trips.snippets.hash.chunk_index import ChunkIndex
+    from pfmsoft_trips.snippets.hash.chunking import ContentDefinedChunker, chunk_file
+    from pfmsoft_trips.snippets.hash.parallel_hash import hash_files_concurrently
+
+    failed = 0
+    unchanged = 0
+
+    def report_error(file_path: Path, error: BaseException):
+        nonlocal failed
+        failed += 1
+        typer.echo(f"{file_path}: {error}", err=True)
+
+    def unindexed(file_paths):
+        nonlocal unchanged
+        # Arguments may overlap, e.g. a directory and a file below it.
+        seen: set[str] = set()
+        for file_path in file_paths:
+            key_path = os.path.abspath(file_path)
+            if key_path in seen:
+                continue
+            seen.add(key_path)
+            try:
+                file_stat = os.stat(file_path)
+            except OSError as error:
+                report_error(file_path, error)
+                continue
+            if index.is_current(file_path, file_stat):
+                unchanged += 1
+                continue
+            yield file_path
+
+    chunk_sizes = [
+        parse_size(size) if size is not None else None
+        for size in (min_chunk, avg_chunk, max_chunk)
+    ]
+    try:
+        index = ChunkIndex(index_file, *chunk_sizes)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="--index") from error
+    try:
+        # Fail early on bad sizes, rather than once per file in the pool.
+        ContentDefinedChunker(index.min_size, index.avg_size, index.max_size)
+    except ValueError as error:
+        index.close()
+        raise typer.BadParameter(str(error), param_hint="--avg-chunk") from error
+    job = partial(
+        chunk_file,
+        min_size=index.min_size,
+        avg_size=index.avg_size,
+        max_size=index.max_size,
+    )
+    with (
+        index,
+        block_size_tuning(block_size, block_size_file, False) as size,
+    ):
+        results = hash_files_concurrently(
+            unindexed(expand_paths(paths_in)),
+            hash_method=algo,
+            max_workers=workers,
+            pool="process" if processes else "thread",
+            block_size=size,
+            on_error=report_error,
+            job=job,
+        )
+        for result in results:
+            index.add(result)  # type: ignore[arg-type]
+            typer.echo(f"{result.file_hash}  {result.file_path}")
+    typer.echo(f"{unchanged} files unchanged, {failed} failed.", err=True)
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def chunk_compare(
+    ctx: typer.Context,
+    path_a: Annotated[Path, typer.Argument(help="An indexed file or directory.")],
+    path_b: Annotated[Path, typer.Argument(help="An indexed file or directory.")],
+    index_file: ChunkIndexFileOption = DEFAULT_CHUNK_INDEX_FILE,
+):
+    """Report how much of each path is in chunks shared with the other.
+
+    Uses only the chunk index, see chunk-index.
+    """
+    from pfmsoft_trips.snippets.hash.chunk_index import ChunkIndex
+
+    with ChunkIndex(index_file) as index:
+        shared_a, shared_b = index.compare([path_a], [path_b])
+    for path, other, shared in ((path_a, path_b, shared_a), (path_b, path_a, shared_b)):
+        if not shared.files:
+            raise typer.BadParameter(
+                f"No indexed files at {path}, run chunk-index first."
+            )
+        typer.echo(
+            f"{path}: {shared.shared_bytes} of {shared.total_bytes} bytes "
+            f"({shared.ratio:.1%}) in {shared.files} files are shared with {other}"
+        )
+
+
+class WatchMethodChoice(StrEnum):
+    """The watch methods of :func:`watch.watch_tree`."""
+
+    auto = "auto"
+    inotify = "inotify"
+    poll = "poll"
+
+
+def _index_temp_file(index_file: Path) -> Path:
+    return index_file.with_name(f".{index_file.name}.tmp")
+
+
+def _write_index(index: dict, index_file: Path) -> None:
+    """Replace the index file atomically with a manifest of the index."""
+    import os
+
+    from pfmsoft_trips.snippets.hash.manifest import write_manifest
+
+    temp_file = _index_temp_file(index_file)
+    with open(temp_file, "w", encoding="utf-8") as manifest_out:
+        write_manifest(sorted(index.values(), key=lambda r: r.file_path), manifest_out)
+    os.replace(temp_file, index_file)
+
+
+@app.command()
+def watch(
+    ctx: typer.Context,
+    root: Annotated[
+        Path,
+        typer.Argument(help="Directory to watch.", exists=True, file_okay=False),
+    ],
+    index_file: Annotated[
+        Path | None,
+        typer.Option(
+            "--index",
+            help="Keep a manifest of the whole tree here, rewritten as it changes.",
+            dir_okay=False,
+        ),
+    ] = None,
+    index_interval: Annotated[
+        float,
+        typer.Option(help="The shortest time between rewrites of --index, in seconds."),
+    ] = 10.0,
+    method: Annotated[
+        WatchMethodChoice,
+        typer.Option(help="Watch with inotify, by polling, or inotify if available."),
+    ] = WatchMethodChoice.auto,
+    poll_interval: Annotated[
+        float, typer.Option(help="The time between scans when polling, in seconds.")
+    ] = 2.0,
+    debounce: Annotated[
+        float,
+        typer.Option(help="Wait for changes to be quiet this long, in seconds."),
+    ] = 0.5,
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    use_cache: CacheOption = True,
+    refresh: RefreshOption = False,
+    cache_file: CacheFileOption = DEFAULT_CACHE_FILE,
+    cache_stats: CacheStatsOption = False,
+    block_size: BlockSizeOption = "64K",
+    block_size_file: BlockSizeFileOption = DEFAULT_BLOCK_SIZE_FILE,
+):
+    """Hash a directory tree, then re-hash files as they change, until stopped.
+
+    Prints md5sum style lines for new and changed files, and reports removed
+    files on stderr.
+    """
+    from time import monotonic
+
+    from pfmsoft_trips.snippets.hash.hash_job import interrupt_on_terminate
+    from pfmsoft_trips.snippets.hash.watch import make_watcher, watch_tree
+
+    def report_error(file_path: Path, error: BaseException):
+        typer.echo(f"{file_path}: {error}", err=True)
+
+    # An index inside the tree is not hashed, nor are its rewrites changes.
+    skip_paths = set()
+    idle_interval = None
+    if index_file is not None:
+        resolved_root = root.resolve()
+        for path in (index_file, _index_temp_file(index_file)):
+            resolved = path.resolve()
+            if resolved.is_relative_to(resolved_root):
+                skip_paths.add(root / resolved.relative_to(resolved_root))
+        if index_interval > 0:
+            # Wake up while quiet, to write updates held back by the interval.
+            idle_interval = min(index_interval, 1.0)
+    try:
+        watcher = make_watcher(root, method.value, poll_interval)
+    except OSError as error:
+        raise typer.BadParameter(str(error), param_hint="--method") from error
+    index: dict = {}
+    last_write = None
+    # Whether the index has changed since it was last written.
+    dirty = False
+    with (
+        interrupt_on_terminate(),
+        block_size_tuning(block_size, block_size_file, False) as size,
+        digest_cache(use_cache, refresh, cache_file, cache_stats) as cache,
+    ):
+        updates = watch_tree(
+            root,
+            hash_method=algo,
+            watcher=watcher,
+            debounce=debounce,
+            max_workers=workers,
+            block_size=size,
+            on_error=report_error,
+            cache=cache,
+            idle_interval=idle_interval,
+            skip_paths=skip_paths,
+        )
+        try:
+            for update in updates:
+                index = update.index
+                for result in update.hashed:
+                    typer.echo(f"{result.file_hash}  {result.file_path}")
+                for removed_path in update.removed:
+                    typer.echo(f"{removed_path}: removed", err=True)
+                if update.hashed or update.removed or last_write is None:
+                    dirty = True
+                if (
+                    index_file is not None
+                    and dirty
+                    and (
+                        last_write is None or monotonic() - last_write >= index_interval
+                    )
+                ):
+                    _write_index(index, index_file)
+                    last_write = monotonic()
+                    dirty = False
+        except KeyboardInterrupt:
+            updates.close()
+        finally:
+            if index_file is not None and dirty and last_write is not None:
+                _write_index(index, index_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+"""Create and verify md5sum compatible manifests.
+
+The hashing modules are imported inside the commands, see `main_typer`.
+"""
+
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated
+
+import typer
+from pfmsoft_trips.cli.options import (
+    DEFAULT_CACHE_FILE,
+    AlgoOption,
+    CacheFileOption,
+    CacheOption,
+    CacheStatsOption,
+    ProcessesOption,
+    RefreshOption,
+    WorkersOption,
+    digest_cache,
+    expand_paths,
+)
+
+if TYPE_CHECKING:
+    from pfmsoft_trips.snippets.hash.manifest import ManifestStats
+
+app = typer.Typer(help="Create and verify md5sum compatible manifests.")
+
+
+@app.command()
+def create(
+    ctx: typer.Context,
+    paths_in: Annotated[
+        list[Path], typer.Argument(help="Files, or directories to hash recursively.")
+    ],
+    output: Annotated[
+        Path | None,
+        typer.Option("--output", "-o", help="Write the manifest here, not stdout."),
+    ] = None,
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    processes: ProcessesOption = False,
+    ordered: Annotated[
+        bool,
+        typer.Option(help="List files in input order instead of completion order."),
+    ] = True,
+    use_cache: CacheOption = True,
+    refresh: RefreshOption = False,
+    cache_file: CacheFileOption = DEFAULT_CACHE_FILE,
+    cache_stats: CacheStatsOption = False,
+):
+    """Hash files and write a manifest of `<digest>  <path>` lines."""
+    from pfmsoft_trips.snippets.hash.manifest import write_manifest
+    from pfmsoft_trips.snippets.hash.parallel_hash import hash_files_concurrently
+
+    failed = 0
+
+    def report_error(file_path: Path, error: BaseException):
+        nonlocal failed
+        failed += 1
+        typer.echo(f"{file_path}: {error}", err=True)
+
+    file_paths = expand_paths(paths_in)
+    if output is not None:
+        output_path = os.path.abspath(output)
+        file_paths = (
+            path for path in file_paths if os.path.abspath(path) != output_path
+        )
+    with digest_cache(use_cache, refresh, cache_file, cache_stats) as cache:
+        results = hash_files_concurrently(
+            file_paths,
+            hash_method=algo,
+            max_workers=workers,
+            pool="process" if processes else "thread",
+            ordered=ordered,
+            on_error=report_error,
+            cache=cache,
+        )
+        if output is None:
+            write_manifest(results, sys.stdout)
+        else:
+            with open(output, "w", encoding="utf-8") as manifest_out:
+                write_manifest(results, manifest_out)
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def verify(
+    ctx: typer.Context,
+    manifest_file: Annotated[
+        Path,
+        typer.Argument(help="The manifest to check.", exists=True, dir_okay=False),
+    ],
+    algo: AlgoOption = "md5",
+    workers: WorkersOption = None,
+    processes: ProcessesOption = False,
+    fail_fast: Annotated[
+        bool, typer.Option(help="Stop at the first file that does not verify.")
+    ] = False,
+    precheck: Annotated[
+        bool,
+        typer.Option(
+            help="Check that every listed file exists before hashing any of them."
+        ),
+    ] = False,
+    quiet: Annotated[
+        bool, typer.Option("--quiet", "-q", help="Don't print OK for each file.")
+    ] = False,
+    use_cache: CacheOption = False,
+    refresh: RefreshOption = False,
+    cache_file: CacheFileOption = DEFAULT_CACHE_FILE,
+    cache_stats: CacheStatsOption = False,
+):
+    """Verify the files listed in a manifest, like `md5sum -c`."""
+    from pfmsoft_trips.snippets.hash.manifest import (
+        ManifestStats,
+        precheck_manifest,
+        read_manifest,
+        verify_manifest,
+    )
+
+    counts: Counter[str] = Counter()
+    stats = ManifestStats()
+    if precheck:
+        with open(manifest_file, encoding="utf-8") as lines:
+            for result in precheck_manifest(read_manifest(lines, algo)):
+                counts[result.status] += 1
+                typer.echo(result.message())
+                if fail_fast:
+                    break
+        if counts:
+            _report(counts, stats)
+            raise typer.Exit(code=1)
+    with (
+        open(manifest_file, encoding="utf-8") as lines,
+        digest_cache(use_cache, refresh, cache_file, cache_stats) as cache,
+    ):
+        results = verify_manifest(
+            read_manifest(lines, algo, stats=stats),
+            hash_method=algo,
+            max_workers=workers,
+            pool="process" if processes else "thread",
+            cache=cache,
+        )
+        for result in results:
+            counts[result.status] += 1
+            if result.status != "OK" or not quiet:
+                typer.echo(result.message())
+            if fail_fast and result.status != "OK":
+                results.close()
+                break
+    _report(counts, stats)
+    if counts["FAILED"] or counts["MISSING"]:
+        raise typer.Exit(code=1)
+
+
+def _report(counts: Counter[str], stats: "ManifestStats"):
+    """Print md5sum style warnings to stderr."""
+    if stats.improperly_formatted:
+        typer.echo(
+            f"WARNING: {stats.improperly_formatted} line(s) improperly formatted",
+            err=True,
+        )
+    if counts["MISSING"]:
+        typer.echo(
+            f"WARNING: {counts['MISSING']} listed file(s) could not be read", err=True
+        )
+    if counts["FAILED"]:
+        typer.echo(
+            f"WARNING: {counts['FAILED']} computed checksum(s) did NOT match", err=True
+        )
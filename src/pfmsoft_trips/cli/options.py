@@ -0,0 +1,298 @@
+"""Options and helpers shared by the cli commands.
+
+Imported at startup, so the hashing modules are only imported when used.
+"""
+
+import os
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from enum import StrEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, BinaryIO
+
+import typer
+
+if TYPE_CHECKING:
+    from pfmsoft_trips.snippets.hash.block_size import BlockSize
+    from pfmsoft_trips.snippets.hash.hash_job import HashJournal
+
+APP_NAME = "pfmsoft-trips"
+DEFAULT_CACHE_FILE = Path(typer.get_app_dir(APP_NAME)) / "digest-cache.sqlite3"
+DEFAULT_BLOCK_SIZE_FILE = Path(typer.get_app_dir(APP_NAME)) / "block-sizes.json"
+DEFAULT_CHUNK_INDEX_FILE = Path(typer.get_app_dir(APP_NAME)) / "chunk-index.sqlite3"
+SIZE_SUFFIXES = {"K": 2**10, "M": 2**20, "G": 2**30}
+# merkle_hash.DEFAULT_CHUNK_SIZE, repeated so the cli need not import it.
+DEFAULT_MERKLE_CHUNK_SIZE = 2**20 * 8
+
+
+def validate_hash_method(value: str) -> str:
+    """Check that a hash method is available in :py:mod:`hashlib`."""
+    import hashlib
+
+    # The shake algorithms need a digest length, so they are not supported.
+    if value not in hashlib.algorithms_available or value.startswith("shake"):
+        raise typer.BadParameter(
+            f"{value!r} is not available, choose from "
+            f"{', '.join(sorted(hashlib.algorithms_available))}"
+        )
+    return value
+
+
+def validate_hash_method_list(value: str) -> str:
+    """Check a comma separated list of distinct, available hash methods."""
+    hash_methods = value.split(",")
+    for hash_method in hash_methods:
+        validate_hash_method(hash_method)
+    if len(set(hash_methods)) != len(hash_methods):
+        raise typer.BadParameter(f"Each algorithm may only be given once, got {value}")
+    return value
+
+
+def parse_size(value: str) -> int:
+    """Parse a size like `65536`, `64K` or `1M`."""
+    value = value.strip().upper()
+    multiplier = SIZE_SUFFIXES.get(value[-1:], 1)
+    if value[-1:] in SIZE_SUFFIXES:
+        value = value[:-1]
+    if not value.isdigit() or int(value) < 1:
+        raise typer.BadParameter("Use a size like 65536, 64K or 1M.")
+    return int(value) * multiplier
+
+
+def validate_size(value: str | None) -> str | None:
+    """Check that a value, if given, parses with :func:`parse_size`."""
+    if value is not None:
+        parse_size(value)
+    return value
+
+
+def parse_block_size(value: str) -> "BlockSize":
+    """Parse `auto`, or a size like `65536`, `64K` or `1M`."""
+    if value.strip().upper() == "AUTO":
+        return "auto"
+    try:
+        return parse_size(value)
+    except typer.BadParameter as error:
+        raise typer.BadParameter(
+            "Use a size like 65536, 64K or 1M, or auto."
+        ) from error
+
+
+def validate_block_size(value: str) -> str:
+    """Check that a value parses with :func:`parse_block_size`."""
+    parse_block_size(value)
+    return value
+
+
+AlgoOption = Annotated[
+    str,
+    typer.Option(help="Hash algorithm.", callback=validate_hash_method),
+]
+WorkersOption = Annotated[
+    int | None,
+    typer.Option(help="Number of workers. Defaults to the cpu count.", min=1),
+]
+ProcessesOption = Annotated[
+    bool,
+    typer.Option("--processes/--threads", help="Use a process or thread pool."),
+]
+CacheOption = Annotated[
+    bool,
+    typer.Option(
+        "--cache/--no-cache", help="Reuse digests of files that have not changed."
+    ),
+]
+RefreshOption = Annotated[
+    bool,
+    typer.Option(help="Ignore cached digests, but store the new ones."),
+]
+CacheStatsOption = Annotated[
+    bool,
+    typer.Option(help="Print the digest cache hits and misses."),
+]
+CacheFileOption = Annotated[
+    Path,
+    typer.Option(
+        help="The digest cache database.",
+        envvar="PFMSOFT_TRIPS_CACHE_FILE",
+        dir_okay=False,
+    ),
+]
+BlockSizeOption = Annotated[
+    str,
+    typer.Option(
+        help="The read size, e.g. 64K or 1M, or auto to measure the best size "
+        "once per device.",
+        callback=validate_block_size,
+    ),
+]
+BlockSizeFileOption = Annotated[
+    Path,
+    typer.Option(
+        help="Where the auto block sizes are saved.",
+        envvar="PFMSOFT_TRIPS_BLOCK_SIZE_FILE",
+        dir_okay=False,
+    ),
+]
+ShowBlockSizeOption = Annotated[
+    bool,
+    typer.Option(help="Print the auto block sizes and measured throughput."),
+]
+ChunkIndexFileOption = Annotated[
+    Path,
+    typer.Option(
+        "--index",
+        help="The chunk index database.",
+        envvar="PFMSOFT_TRIPS_CHUNK_INDEX_FILE",
+        dir_okay=False,
+    ),
+]
+JournalOption = Annotated[
+    Path | None,
+    typer.Option(
+        "--journal",
+        help="Journal each result to this file, so an interrupted run can be "
+        "resumed with --resume.",
+        dir_okay=False,
+    ),
+]
+
+
+class IoPolicyChoice(StrEnum):
+    """The I/O policies of :mod:`io_policy`."""
+
+    default = "default"
+    bulk = "bulk"
+
+
+IoPolicyOption = Annotated[
+    IoPolicyChoice,
+    typer.Option(
+        help="bulk opens files with O_NOATIME, and drops the pages it read from "
+        "the page cache once hashed, to leave the cache of other programs alone."
+    ),
+]
+ResumeOption = Annotated[
+    bool,
+    typer.Option(
+        help="Continue the run in --journal, skipping and reprinting the files "
+        "already hashed."
+    ),
+]
+
+
+def expand_paths(paths: Iterable[Path]) -> Iterator[Path]:
+    """Yield files as given, and the files below any directories."""
+    from pfmsoft_trips.snippets.hash.tree_walk import walk_files
+
+    for path in paths:
+        if path.is_dir():
+            yield from walk_files(path, symlinks="files")
+        else:
+            yield path
+
+
+def read_path_list(stream: BinaryIO, read_size: int = 2**16) -> Iterator[Path]:
+    """
+    Lazily yield the paths from a NUL or newline separated list.
+
+    The separator is NUL if the first read contains one, as from `find -print0`,
+    and newline otherwise. Empty entries are skipped. Paths are decoded like
+    :py:func:`os.fsdecode`, so any file name survives the round trip.
+
+    Args:
+        stream: A binary stream, e.g. `sys.stdin.buffer`.
+        read_size: The maximum size of each read. Paths are yielded as soon as
+            a read completes them, without waiting for a full read.
+    """
+    # read1 returns what is available, rather than blocking for a full read.
+    read = getattr(stream, "read1", stream.read)
+    separator: bytes | None = None
+    pending = b""
+    while chunk := read(read_size):
+        if separator is None:
+            separator = b"\0" if b"\0" in chunk else b"\n"
+        *entries, pending = (pending + chunk).split(separator)
+        for entry in entries:
+            if entry:
+                yield Path(os.fsdecode(entry))
+    if pending:
+        yield Path(os.fsdecode(pending))
+
+
+@contextmanager
+def digest_cache(use_cache: bool, refresh: bool, cache_file: Path, show: bool):
+    """Open the digest cache, if enabled, and report its counters if `show`."""
+    if not use_cache:
+        yield None
+        return
+    from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+
+    with DigestCache(cache_file, refresh=refresh) as cache:
+        try:
+            yield cache
+        finally:
+            if show:
+                typer.echo(cache.stats(), err=True)
+
+
+@contextmanager
+def block_size_tuning(block_size: str, block_size_file: Path, show: bool):
+    """Resolve the block size option, and report the auto choices when done."""
+    resolved = parse_block_size(block_size)
+    if resolved != "auto":
+        if show:
+            typer.echo(f"Block size {resolved}", err=True)
+        yield resolved
+        return
+    from pfmsoft_trips.snippets.hash.block_size import configure_block_size_tuner
+
+    tuner = configure_block_size_tuner(block_size_file)
+    try:
+        yield resolved
+    finally:
+        if show:
+            for choice in tuner.choices.values():
+                typer.echo(choice.describe(), err=True)
+            if not tuner.choices:
+                typer.echo("No files large enough to calibrate a block size.", err=True)
+
+
+@contextmanager
+def hash_journal(
+    journal_file: Path | None, resume: bool, hash_method: str
+) -> "Iterator[HashJournal | None]":
+    """
+    Open the job journal, if enabled, and exit cleanly on SIGINT or SIGTERM.
+
+    On an interrupt the journal is synced and closed, and the command exits
+    with code 130.
+    """
+    if journal_file is None:
+        if resume:
+            raise typer.BadParameter("Needs --journal.", param_hint="--resume")
+        yield None
+        return
+    from pfmsoft_trips.snippets.hash.hash_job import (
+        HashJournal,
+        interrupt_on_terminate,
+    )
+
+    try:
+        journal = HashJournal(journal_file, hash_method, resume=resume)
+    except FileExistsError as error:
+        raise typer.BadParameter(
+            f"{error} Use --resume to continue it.", param_hint="--journal"
+        ) from error
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="--journal") from error
+    try:
+        with journal, interrupt_on_terminate():
+            yield journal
+    except KeyboardInterrupt:
+        typer.echo(
+            f"Interrupted, {len(journal)} results are in {journal_file}. "
+            "Run again with --resume to continue.",
+            err=True,
+        )
+        raise typer.Exit(code=130) from None
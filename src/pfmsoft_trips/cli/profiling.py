@@ -0,0 +1,81 @@
+"""Profile a cli command, for the global --profile option.
+
+cProfile is always available. pyinstrument, a sampling profiler with much lower
+overhead, is used instead when it is installed, unless cProfile is asked for.
+Either way the profile is saved in the :py:mod:`pstats` format.
+
+Only the main thread is profiled, so work done in pool threads or processes
+does not show up, only the time the main thread spends waiting for it.
+"""
+
+import importlib.util
+import sys
+from enum import StrEnum
+from pathlib import Path
+
+import typer
+
+
+class ProfilerChoice(StrEnum):
+    """The profilers for `--profile`. "auto" uses pyinstrument if installed."""
+
+    auto = "auto"
+    cprofile = "cprofile"
+    pyinstrument = "pyinstrument"
+
+
+def start_profiling(
+    ctx: typer.Context, profile_file: Path, profiler: ProfilerChoice, top: int
+):
+    """
+    Profile until the command is done, then save the profile and print a summary.
+
+    `profile_file` is a `.pstats` file for :py:mod:`pstats` or snakeviz, and the
+    `top` functions by cumulative time are printed to stderr. pyinstrument only
+    samples, so its call counts are unknown and shown as -1.
+    """
+    if profiler is ProfilerChoice.auto:
+        has_pyinstrument = importlib.util.find_spec("pyinstrument") is not None
+        profiler = (
+            ProfilerChoice.pyinstrument if has_pyinstrument else ProfilerChoice.cprofile
+        )
+    if profiler is ProfilerChoice.pyinstrument:
+        try:
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import PstatsRenderer
+        except ImportError as error:
+            raise typer.BadParameter(
+                "pyinstrument 4.5 or later is not installed.", param_hint="--profiler"
+            ) from error
+        sampler = Profiler()
+        sampler.start()
+
+        def stop_sampler():
+            sampler.stop()
+            # The renderer returns the marshalled stats as surrogate escaped text.
+            stats = sampler.output(PstatsRenderer())
+            profile_file.write_bytes(stats.encode("utf-8", "surrogateescape"))
+            _print_summary(profile_file, top)
+
+        ctx.call_on_close(stop_sampler)
+        return
+
+    import cProfile
+
+    tracer = cProfile.Profile()
+    tracer.enable()
+
+    def stop_tracer():
+        tracer.disable()
+        tracer.dump_stats(profile_file)
+        _print_summary(profile_file, top)
+
+    ctx.call_on_close(stop_tracer)
+
+
+def _print_summary(profile_file: Path, top: int) -> None:
+    import pstats
+
+    stats = pstats.Stats(str(profile_file), stream=sys.stderr)
+    stats.sort_stats("cumulative").print_stats(top)
+    typer.echo(f"Profile saved to {profile_file}", err=True)
@@ -0,0 +1,149 @@
+"""
+Hash files from asyncio code without blocking the event loop.
+
+Each block is read and fed to the hasher in a worker thread, one
+:py:func:`asyncio.to_thread` call per block, so a cancelled task stops between
+blocks. A larger default block size than the sync functions keeps the per-call
+overhead small.
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections.abc import AsyncIterator, Callable, Iterable
+from contextlib import nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pfmsoft_trips.snippets.hash.file_hash import (
+    HashedFileProtocol,
+    hashed_file_result_factory,
+)
+
+if TYPE_CHECKING:
+    from hashlib import _Hash
+
+ASYNC_BLOCK_SIZE = 2**20
+
+
+async def hash_file_async(
+    file_path: Path,
+    hasher: "_Hash",
+    block_size: int = ASYNC_BLOCK_SIZE,
+    limit: asyncio.Semaphore | None = None,
+) -> str:
+    """
+    Calculate the hash digest for a file, off the event loop.
+
+    Args:
+        file_path: The path for a file to be opened in binary mode.
+        hasher: The hasher used to generate the hexdigest.
+        block_size: The block size used to read the file. Defaults to 2**20 (1M).
+        limit: Held while the file is open, to bound concurrent hashing.
+
+    Returns:
+        A hexidecimal string representing the file hash.
+    """
+    async with limit if limit is not None else nullcontext():
+        file_handle = await asyncio.to_thread(open, file_path, "rb", buffering=0)
+        view = memoryview(bytearray(block_size))
+        # A cancelled task does not stop a block already running in its thread,
+        # so the file is only closed once that block is done.
+        lock = threading.Lock()
+
+        def read_block() -> int:
+            with lock:
+                if file_handle.closed:
+                    return 0
+                size = file_handle.readinto(view)
+                if size:
+                    hasher.update(view[:size])
+                return size or 0
+
+        def close() -> None:
+            with lock:
+                file_handle.close()
+
+        try:
+            while await asyncio.to_thread(read_block):
+                pass
+        finally:
+            await asyncio.to_thread(close)
+    return hasher.hexdigest()
+
+
+async def make_hashed_file_async(
+    file_path: Path,
+    hasher: "_Hash",
+    block_size: int = ASYNC_BLOCK_SIZE,
+    limit: asyncio.Semaphore | None = None,
+    result_factory: Callable[
+        [Path, str, str], HashedFileProtocol
+    ] = hashed_file_result_factory,
+) -> HashedFileProtocol:
+    """Hash a file with :func:`hash_file_async`, as a hashed file result."""
+    hash_str = await hash_file_async(
+        file_path=file_path, hasher=hasher, block_size=block_size, limit=limit
+    )
+    return result_factory(file_path, hash_str, hasher.name)
+
+
+async def hash_files_as_completed(
+    file_paths: Iterable[Path],
+    hash_method: str = "md5",
+    concurrency: int = 8,
+    block_size: int = ASYNC_BLOCK_SIZE,
+    on_error: Callable[[Path, BaseException], None] | None = None,
+) -> AsyncIterator[HashedFileProtocol]:
+    """
+    Hash files concurrently, yielding results as they complete.
+
+    At most `concurrency` files are hashed at a time, and `file_paths` is only
+    consumed as slots free up. Closing the iterator early cancels the files
+    still in progress.
+
+    Args:
+        file_paths: The files to hash.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        concurrency: The number of files hashed at a time.
+        block_size: The block size used to read the files.
+        on_error: Called with the path and exception when a file fails to hash,
+            and the file is skipped. If None, the exception is raised.
+
+    Yields:
+        The hashed file results.
+    """
+    running: dict[asyncio.Task[HashedFileProtocol], Path] = {}
+    path_iter = iter(file_paths)
+    exhausted = False
+    try:
+        while running or not exhausted:
+            while not exhausted and len(running) < concurrency:
+                file_path = next(path_iter, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                task = asyncio.create_task(
+                    make_hashed_file_async(
+                        file_path, hashlib.new(hash_method), block_size=block_size
+                    )
+                )
+                running[task] = file_path
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                file_path = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    on_error(file_path, error)
+                    continue
+                yield result
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,238 @@
+"""
+Choose the read block size per device, by measuring it.
+
+The first time an "auto" block size is resolved for a file on a device (by
+`st_dev`), the start of that file is read once with each candidate block size,
+and the fastest is used from then on. The page cache is dropped for the sample
+before each read, where `os.posix_fadvise` is available, so the candidates are
+compared on cold reads.
+
+Choices can be saved to a JSON file, for later runs. Device numbers are not
+always stable across reboots, or for network filesystems, so delete the file to
+calibrate again.
+"""
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Literal
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+BlockSize = int | Literal["auto"]
+DEFAULT_BLOCK_SIZE = 2**10 * 64
+CANDIDATE_BLOCK_SIZES = (2**14, 2**16, 2**18, 2**20, 2**22)
+CALIBRATION_BYTES = 2**20 * 32
+# Smaller files are hashed with the default, and do not trigger a calibration.
+MIN_CALIBRATION_BYTES = 2**20 * 4
+
+
+@dataclass
+class BlockSizeChoice:
+    """
+    The block size chosen for a device, and the measurements behind it.
+
+    Attributes:
+        device: The `st_dev` of the device.
+        block_size: The fastest candidate block size.
+        throughputs: The read throughput of each candidate, in MB/s.
+    """
+
+    device: int
+    block_size: int
+    throughputs: dict[int, float]
+
+    def describe(self) -> str:
+        """A one line summary, with the throughput of each candidate."""
+        measured = ", ".join(
+            f"{block_size // 2**10}K {throughput:.0f} MB/s"
+            for block_size, throughput in sorted(self.throughputs.items())
+        )
+        return f"Device {self.device}: block size {self.block_size} ({measured})"
+
+
+def measure_read_throughput(
+    file_path: Path, block_size: int, sample_bytes: int = CALIBRATION_BYTES
+) -> float:
+    """
+    Time reading the start of a file with one block size.
+
+    Args:
+        file_path: The file to read.
+        block_size: The size of each read.
+        sample_bytes: How much of the file to read.
+
+    Returns:
+        The throughput in MB/s.
+    """
+    view = memoryview(bytearray(block_size))
+    total = 0
+    with open(file_path, mode="rb", buffering=0) as raw_handle:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(
+                raw_handle.fileno(), 0, sample_bytes, os.POSIX_FADV_DONTNEED
+            )
+        start = perf_counter_ns()
+        while total < sample_bytes:
+            size = raw_handle.readinto(view)
+            if not size:
+                break
+            total += size
+        elapsed_ns = perf_counter_ns() - start
+    return total / 2**20 / (max(elapsed_ns, 1) / 1e9)
+
+
+def calibrate_block_size(
+    file_path: Path,
+    candidates: tuple[int, ...] = CANDIDATE_BLOCK_SIZES,
+    sample_bytes: int = CALIBRATION_BYTES,
+) -> BlockSizeChoice:
+    """
+    Measure each candidate block size on a file, and choose the fastest.
+
+    Args:
+        file_path: A file on the device to calibrate.
+        candidates: The block sizes to try.
+        sample_bytes: How much of the file to read per candidate.
+
+    Returns:
+        The choice, with the measured throughputs.
+    """
+    throughputs = {
+        block_size: measure_read_throughput(file_path, block_size, sample_bytes)
+        for block_size in candidates
+    }
+    fastest = max(throughputs, key=lambda block_size: throughputs[block_size])
+    choice = BlockSizeChoice(
+        device=os.stat(file_path).st_dev, block_size=fastest, throughputs=throughputs
+    )
+    logger.debug("Calibrated with %s. %s", file_path, choice.describe())
+    return choice
+
+
+class BlockSizeTuner:
+    """
+    Resolve "auto" block sizes, calibrating once per device.
+
+    Safe to share between threads. Calibration runs in the first thread to need
+    it, other threads asking for the same device wait for the result.
+
+    Args:
+        cache_file: A JSON file to load and save the choices. If None, the
+            choices only last as long as the tuner.
+        candidates: The block sizes to try.
+        sample_bytes: How much of a file to read per candidate.
+    """
+
+    def __init__(
+        self,
+        cache_file: Path | None = None,
+        candidates: tuple[int, ...] = CANDIDATE_BLOCK_SIZES,
+        sample_bytes: int = CALIBRATION_BYTES,
+    ) -> None:
+        """Create the BlockSizeTuner, see the class docstring for the arguments."""
+        self.cache_file = cache_file
+        self.candidates = candidates
+        self.sample_bytes = sample_bytes
+        self.choices: dict[int, BlockSizeChoice] = {}
+        self._lock = threading.Lock()
+        if cache_file is not None and cache_file.exists():
+            self.load()
+
+    def load(self) -> None:
+        """Load saved choices, ignoring a damaged file."""
+        if self.cache_file is None:
+            return
+        try:
+            document = json.loads(self.cache_file.read_text(encoding="utf-8"))
+            for device, saved in document.items():
+                self.choices[int(device)] = BlockSizeChoice(
+                    device=int(device),
+                    block_size=int(saved["block_size"]),
+                    throughputs={
+                        int(size): float(throughput)
+                        for size, throughput in saved["throughputs"].items()
+                    },
+                )
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            logger.warning("Ignoring block size cache %s: %s", self.cache_file, error)
+
+    def save(self) -> None:
+        """Save the choices, if there is a cache file."""
+        if self.cache_file is None:
+            return
+        document = {
+            str(device): {
+                "block_size": choice.block_size,
+                "throughputs": {
+                    str(size): throughput
+                    for size, throughput in choice.throughputs.items()
+                },
+            }
+            for device, choice in self.choices.items()
+        }
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_file.write_text(json.dumps(document, indent=2), encoding="utf-8")
+
+    def block_size_for(
+        self, file_path: Path, file_stat: os.stat_result | None = None
+    ) -> int:
+        """
+        The block size for reading a file.
+
+        Args:
+            file_path: The file to be read.
+            file_stat: The stat of the file, if already known.
+
+        Returns:
+            The chosen block size for the device, calibrating on this file if
+            there is no choice yet, or the default for small files.
+        """
+        if file_stat is None:
+            file_stat = os.stat(file_path)
+        choice = self.choices.get(file_stat.st_dev)
+        if choice is not None:
+            return choice.block_size
+        if file_stat.st_size < MIN_CALIBRATION_BYTES:
+            return DEFAULT_BLOCK_SIZE
+        with self._lock:
+            choice = self.choices.get(file_stat.st_dev)
+            if choice is None:
+                choice = calibrate_block_size(
+                    file_path, self.candidates, self.sample_bytes
+                )
+                self.choices[file_stat.st_dev] = choice
+                self.save()
+        return choice.block_size
+
+
+_default_tuner: BlockSizeTuner | None = None
+
+
+def configure_block_size_tuner(cache_file: Path | None) -> BlockSizeTuner:
+    """Replace the tuner used for "auto" block sizes, e.g. to set its cache file."""
+    global _default_tuner
+    _default_tuner = BlockSizeTuner(cache_file)
+    return _default_tuner
+
+
+def default_block_size_tuner() -> BlockSizeTuner:
+    """The tuner used for "auto" block sizes. It does not save, by default."""
+    global _default_tuner
+    if _default_tuner is None:
+        _default_tuner = BlockSizeTuner()
+    return _default_tuner
+
+
+def resolve_block_size(
+    file_path: Path, block_size: BlockSize, file_stat: os.stat_result | None = None
+) -> int:
+    """Resolve an "auto" block size for a file, and pass through any other."""
+    if block_size == "auto":
+        return default_block_size_tuner().block_size_for(file_path, file_stat)
+    return block_size
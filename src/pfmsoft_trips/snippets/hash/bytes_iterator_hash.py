@@ -9,7 +9,7 @@
 # Source: https://github.com/DonalChilde/snippets  #
 ####################################################
 
-from typing import TYPE_CHECKING, Iterator
+from typing import TYPE_CHECKING, Iterator, Sequence
 
 if TYPE_CHECKING:
     from hashlib import _Hash
@@ -36,3 +36,26 @@ def bytes_iterator_hash(
     for block in bytes_iterator:
         hasher.update(block)
     return hasher.hexdigest()
+
+
+def bytes_iterator_multi_hash(
+    bytes_iterator: Iterator[bytes],
+    hashers: Sequence["_Hash"],
+) -> dict[str, str]:
+    """
+    Get several hash digests of a bytes iterator in a single pass.
+
+    Each block is fed to every hasher before the next block is taken.
+
+    Args:
+        bytes_iterator: The byte iterator
+        hashers: The hash functions from :py:mod:`hashlib`
+
+    Returns:
+         The hexidecimal strs from `hexdigest()`, keyed by hasher name.
+    """
+
+    for block in bytes_iterator:
+        for hasher in hashers:
+            hasher.update(block)
+    return {hasher.name: hasher.hexdigest() for hasher in hashers}
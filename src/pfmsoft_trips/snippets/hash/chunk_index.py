@@ -0,0 +1,268 @@
+"""
+An index of the content defined chunks of files, stored in SQLite.
+
+Chunks are looked up by digest, so the bytes two sets of files have in common
+can be found without reading the files again, see :meth:`ChunkIndex.compare`.
+As with :mod:`digest_cache`, a file is only indexed again once its size,
+`st_mtime_ns` or inode change.
+
+All files in an index are chunked with the same chunk sizes, which are stored
+with the index, since chunks of different sizes never match.
+"""
+
+import logging
+import os
+import sqlite3
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from pfmsoft_trips.snippets.hash.chunking import (
+    AVG_CHUNK_SIZE,
+    MAX_CHUNK_SIZE,
+    MIN_CHUNK_SIZE,
+    ChunkedFile,
+)
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    hash_method TEXT NOT NULL,
+    file_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (file_id, offset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunks_digest ON chunks (digest);
+"""
+
+SHARED_SQL = """
+SELECT
+    coalesce(sum(length), 0),
+    coalesce(sum(CASE WHEN EXISTS (
+        SELECT 1 FROM chunks AS other
+        JOIN {other} ON {other}.file_id = other.file_id
+        WHERE other.digest = chunks.digest
+    ) THEN length ELSE 0 END), 0)
+FROM chunks JOIN {side} ON {side}.file_id = chunks.file_id
+"""
+
+
+@dataclass
+class SharedChunks:
+    """The bytes of one side of a comparison, and those found in the other."""
+
+    files: int
+    total_bytes: int
+    shared_bytes: int
+
+    @property
+    def ratio(self) -> float:
+        """The fraction of the bytes that are shared, 0.0 for no bytes."""
+        return self.shared_bytes / self.total_bytes if self.total_bytes else 0.0
+
+
+class ChunkIndex:
+    """
+    An index of file chunks, by path and by chunk digest.
+
+    Writes are committed in batches of `commit_every` files, and on
+    :meth:`close`. A connection may only be used from the thread that created
+    it.
+
+    Args:
+        db_path: The SQLite database file. Parent directories are created.
+        min_size: The chunk sizes, see :class:`chunking.ContentDefinedChunker`.
+            If None, the sizes stored with the index, or the defaults.
+        avg_size: As `min_size`.
+        max_size: As `min_size`.
+        commit_every: The number of files between commits.
+
+    Raises:
+        ValueError: If the index was built with other chunk sizes.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        min_size: int | None = None,
+        avg_size: int | None = None,
+        max_size: int | None = None,
+        commit_every: int = 100,
+    ) -> None:
+        """Create the ChunkIndex, see the class docstring for the arguments."""
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self._pending_writes = 0
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript(SCHEMA)
+        stored = dict(self._connection.execute("SELECT name, value FROM settings"))
+        self.min_size = min_size or stored.get("min_size", MIN_CHUNK_SIZE)
+        self.avg_size = avg_size or stored.get("avg_size", AVG_CHUNK_SIZE)
+        self.max_size = max_size or stored.get("max_size", MAX_CHUNK_SIZE)
+        self._check_settings(stored)
+
+    def __repr__(self) -> str:
+        """The ChunkIndex as a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(db_path={self.db_path!r}, "
+            f"min_size={self.min_size!r}, avg_size={self.avg_size!r}, "
+            f"max_size={self.max_size!r}, commit_every={self.commit_every!r})"
+        )
+
+    def __enter__(self) -> "ChunkIndex":
+        """Return the ChunkIndex itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Commit and close the database."""
+        self.close()
+
+    def _check_settings(self, stored: dict[str, int]) -> None:
+        settings = {
+            "min_size": self.min_size,
+            "avg_size": self.avg_size,
+            "max_size": self.max_size,
+        }
+        if not stored:
+            self._connection.executemany(
+                "INSERT INTO settings (name, value) VALUES (?, ?)", settings.items()
+            )
+            self._connection.commit()
+        elif stored != settings:
+            raise ValueError(
+                f"{self.db_path} was built with chunk sizes {stored}, not {settings}"
+            )
+
+    @staticmethod
+    def _key_path(file_path: Path) -> str:
+        return os.path.abspath(file_path)
+
+    def is_current(self, file_path: Path, file_stat: os.stat_result) -> bool:
+        """Whether the file is indexed, and has not changed since."""
+        row = self._connection.execute(
+            "SELECT 1 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?"
+            " AND inode = ?",
+            (
+                self._key_path(file_path),
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                file_stat.st_ino,
+            ),
+        ).fetchone()
+        return row is not None
+
+    def add(
+        self, chunked_file: ChunkedFile, file_stat: os.stat_result | None = None
+    ) -> None:
+        """
+        Index a file, replacing any earlier entry.
+
+        Args:
+            chunked_file: The file digest and chunks.
+            file_stat: The `stat` of the file, taken before it was chunked.
+                Defaults to the `file_stat` of `chunked_file`.
+
+        Raises:
+            ValueError: If there is no `stat` for the file.
+        """
+        if file_stat is None:
+            file_stat = chunked_file.file_stat
+        if file_stat is None:
+            raise ValueError(f"No stat for {chunked_file.file_path}")
+        key_path = self._key_path(chunked_file.file_path)
+        self._connection.execute("DELETE FROM files WHERE path = ?", (key_path,))
+        cursor = self._connection.execute(
+            "INSERT INTO files (path, size, mtime_ns, inode, hash_method, file_hash)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key_path,
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                file_stat.st_ino,
+                chunked_file.hash_method,
+                chunked_file.file_hash,
+            ),
+        )
+        file_id = cursor.lastrowid
+        self._connection.executemany(
+            "INSERT INTO chunks (file_id, offset, length, digest) VALUES (?, ?, ?, ?)",
+            (
+                (file_id, chunk.offset, chunk.length, chunk.digest)
+                for chunk in chunked_file.chunks
+            ),
+        )
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.commit()
+
+    def _select_side(self, table: str, paths: Iterable[Path]) -> int:
+        """Fill a temporary table with the ids of files at or below the paths."""
+        self._connection.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {table} (file_id INTEGER PRIMARY KEY)"
+        )
+        self._connection.execute(f"DELETE FROM {table}")
+        for path in paths:
+            key_path = self._key_path(path)
+            # Paths below a directory sort between "dir/" and "dir0".
+            self._connection.execute(
+                f"INSERT OR IGNORE INTO {table} SELECT id FROM files"
+                " WHERE path = ? OR (path >= ? AND path < ?)",
+                (key_path, key_path + os.sep, key_path + chr(ord(os.sep) + 1)),
+            )
+        return self._connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+    def compare(
+        self, paths_a: Iterable[Path], paths_b: Iterable[Path]
+    ) -> tuple[SharedChunks, SharedChunks]:
+        """
+        Find the bytes of two sets of files that are in chunks of the other.
+
+        Args:
+            paths_a: Indexed files, or directories of indexed files.
+            paths_b: Indexed files, or directories of indexed files.
+
+        Returns:
+            The shared chunks of each side.
+        """
+        files_a = self._select_side("side_a", paths_a)
+        files_b = self._select_side("side_b", paths_b)
+        shared = []
+        for side, other, files in (
+            ("side_a", "side_b", files_a),
+            ("side_b", "side_a", files_b),
+        ):
+            total_bytes, shared_bytes = self._connection.execute(
+                SHARED_SQL.format(side=side, other=other)
+            ).fetchone()
+            shared.append(SharedChunks(files, total_bytes, shared_bytes))
+        return shared[0], shared[1]
+
+    def commit(self) -> None:
+        """Commit the pending writes."""
+        self._connection.commit()
+        self._pending_writes = 0
+
+    def close(self) -> None:
+        """Commit and close the database."""
+        self.commit()
+        self._connection.close()
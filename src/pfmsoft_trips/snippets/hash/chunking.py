@@ -0,0 +1,288 @@
+"""
+Content defined chunking, in the style of FastCDC.
+
+A chunk boundary falls where a rolling hash of the preceding bytes matches a
+fixed pattern, so boundaries move with the content rather than with offsets,
+and an insert only changes the chunks around it. As in FastCDC, the match must
+be stricter before the average chunk size and looser after it, which narrows
+the spread of chunk sizes, and chunks are kept between a minimum and a maximum
+size.
+
+The rolling hash is batched rather than computed byte by byte in Python. Each
+byte is mapped to one pseudo-random bit with a single :py:meth:`bytes.translate`
+over the block, and the hash of a window of `k` bytes is its `k` bits. A
+boundary is where the window hash is `k - 1` zeros followed by a `1`, which has
+a probability of `2**-k` per byte and can not overlap itself, and is found with
+:py:meth:`bytes.find`. Both passes run at C speed.
+
+:class:`ContentDefinedChunker` is fed with `update`, like a hasher. Wrap a
+hasher in :class:`ChunkingHasher` to chunk a file in the same read pass as the
+whole file digest, e.g. with :func:`file_hash.hash_binary_file`.
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pfmsoft_trips.snippets.hash.block_size import BlockSize
+from pfmsoft_trips.snippets.hash.file_hash import ReadStrategy, hash_file
+
+if TYPE_CHECKING:
+    from hashlib import _Hash
+
+MIN_CHUNK_SIZE = 2**11
+AVG_CHUNK_SIZE = 2**13
+MAX_CHUNK_SIZE = 2**16
+CHUNK_DIGEST_SIZE = 20
+BIT_TABLE_SEED = b"pfmsoft-trips content defined chunking"
+
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    """
+    A content defined chunk of a file.
+
+    Attributes:
+        offset: The offset of the chunk in the file.
+        length: The length of the chunk, in bytes.
+        digest: The raw digest of the chunk.
+    """
+
+    offset: int
+    length: int
+    digest: bytes
+
+
+def _bit_table() -> bytes:
+    """A translation table mapping half of the byte values to 1, the rest to 0."""
+    order = sorted(
+        range(256),
+        key=lambda value: hashlib.blake2b(
+            bytes([value]), key=BIT_TABLE_SEED[:64]
+        ).digest(),
+    )
+    ones = set(order[:128])
+    return bytes(1 if value in ones else 0 for value in range(256))
+
+
+def _boundary_pattern(bits: int) -> bytes:
+    # Ending with the 1 lets bytes.find skip ahead on the much more common 0s.
+    return bytes(bits - 1) + b"\x01"
+
+
+class ContentDefinedChunker:
+    """
+    Split a stream of bytes into content defined chunks.
+
+    Chunk boundaries only depend on the data, not on how it is split between
+    calls to :meth:`update`. Runs of a single byte value never match, so they
+    are cut at `max_size`.
+
+    Args:
+        min_size: The smallest chunk, except for the last one.
+        avg_size: The target average chunk size, a power of two.
+        max_size: The largest chunk.
+        hash_method: The hash of each chunk, a name accepted by
+            :py:func:`hashlib.new`. blake2b digests are cut to
+            :data:`CHUNK_DIGEST_SIZE` bytes.
+    """
+
+    def __init__(
+        self,
+        min_size: int = MIN_CHUNK_SIZE,
+        avg_size: int = AVG_CHUNK_SIZE,
+        max_size: int = MAX_CHUNK_SIZE,
+        hash_method: str = "blake2b",
+    ) -> None:
+        """Create the chunker, see the class docstring for the arguments."""
+        if avg_size & (avg_size - 1) or not 2**8 <= avg_size <= 2**30:
+            raise ValueError(f"avg_size must be a power of two, got {avg_size}")
+        bits = avg_size.bit_length() - 1
+        # FastCDC normalized chunking, level 2.
+        self._strict = _boundary_pattern(bits + 2)
+        self._loose = _boundary_pattern(bits - 2)
+        if not len(self._strict) <= min_size <= avg_size <= max_size:
+            raise ValueError(
+                f"Expected {len(self._strict)} <= min_size <= avg_size <= max_size,"
+                f" got {min_size}, {avg_size}, {max_size}"
+            )
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.hash_method = hash_method
+        self.name = f"cdc-{hash_method}"
+        self.chunks: list[Chunk] = []
+        self._bit_table = _bit_table()
+        # The bits of the bytes before the current update, for the window.
+        self._tail = b""
+        self._position = 0
+        self._chunk_start = 0
+        self._chunk_hasher = self._new_hasher()
+
+    def __repr__(self) -> str:
+        """The ContentDefinedChunker as a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(min_size={self.min_size!r}, "
+            f"avg_size={self.avg_size!r}, max_size={self.max_size!r}, "
+            f"hash_method={self.hash_method!r})"
+        )
+
+    def _new_hasher(self) -> "_Hash":
+        if self.hash_method == "blake2b":
+            return hashlib.blake2b(digest_size=CHUNK_DIGEST_SIZE)
+        return hashlib.new(self.hash_method)
+
+    def _find(self, pattern: bytes, bits: bytes, low: int, high: int) -> int:
+        """The first position in [low, high) where a window matches, or -1."""
+        # bits holds the tail first, position 0 is at bits[len(self._tail)].
+        end_offset = len(self._tail) - len(pattern) + 1
+        match = bits.find(pattern, max(0, low + end_offset), high + len(self._tail))
+        return match - end_offset if match >= 0 else -1
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        """Chunk more data. Completed chunks are appended to `chunks`."""
+        view = memoryview(data).cast("B")
+        bits = self._tail + view.tobytes().translate(self._bit_table)
+        # Positions are relative to this update, cutting after the byte there.
+        base = self._position
+        count = len(view)
+        done = 0
+        while True:
+            chunk_start = self._chunk_start - base
+            cut = -1
+            low = max(done, chunk_start + self.min_size - 1)
+            high = min(count, chunk_start + self.avg_size - 1)
+            if low < high:
+                cut = self._find(self._strict, bits, low, high)
+            if cut < 0:
+                low = max(done, chunk_start + self.avg_size - 1)
+                high = min(count, chunk_start + self.max_size - 1)
+                if low < high:
+                    cut = self._find(self._loose, bits, low, high)
+                if cut < 0 and high == chunk_start + self.max_size - 1 < count:
+                    cut = high
+            if cut < 0:
+                break
+            self._chunk_hasher.update(view[done : cut + 1])
+            self._emit(base + cut + 1)
+            done = cut + 1
+        self._chunk_hasher.update(view[done:])
+        self._position += count
+        self._tail = bits[-(len(self._strict) - 1) :]
+
+    def _emit(self, end: int) -> None:
+        self.chunks.append(
+            Chunk(
+                offset=self._chunk_start,
+                length=end - self._chunk_start,
+                digest=self._chunk_hasher.digest(),
+            )
+        )
+        self._chunk_start = end
+        self._chunk_hasher = self._new_hasher()
+
+    def finish(self) -> list[Chunk]:
+        """End the last chunk, and return all the chunks."""
+        if self._position > self._chunk_start:
+            self._emit(self._position)
+        return self.chunks
+
+
+class ChunkingHasher:
+    """
+    Feed a hasher and a chunker from a single pass over the data.
+
+    Can be passed anywhere a single hasher is expected, like
+    :class:`file_hash.MultiHasher`. The digest is that of the wrapped hasher.
+    """
+
+    def __init__(self, hasher: "_Hash", chunker: ContentDefinedChunker) -> None:
+        """Create the ChunkingHasher, see the class docstring for the arguments."""
+        self.hasher = hasher
+        self.chunker = chunker
+        self.name = hasher.name
+
+    def __repr__(self) -> str:
+        """The ChunkingHasher as a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(hasher={self.hasher!r}, "
+            f"chunker={self.chunker!r})"
+        )
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        """Feed the same data to the hasher and the chunker."""
+        self.hasher.update(data)
+        self.chunker.update(data)
+
+    def hexdigest(self) -> str:
+        """The hex digest of the wrapped hasher."""
+        return self.hasher.hexdigest()
+
+
+@dataclass
+class ChunkedFile:
+    """
+    The digest and content defined chunks of a file.
+
+    Attributes:
+        file_path: The path of the file.
+        file_hash: The hex digest of the whole file.
+        hash_method: The hash method of `file_hash`.
+        chunks: The chunks of the file, in order.
+        file_stat: The stat of the file, taken before it was read, for
+            :meth:`chunk_index.ChunkIndex.add`.
+    """
+
+    file_path: Path
+    file_hash: str
+    hash_method: str
+    chunks: list[Chunk] = field(default_factory=list)
+    file_stat: os.stat_result | None = None
+
+
+def chunk_file(
+    file_path: Path,
+    hash_method: str = "md5",
+    block_size: BlockSize = 2**10 * 64,
+    strategy: ReadStrategy = "auto",
+    min_size: int = MIN_CHUNK_SIZE,
+    avg_size: int = AVG_CHUNK_SIZE,
+    max_size: int = MAX_CHUNK_SIZE,
+) -> ChunkedFile:
+    """
+    Hash a file, and split it into content defined chunks, in one read pass.
+
+    The first four arguments match :data:`parallel_hash.HashJob`, so that with
+    :py:func:`functools.partial` for the chunk sizes, it can be the `job` of
+    :func:`parallel_hash.hash_files_concurrently`.
+
+    Args:
+        file_path: The file to hash.
+        hash_method: The whole file hash, a name accepted by :py:func:`hashlib.new`.
+        block_size: The block size used to read the file.
+        strategy: The read strategy, see :func:`file_hash.hash_file`.
+        min_size: See :class:`ContentDefinedChunker`.
+        avg_size: See :class:`ContentDefinedChunker`.
+        max_size: See :class:`ContentDefinedChunker`.
+
+    Returns:
+        The whole file digest, the chunks, and the `stat` of the file from
+        before it was read.
+    """
+    chunker = ContentDefinedChunker(min_size, avg_size, max_size)
+    file_stat = os.stat(file_path)
+    file_hash = hash_file(
+        file_path,
+        ChunkingHasher(hashlib.new(hash_method), chunker),  # type: ignore[arg-type]
+        block_size=block_size,
+        strategy=strategy,
+    )
+    return ChunkedFile(
+        file_path=file_path,
+        file_hash=file_hash,
+        hash_method=hash_method,
+        chunks=chunker.finish(),
+        file_stat=file_stat,
+    )
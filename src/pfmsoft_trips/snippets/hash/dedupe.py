@@ -0,0 +1,287 @@
+"""
+Find duplicate files, reading as little of each file as possible.
+
+Files are compared in three stages, and only files that still collide move on
+to the next, more expensive, stage:
+
+1. Group by size, from the directory walk. No file is opened.
+2. Hash the first and last `edge_size` bytes of each file.
+3. Hash the whole file.
+
+Files no larger than `2 * edge_size` are fully hashed by stage 2, and skip
+stage 3. Hard links to an already seen inode are skipped, since removing them
+reclaims nothing.
+"""
+
+import csv
+import hashlib
+import json
+import os
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import TextIO
+
+from pfmsoft_trips.snippets.hash.file_hash import (
+    HashedFile,
+    HashedFileProtocol,
+    ReadStrategy,
+)
+from pfmsoft_trips.snippets.hash.parallel_hash import PoolKind, hash_files_concurrently
+from pfmsoft_trips.snippets.hash.tree_walk import SymlinkPolicy, walk_entries
+
+DEFAULT_EDGE_SIZE = 2**10 * 64
+
+
+def edge_hash_job(
+    file_path: Path,
+    hash_method: str,
+    block_size: int = 2**10 * 64,
+    strategy: ReadStrategy = "read",
+    *,
+    edge_size: int = DEFAULT_EDGE_SIZE,
+) -> HashedFileProtocol:
+    """
+    Hash the first and last `edge_size` bytes of a file.
+
+    A :data:`parallel_hash.HashJob`, once `edge_size` is bound. For files no
+    larger than `2 * edge_size` this is the digest of the whole file.
+
+    Args:
+        file_path: The file to hash.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        block_size: Unused, the edges are read in one call each.
+        strategy: Unused.
+        edge_size: The number of bytes to hash at each end.
+
+    Returns:
+        The hashed file result.
+    """
+    hasher = hashlib.new(hash_method)
+    with open(file_path, mode="rb") as file_handle:
+        size = os.fstat(file_handle.fileno()).st_size
+        hasher.update(file_handle.read(edge_size))
+        if size > 2 * edge_size:
+            file_handle.seek(-edge_size, os.SEEK_END)
+        hasher.update(file_handle.read(edge_size))
+    return HashedFile(
+        file_path=file_path, file_hash=hasher.hexdigest(), hash_method=hash_method
+    )
+
+
+@dataclass
+class DuplicateGroup:
+    """
+    Files of the same size and full digest.
+
+    Attributes:
+        size: The size of each file.
+        file_hash: The full digest shared by the files.
+        hash_method: The hash method of `file_hash`.
+        file_paths: The duplicate files, two or more.
+    """
+
+    size: int
+    file_hash: str
+    hash_method: str
+    file_paths: list[Path]
+
+    @property
+    def reclaimable_bytes(self) -> int:
+        """The bytes freed by keeping only one of the files."""
+        return self.size * (len(self.file_paths) - 1)
+
+
+@dataclass
+class DedupeStats:
+    """
+    Counts of the work done by :func:`find_duplicates`.
+
+    Attributes:
+        files_seen: The files found, not counting extra hard links.
+        hard_links_skipped: Further links to a file that was already seen.
+        edge_hashed: The files hashed by their first and last bytes.
+        full_hashed: The files hashed in full.
+        errors: The files that could not be read, with the error.
+    """
+
+    files_seen: int = 0
+    hard_links_skipped: int = 0
+    edge_hashed: int = 0
+    full_hashed: int = 0
+    errors: list[tuple[Path, str]] = field(default_factory=list)
+
+
+def _collisions(
+    groups: dict[tuple[int, str], list[Path]],
+) -> Iterator[tuple[tuple[int, str], list[Path]]]:
+    return ((key, paths) for key, paths in groups.items() if len(paths) > 1)
+
+
+def find_duplicates(
+    roots: Iterable[Path],
+    hash_method: str = "md5",
+    edge_size: int = DEFAULT_EDGE_SIZE,
+    min_size: int = 1,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    symlinks: SymlinkPolicy = "skip",
+    max_workers: int | None = None,
+    pool: PoolKind = "thread",
+    stats: DedupeStats | None = None,
+) -> list[DuplicateGroup]:
+    """
+    Find groups of files with identical content.
+
+    Args:
+        roots: The directories to search.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        edge_size: The bytes hashed at each end of a file in stage 2.
+        min_size: Ignore files smaller than this. Defaults to 1, skipping empty
+            files.
+        include: Glob patterns for files to consider, see
+            :func:`tree_walk.walk_entries`.
+        exclude: Glob patterns for files and directories to skip.
+        symlinks: The symlink policy, see :func:`tree_walk.walk_entries`.
+        max_workers: The pool size for the hashing stages.
+        pool: Use a "thread" or "process" pool.
+        stats: Filled in with counts of the work done, if given.
+
+    Returns:
+        The duplicate groups, with the most reclaimable bytes first.
+    """
+    if stats is None:
+        stats = DedupeStats()
+
+    def on_error(file_path: Path, error: BaseException) -> None:
+        stats.errors.append((file_path, str(error)))
+
+    # Stage 1: group by size.
+    by_size: defaultdict[int, list[Path]] = defaultdict(list)
+    seen_inodes: set[tuple[int, int]] = set()
+    for root in roots:
+        entries = walk_entries(
+            root,
+            include=include,
+            exclude=exclude,
+            symlinks=symlinks,
+            min_size=min_size,
+            on_error=lambda error, root=root: on_error(
+                Path(error.filename or root), error
+            ),
+        )
+        for entry in entries:
+            file_stat = entry.stat()
+            inode = (file_stat.st_dev, file_stat.st_ino)
+            if inode in seen_inodes:
+                stats.hard_links_skipped += 1
+                continue
+            seen_inodes.add(inode)
+            stats.files_seen += 1
+            by_size[file_stat.st_size].append(Path(entry.path))
+    seen_inodes.clear()
+    sizes = {
+        file_path: size
+        for size, file_paths in by_size.items()
+        if len(file_paths) > 1
+        for file_path in file_paths
+    }
+    del by_size
+
+    # Stage 2: hash the edges of files that share a size.
+    by_edges: defaultdict[tuple[int, str], list[Path]] = defaultdict(list)
+    results = hash_files_concurrently(
+        sizes,
+        hash_method=hash_method,
+        max_workers=max_workers,
+        pool=pool,
+        on_error=on_error,
+        job=partial(edge_hash_job, edge_size=edge_size),
+    )
+    for result in results:
+        stats.edge_hashed += 1
+        by_edges[(sizes[result.file_path], result.file_hash)].append(result.file_path)
+
+    duplicates: list[DuplicateGroup] = []
+    needs_full_hash: list[Path] = []
+    for (size, file_hash), file_paths in _collisions(by_edges):
+        if size <= 2 * edge_size:
+            duplicates.append(DuplicateGroup(size, file_hash, hash_method, file_paths))
+        else:
+            needs_full_hash.extend(file_paths)
+    del by_edges
+
+    # Stage 3: hash the whole of files whose edges still collide.
+    by_hash: defaultdict[tuple[int, str], list[Path]] = defaultdict(list)
+    results = hash_files_concurrently(
+        needs_full_hash,
+        hash_method=hash_method,
+        max_workers=max_workers,
+        pool=pool,
+        on_error=on_error,
+    )
+    for result in results:
+        stats.full_hashed += 1
+        by_hash[(sizes[result.file_path], result.file_hash)].append(result.file_path)
+    for (size, file_hash), file_paths in _collisions(by_hash):
+        duplicates.append(DuplicateGroup(size, file_hash, hash_method, file_paths))
+
+    for group in duplicates:
+        group.file_paths.sort()
+    duplicates.sort(key=lambda group: (-group.reclaimable_bytes, group.file_paths[0]))
+    return duplicates
+
+
+def reclaimable_bytes(groups: Iterable[DuplicateGroup]) -> int:
+    """The total bytes freed by keeping one file of each group."""
+    return sum(group.reclaimable_bytes for group in groups)
+
+
+def write_duplicates_json(groups: Sequence[DuplicateGroup], text_out: TextIO) -> None:
+    """
+    Write duplicate groups as a JSON document.
+
+    Args:
+        groups: The duplicate groups.
+        text_out: A text stream to write to.
+    """
+    document = {
+        "reclaimable_bytes": reclaimable_bytes(groups),
+        "groups": [
+            {
+                "size": group.size,
+                "hash_method": group.hash_method,
+                "file_hash": group.file_hash,
+                "reclaimable_bytes": group.reclaimable_bytes,
+                "file_paths": [os.fspath(file_path) for file_path in group.file_paths],
+            }
+            for group in groups
+        ],
+    }
+    json.dump(document, text_out, indent=2)
+    text_out.write("\n")
+
+
+def write_duplicates_csv(groups: Iterable[DuplicateGroup], text_out: TextIO) -> None:
+    """
+    Write duplicate groups as CSV, one row per file.
+
+    Args:
+        groups: The duplicate groups.
+        text_out: A text stream to write to.
+    """
+    writer = csv.writer(text_out)
+    writer.writerow(["group", "size", "hash_method", "file_hash", "file_path"])
+    for index, group in enumerate(groups):
+        for file_path in group.file_paths:
+            writer.writerow(
+                [
+                    index,
+                    group.size,
+                    group.hash_method,
+                    group.file_hash,
+                    os.fspath(file_path),
+                ]
+            )
@@ -0,0 +1,211 @@
+"""
+A persistent cache of file digests, stored in SQLite.
+
+An entry is only used while the file's size, `st_mtime_ns` and inode still match
+the values recorded when it was hashed, so a hit costs a single `stat` and no
+file I/O. The least recently used entries are evicted once the cache holds more
+than `max_entries`.
+"""
+
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from time import time_ns
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT NOT NULL,
+    hash_method TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    file_hash TEXT NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (path, hash_method)
+);
+CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used);
+"""
+
+
+class DigestCache:
+    """
+    A size bounded, least recently used, cache of file digests.
+
+    Writes are committed in batches of `commit_every`, and on :meth:`close`.
+    A connection may only be used from the thread that created it.
+
+    Args:
+        db_path: The SQLite database file. Parent directories are created.
+        max_entries: The number of entries to keep when evicting.
+        refresh: Never return cached digests, but still store new ones.
+        commit_every: The number of writes between commits.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: int = 1_000_000,
+        refresh: bool = False,
+        commit_every: int = 1000,
+    ) -> None:
+        """Create the DigestCache, see the class docstring for the arguments."""
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self._pending_writes = 0
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        # Rows put since the last count are all counted as new, replaced or not.
+        (self._entries,) = self._connection.execute(
+            "SELECT count(*) FROM digests"
+        ).fetchone()
+
+    def __repr__(self) -> str:
+        """The DigestCache as a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(db_path={self.db_path!r}, "
+            f"max_entries={self.max_entries!r}, refresh={self.refresh!r}, "
+            f"commit_every={self.commit_every!r})"
+        )
+
+    def __enter__(self) -> "DigestCache":
+        """Return the DigestCache itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Commit and close the database."""
+        self.close()
+
+    @staticmethod
+    def _key_path(file_path: Path) -> str:
+        # abspath does not touch the file system, unlike Path.resolve.
+        return os.path.abspath(file_path)
+
+    def get(
+        self, file_path: Path, hash_method: str, file_stat: os.stat_result
+    ) -> str | None:
+        """
+        Look up the digest of an unchanged file.
+
+        Args:
+            file_path: The hashed file.
+            hash_method: The name of the hash algorithm.
+            file_stat: A current `stat` of the file.
+
+        Returns:
+            The cached hex digest, or None if there is no entry that still matches.
+        """
+        if self.refresh:
+            self.misses += 1
+            return None
+        key_path = self._key_path(file_path)
+        row = self._connection.execute(
+            "SELECT file_hash FROM digests WHERE path = ? AND hash_method = ?"
+            " AND size = ? AND mtime_ns = ? AND inode = ?",
+            (
+                key_path,
+                hash_method,
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                file_stat.st_ino,
+            ),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._write(
+            "UPDATE digests SET last_used = ? WHERE path = ? AND hash_method = ?",
+            (time_ns(), key_path, hash_method),
+        )
+        return row[0]
+
+    def put(
+        self,
+        file_path: Path,
+        hash_method: str,
+        file_stat: os.stat_result,
+        file_hash: str,
+    ) -> None:
+        """
+        Store the digest of a file.
+
+        Args:
+            file_path: The hashed file.
+            hash_method: The name of the hash algorithm.
+            file_stat: The `stat` of the file, taken before it was hashed.
+            file_hash: The hex digest.
+        """
+        self._write(
+            "INSERT OR REPLACE INTO digests"
+            " (path, hash_method, size, mtime_ns, inode, file_hash, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self._key_path(file_path),
+                hash_method,
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                file_stat.st_ino,
+                file_hash,
+                time_ns(),
+            ),
+        )
+        self._entries += 1
+
+    def _write(self, sql: str, parameters: tuple) -> None:
+        self._connection.execute(sql, parameters)
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.commit()
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries beyond `max_entries`.
+
+        The entries are only counted when the running count says there may be
+        too many, so this is cheap when the cache is below its limit.
+
+        Returns:
+            The number of entries removed.
+        """
+        if self._entries <= self.max_entries:
+            return 0
+        (self._entries,) = self._connection.execute(
+            "SELECT count(*) FROM digests"
+        ).fetchone()
+        surplus = self._entries - self.max_entries
+        if surplus <= 0:
+            return 0
+        cursor = self._connection.execute(
+            "DELETE FROM digests WHERE rowid IN (SELECT rowid FROM digests"
+            " ORDER BY last_used ASC LIMIT ?)",
+            (surplus,),
+        )
+        self._entries -= cursor.rowcount
+        logger.debug("Evicted %d entries from %s", cursor.rowcount, self.db_path)
+        return cursor.rowcount
+
+    def commit(self) -> None:
+        """Evict surplus entries and commit pending writes."""
+        self.evict()
+        self._connection.commit()
+        self._pending_writes = 0
+
+    def close(self) -> None:
+        """Commit and close the database."""
+        self.commit()
+        self._connection.close()
+
+    def stats(self) -> str:
+        """The hit and miss counts, as a human readable line."""
+        return f"Digest cache: {self.hits} hits, {self.misses} misses"
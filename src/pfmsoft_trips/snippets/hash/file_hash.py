@@ -9,13 +9,53 @@
 # Source: https://github.com/DonalChilde/snippets  #
 ####################################################
 
+import errno
+import logging
+import mmap
+import os
+import stat
+from collections.abc import Iterable, Iterator, Sequence
 from dataclasses import dataclass
 from pathlib import Path
-from typing import TYPE_CHECKING, BinaryIO, Callable, Protocol
+from time import perf_counter_ns
+from typing import TYPE_CHECKING, BinaryIO, Callable, Literal, Protocol, get_args
+
+from pfmsoft_trips.snippets.hash.block_size import BlockSize, resolve_block_size
+from pfmsoft_trips.snippets.hash.instrument import FileTimer, active_stats
+from pfmsoft_trips.snippets.hash.io_policy import (
+    IO_POLICIES,
+    IoPolicy,
+    ReleasingReader,
+    open_noatime,
+)
 
 if TYPE_CHECKING:
     from hashlib import _Hash
 
+    from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+# One INFO record per file hashed by make_hashed_file, with the details in
+# `record.data`, e.g. for logging.JsonLinesFormatter. Off unless this logger is
+# set to INFO and given a handler. It does not propagate, so an INFO level on the
+# root or package logger does not turn it on.
+metrics_logger = logging.getLogger("pfmsoft_trips.metrics.hash")
+metrics_logger.addHandler(logging.NullHandler())
+metrics_logger.propagate = False
+metrics_logger.setLevel(logging.WARNING)
+
+ReadStrategy = Literal["read", "readinto", "mmap", "sparse", "auto"]
+READ_STRATEGIES: tuple[str, ...] = get_args(ReadStrategy)
+# Below this size the cost of setting up a mapping outweighs the saved copy.
+MMAP_THRESHOLD = 2**20 * 4
+SPARSE_SUPPORTED = hasattr(os, "SEEK_DATA") and hasattr(os, "SEEK_HOLE")
+# "auto" reads a file with "sparse" once it has at least this many bytes of holes.
+SPARSE_THRESHOLD = 2**20
+ZERO_BLOCK_SIZE = 2**20
+# Holes are fed to the hasher from slices of this, instead of being read.
+_ZERO_BLOCK = memoryview(bytes(ZERO_BLOCK_SIZE))
+
 
 def hash_binary_file(
     file_handle: BinaryIO, hasher: "_Hash", block_size: int = 2**10 * 64
@@ -42,7 +82,323 @@ def hash_binary_file(
     return hasher.hexdigest()
 
 
-def hash_file(file_path: Path, hasher: "_Hash", block_size: int = 2**10 * 64) -> str:
+def hash_binary_file_readinto(
+    file_handle: BinaryIO,
+    hasher: "_Hash",
+    block_size: int = 2**10 * 64,
+    buffer: bytearray | None = None,
+) -> str:
+    """
+    Calculate the hash digest for a file, reading into a reusable buffer.
+
+    Unlike :func:`hash_binary_file`, no new `bytes` object is allocated per block.
+    The file is read into a preallocated buffer with `readinto`, and the hasher
+    is fed a `memoryview` of the filled part of the buffer. Pass the same
+    `buffer` to successive calls to reuse it across files.
+
+    Args:
+        file_handle: The file handle for a file opened in binary mode.
+        hasher: The hasher used to generate the hexdigest.
+        block_size: The size of the buffer to allocate, if `buffer` is None.
+            Defaults to 2**10*64 (64K).
+        buffer: A preallocated buffer to read into. Its length sets the read size.
+
+    Returns:
+        A hexidecimal string representing the file hash.
+    """
+    if buffer is None:
+        buffer = bytearray(block_size)
+    with file_handle, memoryview(buffer) as view:
+        size = file_handle.readinto(view)
+        while size:
+            hasher.update(view[:size])
+            size = file_handle.readinto(view)
+    return hasher.hexdigest()
+
+
+@dataclass
+class StreamStats:
+    """
+    The bytes read from a stream by :func:`hash_stream`, and how long it took.
+
+    Attributes:
+        bytes_read: The bytes read.
+        elapsed_ns: The time spent, in nanoseconds.
+    """
+
+    bytes_read: int = 0
+    elapsed_ns: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """The throughput in MB/s."""
+        return self.bytes_read / 2**20 / (max(self.elapsed_ns, 1) / 1e9)
+
+
+def hash_stream(
+    stream: BinaryIO,
+    hasher: "_Hash",
+    block_size: int = 2**20,
+    tee: BinaryIO | None = None,
+    stats: StreamStats | None = None,
+) -> str:
+    """
+    Calculate the hash digest of a stream, e.g. `sys.stdin.buffer` or a pipe.
+
+    Unlike :func:`hash_binary_file`, the stream is not closed, and can be a
+    stream that can not seek. One buffer is reused for every read.
+
+    Args:
+        stream: A binary stream, read to the end.
+        hasher: The hasher used to generate the hexdigest.
+        block_size: The size of each read. Defaults to 2**20 (1M), since pipes
+            deliver data in small pieces and larger reads mean fewer calls.
+        tee: Every block is also written here, so the data can be passed on
+            while it is hashed. It is not closed.
+        stats: Filled in with the bytes read and the elapsed time, if given.
+
+    Returns:
+        A hexidecimal string representing the stream hash.
+    """
+    start = perf_counter_ns()
+    total = 0
+    with memoryview(bytearray(block_size)) as view:
+        while size := stream.readinto(view):
+            block = view[:size]
+            hasher.update(block)
+            if tee is not None:
+                tee.write(block)
+            total += size
+    if tee is not None:
+        tee.flush()
+    if stats is not None:
+        stats.bytes_read += total
+        stats.elapsed_ns += perf_counter_ns() - start
+    return hasher.hexdigest()
+
+
+def hash_binary_file_mmap(
+    file_handle: BinaryIO, hasher: "_Hash", block_size: int = 2**10 * 64
+) -> str:
+    """
+    Calculate the hash digest for a file by memory mapping it.
+
+    The mapped region is fed to the hasher in `block_size` slices, so pages that
+    are already in the page cache are hashed without a copy into userspace.
+    The file must be a non-empty regular file, see :func:`resolve_read_strategy`.
+
+    Args:
+        file_handle: The file handle for a file opened in binary mode.
+        hasher: The hasher used to generate the hexdigest.
+        block_size: The size of the slices fed to the hasher. Defaults to
+            2**10*64 (64K).
+
+    Returns:
+        A hexidecimal string representing the file hash.
+    """
+    with (
+        file_handle,
+        mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        memoryview(mapped) as view,
+    ):
+        for offset in range(0, len(view), block_size):
+            hasher.update(view[offset : offset + block_size])
+    return hasher.hexdigest()
+
+
+@dataclass
+class SparseStats:
+    """
+    The logical, allocated and data bytes of sparse files.
+
+    `allocated_bytes` is from `st_blocks`, so it is rounded up to whole
+    filesystem blocks and can be larger than `logical_bytes` for files without
+    holes. `data_bytes` is the size of the data extents, the bytes actually read.
+    """
+
+    logical_bytes: int = 0
+    allocated_bytes: int = 0
+    data_bytes: int = 0
+    extents: int = 0
+
+    @property
+    def hole_bytes(self) -> int:
+        """The bytes in holes, hashed without being read."""
+        return self.logical_bytes - self.data_bytes
+
+    def add_stat(self, file_stat: os.stat_result) -> None:
+        """Add the logical and allocated bytes of a file."""
+        self.logical_bytes += file_stat.st_size
+        # st_blocks is in 512 byte units, and missing on Windows.
+        self.allocated_bytes += (
+            getattr(file_stat, "st_blocks", file_stat.st_size // 512) * 512
+        )
+
+
+def data_extents(file_descriptor: int, size: int) -> Iterator[tuple[int, int]]:
+    """
+    The `(start, end)` offsets of the data in a file, skipping holes.
+
+    Found with `os.lseek` and `SEEK_DATA`/`SEEK_HOLE`. A filesystem that does
+    not track holes reports the whole file as data.
+
+    Args:
+        file_descriptor: The file descriptor of an open regular file.
+        size: The size of the file. Data past it is not reported.
+
+    Yields:
+        The data extents, in order.
+    """
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(file_descriptor, offset, os.SEEK_DATA)
+        except OSError as error:
+            if error.errno == errno.ENXIO:
+                # Only a hole is left.
+                return
+            if error.errno == errno.EINVAL and offset == 0:
+                yield 0, size
+                return
+            raise
+        if start >= size:
+            return
+        end = min(os.lseek(file_descriptor, start, os.SEEK_HOLE), size)
+        yield start, end
+        offset = end
+
+
+def sparse_file_stats(file_path: Path) -> SparseStats:
+    """The logical, allocated and data bytes of a file, without reading it."""
+    stats = SparseStats()
+    with open(file_path, mode="rb", buffering=0) as file_handle:
+        file_stat = os.fstat(file_handle.fileno())
+        stats.add_stat(file_stat)
+        if not SPARSE_SUPPORTED or not stat.S_ISREG(file_stat.st_mode):
+            stats.data_bytes += file_stat.st_size
+            return stats
+        for start, end in data_extents(file_handle.fileno(), file_stat.st_size):
+            stats.data_bytes += end - start
+            stats.extents += 1
+    return stats
+
+
+def _update_zeros(hasher: "_Hash", count: int) -> None:
+    while count > 0:
+        size = min(count, ZERO_BLOCK_SIZE)
+        hasher.update(_ZERO_BLOCK[:size])
+        count -= size
+
+
+def hash_binary_file_sparse(
+    file_handle: BinaryIO,
+    hasher: "_Hash",
+    block_size: int = 2**10 * 64,
+    buffer: bytearray | None = None,
+    stats: SparseStats | None = None,
+) -> str:
+    """
+    Calculate the hash digest for a file, reading only its data extents.
+
+    Holes are not read, the hasher is fed the same zeros from a shared block
+    instead, so the digest is the same as for :func:`hash_binary_file`. The data
+    extents are read as in :func:`hash_binary_file_readinto`. The file must be
+    a regular file, on a platform with `SEEK_DATA`, see
+    :func:`resolve_read_strategy`. Only the first `st_size` bytes are hashed, as
+    of when the file is opened.
+
+    Args:
+        file_handle: The file handle for a file opened in binary mode.
+        hasher: The hasher used to generate the hexdigest.
+        block_size: The size of the buffer to allocate, if `buffer` is None.
+            Defaults to 2**10*64 (64K).
+        buffer: A preallocated buffer to read into. Its length sets the read size.
+        stats: Filled in with the logical, allocated and data bytes, if given.
+
+    Returns:
+        A hexidecimal string representing the file hash.
+    """
+    if buffer is None:
+        buffer = bytearray(block_size)
+    with file_handle, memoryview(buffer) as view:
+        file_descriptor = file_handle.fileno()
+        file_stat = os.fstat(file_descriptor)
+        offset = 0
+        data_bytes = 0
+        extents = 0
+        for start, end in data_extents(file_descriptor, file_stat.st_size):
+            _update_zeros(hasher, start - offset)
+            file_handle.seek(start)
+            offset = start
+            while offset < end:
+                size = file_handle.readinto(view[: min(len(view), end - offset)])
+                if not size:
+                    break
+                hasher.update(view[:size])
+                offset += size
+            data_bytes += offset - start
+            extents += 1
+            if offset < end:
+                # Truncated while hashing, like the other strategies stop at EOF.
+                break
+        else:
+            _update_zeros(hasher, file_stat.st_size - offset)
+    if stats is not None:
+        stats.add_stat(file_stat)
+        stats.data_bytes += data_bytes
+        stats.extents += extents
+    return hasher.hexdigest()
+
+
+def resolve_read_strategy(
+    file_descriptor: int,
+    strategy: ReadStrategy,
+    mmap_threshold: int = MMAP_THRESHOLD,
+    sparse_threshold: int = SPARSE_THRESHOLD,
+) -> ReadStrategy:
+    """
+    Choose a concrete read strategy for an open file.
+
+    "mmap" and "sparse" are only used for non-empty regular files, anything else
+    (empty files, pipes, character devices) falls back to "readinto", as does
+    "sparse" on platforms without `SEEK_DATA`. "auto" picks "readinto" for files
+    smaller than `mmap_threshold` bytes. For larger files it picks "sparse" if
+    at least `sparse_threshold` bytes are not allocated, and "mmap" otherwise.
+
+    Args:
+        file_descriptor: The file descriptor of the open file.
+        strategy: The requested strategy.
+        mmap_threshold: The smallest file size for which "auto" uses "mmap".
+        sparse_threshold: The fewest unallocated bytes for which "auto" uses
+            "sparse".
+
+    Returns:
+        The strategy to use for this file.
+    """
+    if strategy not in ("mmap", "sparse", "auto"):
+        return strategy
+    file_stat = os.fstat(file_descriptor)
+    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+        return "readinto"
+    if strategy == "sparse":
+        return "sparse" if SPARSE_SUPPORTED else "readinto"
+    if strategy == "auto":
+        if file_stat.st_size < mmap_threshold:
+            return "readinto"
+        allocated = getattr(file_stat, "st_blocks", file_stat.st_size // 512) * 512
+        if SPARSE_SUPPORTED and file_stat.st_size - allocated >= sparse_threshold:
+            return "sparse"
+    return "mmap"
+
+
+def hash_file(
+    file_path: Path,
+    hasher: "_Hash",
+    block_size: BlockSize = 2**10 * 64,
+    strategy: ReadStrategy = "read",
+    buffer: bytearray | None = None,
+    io_policy: IoPolicy = "default",
+) -> str:
     """
     Calculate the hash digest for a file as a hexidecimal string.
 
@@ -52,16 +408,87 @@ def hash_file(file_path: Path, hasher: "_Hash", block_size: int = 2**10 * 64) ->
     Args:
         file_path: The path for a file to be opened in binary mode.
         hasher: The hasher used to generate the hexdigest.
-        block_size: The block size used to read the file. Defaults to 2**10*64 (64K).
+        block_size: The block size used to read the file, or "auto" to use the
+            size calibrated for the file's device, see :mod:`block_size`.
+            Defaults to 2**10*64 (64K).
+        strategy: How the file is read. "read" allocates a new block per read,
+            "readinto" reuses a single buffer, "mmap" maps the file into memory,
+            "sparse" skips the holes of sparse files, and "auto" chooses one of
+            "readinto", "mmap" and "sparse" by file size and allocated size.
+            Defaults to "read".
+        buffer: A preallocated buffer for the "readinto" and "sparse" strategies.
+        io_policy: "bulk" to open the file with `O_NOATIME`, and drop it from
+            the page cache as it is read, see :mod:`io_policy`. "mmap", whether
+            requested or chosen by "auto", is read as "readinto" instead.
+            Defaults to "default".
 
     Returns:
         A hexidecimal string representing the file hash.
     """
-    with open(file_path, mode="rb") as file_handle:
-        hex_digest = hash_binary_file(
-            file_handle=file_handle, hasher=hasher, block_size=block_size
-        )
-    return hex_digest
+    if strategy not in READ_STRATEGIES:
+        raise ValueError(f"Unknown read strategy {strategy!r}")
+    if io_policy not in IO_POLICIES:
+        raise ValueError(f"Unknown I/O policy {io_policy!r}")
+    opener = open_noatime if io_policy == "bulk" else None
+    block_size = resolve_block_size(file_path, block_size)
+    timer = None
+    stats = active_stats()
+    if stats is not None:
+        # Only wrapped while collecting stats, see :mod:`instrument`.
+        timer = FileTimer(stats, hasher)
+        hasher = timer.hasher  # type: ignore[assignment]
+    try:
+        if strategy == "read":
+            logger.debug("Hashing %s with the 'read' strategy", file_path)
+            with open(file_path, mode="rb", opener=opener) as file_handle:
+                if io_policy == "bulk":
+                    file_handle = ReleasingReader(file_handle)  # type: ignore[assignment]
+                if timer is not None:
+                    file_handle = timer.wrap(file_handle)
+                hex_digest = hash_binary_file(
+                    file_handle=file_handle, hasher=hasher, block_size=block_size
+                )
+            return hex_digest
+        # Unbuffered, so readinto goes straight from the OS into our buffer.
+        with open(file_path, mode="rb", buffering=0, opener=opener) as raw_handle:
+            resolved = resolve_read_strategy(raw_handle.fileno(), strategy)
+            if io_policy == "bulk" and resolved == "mmap":
+                # Mapped pages are not read through ReleasingReader, so they
+                # would stay cached until the file is closed.
+                resolved = "readinto"
+            logger.debug(
+                "Hashing %s with the %r strategy (requested %r)",
+                file_path,
+                resolved,
+                strategy,
+            )
+            file_handle = raw_handle  # type: ignore[assignment]
+            if io_policy == "bulk":
+                file_handle = ReleasingReader(file_handle)  # type: ignore[assignment]
+            if timer is not None:
+                file_handle = timer.wrap(file_handle)
+            if resolved == "mmap":
+                return hash_binary_file_mmap(
+                    file_handle=file_handle,
+                    hasher=hasher,
+                    block_size=block_size,
+                )
+            if resolved == "sparse":
+                return hash_binary_file_sparse(
+                    file_handle=file_handle,
+                    hasher=hasher,
+                    block_size=block_size,
+                    buffer=buffer,
+                )
+            return hash_binary_file_readinto(
+                file_handle=file_handle,
+                hasher=hasher,
+                block_size=block_size,
+                buffer=buffer,
+            )
+    finally:
+        if timer is not None:
+            timer.finish()
 
 
 class HashedFileProtocol(Protocol):
@@ -80,16 +507,172 @@ class HashedFile:
 def hashed_file_result_factory(
     file_path: Path, file_hash: str, hash_method: str
 ) -> HashedFileProtocol:
+    """The default `result_factory`, making a :class:`HashedFile`."""
     return HashedFile(file_path=file_path, file_hash=file_hash, hash_method=hash_method)
 
 
 def make_hashed_file(
     file_path: Path,
     hasher: "_Hash",
-    block_size: int = 2**10 * 64,
+    block_size: BlockSize = 2**10 * 64,
     result_factory: Callable[
         [Path, str, str], HashedFileProtocol
     ] = hashed_file_result_factory,
+    strategy: ReadStrategy = "read",
+    buffer: bytearray | None = None,
+    cache: "DigestCache | None" = None,
+    io_policy: IoPolicy = "default",
 ):
-    hash_str = hash_file(file_path=file_path, hasher=hasher, block_size=block_size)
+    """
+    Hash a file with :func:`hash_file`, and wrap the digest with `result_factory`.
+
+    With a `cache`, an unchanged file is not read again. The hash is logged to
+    the metrics logger when it is enabled for INFO.
+    """
+    if cache is not None:
+        file_stat = os.stat(file_path)
+        cached_hash = cache.get(file_path, hasher.name, file_stat)
+        if cached_hash is not None:
+            stats = active_stats()
+            if stats is not None:
+                stats.add_cache_hit()
+            return result_factory(file_path, cached_hash, hasher.name)
+    emit_metrics = metrics_logger.isEnabledFor(logging.INFO)
+    if emit_metrics:
+        start = perf_counter_ns()
+    hash_str = hash_file(
+        file_path=file_path,
+        hasher=hasher,
+        block_size=block_size,
+        strategy=strategy,
+        buffer=buffer,
+        io_policy=io_policy,
+    )
+    if emit_metrics:
+        elapsed_ns = perf_counter_ns() - start
+        size = (file_stat if cache is not None else os.stat(file_path)).st_size
+        metrics_logger.info(
+            "hashed",
+            extra={
+                "data": {
+                    "path": os.fspath(file_path),
+                    "size": size,
+                    "algorithm": hasher.name,
+                    "digest": hash_str,
+                    "elapsed_ns": elapsed_ns,
+                    "bytes_per_s": round(size / (max(elapsed_ns, 1) / 1e9)),
+                }
+            },
+        )
+    if cache is not None:
+        cache.put(file_path, hasher.name, file_stat, hash_str)
     return result_factory(file_path, hash_str, hasher.name)
+
+
+class MultiHasher:
+    """
+    Feed several hashers from a single pass over the data.
+
+    A `MultiHasher` can be passed anywhere a single hasher is expected, e.g.
+    :func:`hash_file`, so that a file is only read once for all the digests.
+    Use :meth:`hexdigests` to get the individual digests.
+    """
+
+    def __init__(self, hashers: Iterable["_Hash"]) -> None:
+        """Create the MultiHasher, see the class docstring for the arguments."""
+        self.hashers: tuple[_Hash, ...] = tuple(hashers)
+        names = [hasher.name for hasher in self.hashers]
+        if not names:
+            raise ValueError("At least one hasher is required.")
+        if len(set(names)) != len(names):
+            raise ValueError(f"Hasher names must be unique, got {names}")
+        self.name = ",".join(names)
+
+    def __repr__(self) -> str:
+        """The MultiHasher as a constructor call."""
+        return f"{self.__class__.__qualname__}(hashers={self.hashers!r})"
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        """Feed the same data to every hasher."""
+        for hasher in self.hashers:
+            hasher.update(data)
+
+    def hexdigests(self) -> dict[str, str]:
+        """The hex digest of each hasher, keyed by hasher name."""
+        return {hasher.name: hasher.hexdigest() for hasher in self.hashers}
+
+    def hexdigest(self) -> str:
+        """The hex digests of all hashers, in order, separated by a space."""
+        return " ".join(hasher.hexdigest() for hasher in self.hashers)
+
+
+def multi_hash_file(
+    file_path: Path,
+    hashers: Sequence["_Hash"],
+    block_size: BlockSize = 2**10 * 64,
+    strategy: ReadStrategy = "read",
+    buffer: bytearray | None = None,
+) -> dict[str, str]:
+    """
+    Calculate several hash digests for a file, reading it only once.
+
+    Args:
+        file_path: The path for a file to be opened in binary mode.
+        hashers: The hashers used to generate the hexdigests.
+        block_size: The block size used to read the file. Defaults to 2**10*64 (64K).
+        strategy: How the file is read, see :func:`hash_file`.
+        buffer: A preallocated buffer for the "readinto" strategy.
+
+    Returns:
+        The hexidecimal digests, keyed by hasher name.
+    """
+    multi_hasher = MultiHasher(hashers)
+    hash_file(
+        file_path=file_path,
+        hasher=multi_hasher,  # type: ignore[arg-type]
+        block_size=block_size,
+        strategy=strategy,
+        buffer=buffer,
+    )
+    return multi_hasher.hexdigests()
+
+
+@dataclass
+class MultiHashedFile:
+    """
+    The digests of a file for several hash methods.
+
+    Attributes:
+        file_path: The path of the file.
+        file_hashes: The hex digests, keyed by hash method.
+    """
+
+    file_path: Path
+    file_hashes: dict[str, str]
+
+    def hashed_files(self) -> list[HashedFile]:
+        """Split into one `HashedFile` per hash method."""
+        return [
+            HashedFile(
+                file_path=self.file_path, file_hash=file_hash, hash_method=hash_method
+            )
+            for hash_method, file_hash in self.file_hashes.items()
+        ]
+
+
+def make_multi_hashed_file(
+    file_path: Path,
+    hashers: Sequence["_Hash"],
+    block_size: BlockSize = 2**10 * 64,
+    strategy: ReadStrategy = "read",
+    buffer: bytearray | None = None,
+) -> MultiHashedFile:
+    """Hash a file with several hashers, reading it once, as a `MultiHashedFile`."""
+    file_hashes = multi_hash_file(
+        file_path=file_path,
+        hashers=hashers,
+        block_size=block_size,
+        strategy=strategy,
+        buffer=buffer,
+    )
+    return MultiHashedFile(file_path=file_path, file_hashes=file_hashes)
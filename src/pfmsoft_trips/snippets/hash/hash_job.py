@@ -0,0 +1,198 @@
+"""
+Journal the results of a long hashing run, so that it can be resumed.
+
+Each result is appended to the journal as a JSON line. The journal is flushed
+and fsynced every `sync_every` results or `sync_interval` seconds, and when
+closed, so a crash loses at most the last batch. A line torn by the crash is
+dropped when the journal is resumed.
+
+A resumed journal holds the earlier results in a :class:`HashedFileTable`, for
+the output of the resumed run, and skips their paths with :meth:`pending`.
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic
+
+from pfmsoft_trips.snippets.hash.file_hash import HashedFileProtocol
+from pfmsoft_trips.snippets.hash.hashed_file_table import HashedFileTable
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+JOURNAL_VERSION = 1
+
+
+class HashJournal:
+    """
+    An append only journal of hashed file results, for a single hash method.
+
+    Args:
+        journal_path: The journal file. Parent directories are created.
+        hash_method: The hash method of the results.
+        resume: Load the results of an existing journal, and append to it. If
+            False, the journal must not exist yet.
+        sync_every: The number of results between fsyncs.
+        sync_interval: The longest time between fsyncs, in seconds, checked as
+            results are appended.
+
+    Raises:
+        FileExistsError: If the journal exists and `resume` is False.
+        ValueError: If a resumed journal is for another hash method, or is not
+            a journal.
+    """
+
+    def __init__(
+        self,
+        journal_path: Path,
+        hash_method: str,
+        resume: bool = False,
+        sync_every: int = 1000,
+        sync_interval: float = 5.0,
+    ) -> None:
+        """Create the HashJournal, see the class docstring for the arguments."""
+        self.journal_path = journal_path
+        self.hash_method = hash_method
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.completed = HashedFileTable(hash_method)
+        self._completed_paths: set[str] = set()
+        self._pending_writes = 0
+        self._last_sync = monotonic()
+        exists = journal_path.exists() and journal_path.stat().st_size > 0
+        if exists and not resume:
+            raise FileExistsError(f"The journal {journal_path} already exists.")
+        if exists:
+            self._load()
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(journal_path, "ab")
+        if not exists:
+            header = {"hash_method": hash_method, "version": JOURNAL_VERSION}
+            self._file.write(json.dumps(header).encode() + b"\n")
+            self.sync()
+
+    def __repr__(self) -> str:
+        """The HashJournal as a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(journal_path={self.journal_path!r}, "
+            f"hash_method={self.hash_method!r}, sync_every={self.sync_every!r}, "
+            f"sync_interval={self.sync_interval!r})"
+        )
+
+    def __enter__(self) -> "HashJournal":
+        """Return the HashJournal itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Sync and close the journal."""
+        self.close()
+
+    def __contains__(self, file_path: object) -> bool:
+        """Whether a path is in the journal."""
+        if not isinstance(file_path, str | os.PathLike):
+            return False
+        return os.fspath(file_path) in self._completed_paths
+
+    def _load(self) -> None:
+        data = self.journal_path.read_bytes()
+        lines = data.split(b"\n")
+        # Anything after the last newline was torn by a crash.
+        torn = lines.pop()
+        if torn:
+            logger.warning(
+                "Dropping a partial entry from the end of %s", self.journal_path
+            )
+            with open(self.journal_path, "r+b") as journal_file:
+                journal_file.truncate(len(data) - len(torn))
+        try:
+            header = json.loads(lines[0])
+            if header.get("version") != JOURNAL_VERSION:
+                raise ValueError(header)
+        except (IndexError, ValueError) as error:
+            raise ValueError(
+                f"{self.journal_path} is not a hash journal, or is not supported."
+            ) from error
+        if header["hash_method"] != self.hash_method:
+            raise ValueError(
+                f"{self.journal_path} is a {header['hash_method']} journal, "
+                f"not {self.hash_method}."
+            )
+        for line in lines[1:]:
+            entry = json.loads(line)
+            if entry["file_path"] not in self._completed_paths:
+                self._completed_paths.add(entry["file_path"])
+                self.completed.append(entry["file_path"], entry["file_hash"])
+        logger.info("Resuming %s with %d results", self.journal_path, len(self))
+
+    def __len__(self) -> int:
+        """The number of journaled paths."""
+        return len(self._completed_paths)
+
+    def append(self, result: HashedFileProtocol) -> None:
+        """Journal a result, syncing if a batch is due."""
+        file_path = os.fspath(result.file_path)
+        entry = {"file_path": file_path, "file_hash": result.file_hash}
+        self._file.write(json.dumps(entry).encode() + b"\n")
+        self._completed_paths.add(file_path)
+        self._pending_writes += 1
+        if (
+            self._pending_writes >= self.sync_every
+            or monotonic() - self._last_sync >= self.sync_interval
+        ):
+            self.sync()
+
+    def sync(self) -> None:
+        """Flush the journaled results to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending_writes = 0
+        self._last_sync = monotonic()
+
+    def close(self) -> None:
+        """Sync and close the journal. Closing twice does nothing."""
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def pending(self, file_paths: Iterable[Path]) -> Iterator[Path]:
+        """Lazily yield the paths that are not in the journal."""
+        for file_path in file_paths:
+            if file_path not in self:
+                yield file_path
+
+    def record(
+        self, results: Iterable[HashedFileProtocol]
+    ) -> Iterator[HashedFileProtocol]:
+        """Journal each result as it is yielded."""
+        for result in results:
+            self.append(result)
+            yield result
+
+
+def _raise_interrupt(signum: int, frame: object) -> None:
+    raise KeyboardInterrupt(f"Received {signal.Signals(signum).name}")
+
+
+@contextmanager
+def interrupt_on_terminate() -> Iterator[None]:
+    """
+    Raise :py:exc:`KeyboardInterrupt` on SIGTERM, as on SIGINT.
+
+    So that `finally` blocks, e.g. closing a journal, also run when a job is
+    killed. Does nothing outside of the main thread, where signal handlers
+    cannot be set.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
@@ -0,0 +1,240 @@
+"""
+Compact stores for large numbers of hashed file results.
+
+:class:`HashedFile` holds a `Path` and a hex `str`, several hundred bytes per
+file. For millions of files, use :class:`CompactHashedFile`, a slotted record of
+a `str` path and raw digest bytes, or :class:`HashedFileTable`, which keeps all
+paths in one buffer and all digests in one `bytearray`, a few dozen bytes per
+file over the length of the path.
+
+Both satisfy :class:`HashedFileProtocol`, building the `Path` and hex digest
+only when asked for. See `benchmarks/bench_result_store.py` for the memory use
+of each.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from pfmsoft_trips.snippets.hash.file_hash import HashedFileProtocol
+
+TABLE_MAGIC = b"pfmsoft-trips hashed file table 1\n"
+
+
+@dataclass(frozen=True, slots=True)
+class CompactHashedFile:
+    """
+    A hashed file result, as a `str` path and raw digest bytes.
+
+    Attributes:
+        path: The path of the file.
+        digest: The raw digest.
+        hash_method: The hash method, interned.
+    """
+
+    path: str
+    digest: bytes
+    hash_method: str
+
+    @property
+    def file_path(self) -> Path:
+        """The path of the file, as a `Path`."""
+        return Path(self.path)
+
+    @property
+    def file_hash(self) -> str:
+        """The hex digest."""
+        return self.digest.hex()
+
+
+def compact_hashed_file_result_factory(
+    file_path: Path, file_hash: str, hash_method: str
+) -> HashedFileProtocol:
+    """A `result_factory` for :func:`file_hash.make_hashed_file`."""
+    return CompactHashedFile(
+        path=os.fspath(file_path),
+        digest=bytes.fromhex(file_hash),
+        hash_method=sys.intern(hash_method),
+    )
+
+
+class HashedFileView:
+    """One row of a :class:`HashedFileTable`, read on access."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "HashedFileTable", index: int) -> None:
+        """View row `index` of `table`."""
+        self._table = table
+        self._index = index
+
+    def __repr__(self) -> str:
+        """The fields of the row, in the form of a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(file_path={self.file_path!r}, "
+            f"file_hash={self.file_hash!r}, hash_method={self.hash_method!r})"
+        )
+
+    @property
+    def file_path(self) -> Path:
+        """The path of the row, as a `Path`."""
+        return Path(self._table.path(self._index))
+
+    @property
+    def file_hash(self) -> str:
+        """The hex digest of the row."""
+        return self._table.digest(self._index).hex()
+
+    @property
+    def hash_method(self) -> str:
+        """The hash method of the table."""
+        return self._table.hash_method
+
+
+class HashedFileTable:
+    """
+    A columnar store of hashed file results, for a single hash method.
+
+    Paths are stored encoded with :py:func:`os.fsencode` in one `bytearray`,
+    indexed by an array of end offsets. Digests are stored as raw bytes in
+    another `bytearray`, at a fixed size per row.
+
+    Args:
+        hash_method: A hash name accepted by :py:func:`hashlib.new`. Variable
+            length digests, like shake, are not supported.
+    """
+
+    def __init__(self, hash_method: str) -> None:
+        """Create the HashedFileTable, see the class docstring for the arguments."""
+        self.hash_method = hash_method
+        self.digest_size = hashlib.new(hash_method).digest_size
+        self._paths = bytearray()
+        self._path_ends = array("Q")
+        self._digests = bytearray()
+
+    def __len__(self) -> int:
+        """The number of rows."""
+        return len(self._path_ends)
+
+    def __getitem__(self, index: int) -> HashedFileView:
+        """A view of a row, negative indexes count from the end."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Index {index} out of range for {len(self)} rows.")
+        return HashedFileView(self, index)
+
+    def __iter__(self) -> Iterator[HashedFileView]:
+        """Views of the rows, in order."""
+        return (HashedFileView(self, index) for index in range(len(self)))
+
+    def path(self, index: int) -> str:
+        """The path of a row, as a `str`."""
+        start = self._path_ends[index - 1] if index else 0
+        return os.fsdecode(bytes(self._paths[start : self._path_ends[index]]))
+
+    def digest(self, index: int) -> bytes:
+        """The raw digest of a row."""
+        start = index * self.digest_size
+        return bytes(self._digests[start : start + self.digest_size])
+
+    def append(self, file_path: Path | str, file_hash: str | bytes) -> None:
+        """
+        Add a row.
+
+        Args:
+            file_path: The path of the file.
+            file_hash: The hex digest, or the raw digest bytes.
+        """
+        digest = bytes.fromhex(file_hash) if isinstance(file_hash, str) else file_hash
+        if len(digest) != self.digest_size:
+            raise ValueError(
+                f"Expected a {self.digest_size} byte {self.hash_method} digest,"
+                f" got {len(digest)} bytes."
+            )
+        self._paths += os.fsencode(file_path)
+        self._path_ends.append(len(self._paths))
+        self._digests += digest
+
+    def extend(self, results: Iterable[HashedFileProtocol]) -> None:
+        """Add hashed file results, which must use this table's hash method."""
+        for result in results:
+            if result.hash_method != self.hash_method:
+                raise ValueError(
+                    f"Expected a {self.hash_method} result, got {result.hash_method}"
+                    f" for {result.file_path}"
+                )
+            self.append(result.file_path, result.file_hash)
+
+    def nbytes(self) -> int:
+        """The size of the buffers holding the rows."""
+        return (
+            len(self._paths)
+            + self._path_ends.itemsize * len(self._path_ends)
+            + len(self._digests)
+        )
+
+    def save(self, file_path: Path) -> None:
+        """
+        Save the table to a binary file, in bulk.
+
+        Args:
+            file_path: The file to write.
+        """
+        path_ends = array("Q", self._path_ends)
+        if sys.byteorder != "little":
+            path_ends.byteswap()
+        header = {
+            "hash_method": self.hash_method,
+            "digest_size": self.digest_size,
+            "rows": len(self),
+            "path_bytes": len(self._paths),
+        }
+        with open(file_path, "wb") as file_out:
+            file_out.write(TABLE_MAGIC)
+            file_out.write(json.dumps(header).encode() + b"\n")
+            path_ends.tofile(file_out)
+            file_out.write(self._paths)
+            file_out.write(self._digests)
+
+    @classmethod
+    def load(cls, file_path: Path) -> "HashedFileTable":
+        """
+        Load a table saved by :meth:`save`.
+
+        Args:
+            file_path: The file to read.
+
+        Returns:
+            The table.
+
+        Raises:
+            ValueError: If the file is not a hashed file table, or is truncated.
+        """
+        with open(file_path, "rb") as file_in:
+            if file_in.readline() != TABLE_MAGIC:
+                raise ValueError(f"{file_path} is not a hashed file table.")
+            header = json.loads(file_in.readline())
+            table = cls(header["hash_method"])
+            if table.digest_size != header["digest_size"]:
+                raise ValueError(f"{file_path} has an unexpected digest size.")
+            try:
+                table._path_ends.fromfile(file_in, header["rows"])
+            except (EOFError, ValueError) as error:
+                # ValueError if the file ends within an offset.
+                raise ValueError(f"{file_path} is truncated.") from error
+            if sys.byteorder != "little":
+                table._path_ends.byteswap()
+            table._paths = bytearray(file_in.read(header["path_bytes"]))
+            table._digests = bytearray(file_in.read())
+        if (
+            len(table._paths) != header["path_bytes"]
+            or len(table._digests) != table.digest_size * header["rows"]
+        ):
+            raise ValueError(f"{file_path} is truncated.")
+        return table
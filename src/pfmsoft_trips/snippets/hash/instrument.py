@@ -0,0 +1,228 @@
+"""
+Time the phases of hashing files: open, read, hash update and output.
+
+Collection is off until :func:`start_stats` is called. While it is on,
+:func:`file_hash.hash_file` wraps each file handle and hasher in timing proxies.
+While it is off nothing is wrapped, so the read loops run exactly as they would
+without this module.
+
+Times are summed over files, and over threads when files are hashed
+concurrently, so the phases can add up to more than the wall clock time. Files
+hashed in a process pool are not counted. Files found in a digest cache are
+counted as `cache_hits`, not as files. With the "mmap" strategy the file is
+read as the hasher touches its pages, so the reads are counted as update time.
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from time import perf_counter_ns
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+if TYPE_CHECKING:
+    from hashlib import _Hash
+
+PHASES = ("open", "read", "update", "output")
+
+
+@dataclass
+class HashStats:
+    """
+    The time spent in each phase of hashing, summed over all files.
+
+    Safe to add to from several threads. Times are in nanoseconds, from
+    :py:func:`time.perf_counter_ns`.
+
+    Attributes:
+        start_ns: When the run started.
+        first_open_ns: When the first file was opened, if any were.
+        open_ns: The time spent opening files.
+        read_ns: The time spent reading files.
+        update_ns: The time spent in the hashers.
+        output_ns: The time spent writing the results.
+        files: The number of files hashed.
+        bytes: The number of bytes hashed.
+        cache_hits: The number of files found in a digest cache, not hashed.
+    """
+
+    start_ns: int = field(default_factory=perf_counter_ns)
+    first_open_ns: int | None = None
+    open_ns: int = 0
+    read_ns: int = 0
+    update_ns: int = 0
+    output_ns: int = 0
+    files: int = 0
+    bytes: int = 0
+    cache_hits: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def add_file(self, timer: "FileTimer") -> None:
+        """Add the times of one file."""
+        with self._lock:
+            if self.first_open_ns is None or timer.created_ns < self.first_open_ns:
+                self.first_open_ns = timer.created_ns
+            self.open_ns += timer.opened_ns - timer.created_ns
+            self.read_ns += timer.reader.elapsed_ns if timer.reader else 0
+            self.update_ns += timer.hasher.elapsed_ns
+            self.files += 1
+            self.bytes += timer.hasher.bytes
+
+    def add_phase(self, phase: str, elapsed_ns: int) -> None:
+        """Add time to a phase that is not timed per file, e.g. "output"."""
+        with self._lock:
+            attribute = f"{phase}_ns"
+            setattr(self, attribute, getattr(self, attribute) + elapsed_ns)
+
+    def add_cache_hit(self) -> None:
+        """Count a file found in a digest cache."""
+        with self._lock:
+            self.cache_hits += 1
+
+    def summary(self, end_ns: int | None = None) -> dict[str, float | int]:
+        """
+        The totals and rates, since `start_ns`.
+
+        `startup_ns` is the time before the first file was opened.
+        """
+        if end_ns is None:
+            end_ns = perf_counter_ns()
+        total_ns = end_ns - self.start_ns
+        seconds = max(total_ns, 1) / 1e9
+        first_open_ns = end_ns if self.first_open_ns is None else self.first_open_ns
+        return {
+            "total_ns": total_ns,
+            "startup_ns": first_open_ns - self.start_ns,
+            "open_ns": self.open_ns,
+            "read_ns": self.read_ns,
+            "update_ns": self.update_ns,
+            "output_ns": self.output_ns,
+            "files": self.files,
+            "bytes": self.bytes,
+            "cache_hits": self.cache_hits,
+            "files_per_s": self.files / seconds,
+            "mb_per_s": self.bytes / 2**20 / seconds,
+        }
+
+
+class TimedHasher:
+    """Time the `update` calls of a hasher, and count the bytes."""
+
+    def __init__(self, hasher: "_Hash") -> None:
+        """Create the TimedHasher, see the class docstring for the arguments."""
+        self.hasher = hasher
+        self.name = hasher.name
+        self.elapsed_ns = 0
+        self.bytes = 0
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        """Update the hasher, timing the call."""
+        start = perf_counter_ns()
+        self.hasher.update(data)
+        self.elapsed_ns += perf_counter_ns() - start
+        self.bytes += len(data)
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else to the hasher."""
+        return getattr(self.hasher, name)
+
+
+class TimedReader:
+    """Time the `read` and `readinto` calls of a file handle."""
+
+    def __init__(self, file_handle: BinaryIO) -> None:
+        """Create the TimedReader, see the class docstring for the arguments."""
+        self.file_handle = file_handle
+        self.elapsed_ns = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to `size` bytes, timing the call."""
+        start = perf_counter_ns()
+        data = self.file_handle.read(size)
+        self.elapsed_ns += perf_counter_ns() - start
+        return data
+
+    def readinto(self, buffer: bytearray | memoryview) -> int | None:
+        """Read into `buffer`, timing the call."""
+        start = perf_counter_ns()
+        size = self.file_handle.readinto(buffer)  # type: ignore[attr-defined]
+        self.elapsed_ns += perf_counter_ns() - start
+        return size
+
+    def __enter__(self) -> "TimedReader":
+        """Return the TimedReader itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the file handle."""
+        self.file_handle.close()
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else to the file handle."""
+        return getattr(self.file_handle, name)
+
+
+class FileTimer:
+    """The timing proxies for hashing one file."""
+
+    def __init__(self, stats: HashStats, hasher: "_Hash") -> None:
+        """Create the FileTimer, see the class docstring for the arguments."""
+        self.stats = stats
+        self.created_ns = perf_counter_ns()
+        self.opened_ns = self.created_ns
+        self.hasher = TimedHasher(hasher)
+        self.reader: TimedReader | None = None
+
+    def wrap(self, file_handle: BinaryIO) -> BinaryIO:
+        """Wrap a file handle, just opened."""
+        self.opened_ns = perf_counter_ns()
+        self.reader = TimedReader(file_handle)
+        return self.reader  # type: ignore[return-value]
+
+    def finish(self) -> None:
+        """Add the times of the file to the stats."""
+        self.stats.add_file(self)
+
+
+_active_stats: HashStats | None = None
+
+
+def start_stats(stats: HashStats | None = None) -> HashStats:
+    """Start collecting stats, process wide."""
+    global _active_stats
+    _active_stats = HashStats() if stats is None else stats
+    return _active_stats
+
+
+def stop_stats() -> HashStats | None:
+    """Stop collecting stats, returning what was collected."""
+    global _active_stats
+    stats, _active_stats = _active_stats, None
+    return stats
+
+
+def active_stats() -> HashStats | None:
+    """The stats being collected, or None."""
+    return _active_stats
+
+
+@contextmanager
+def _timed_phase(stats: HashStats, phase: str) -> Iterator[None]:
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        stats.add_phase(phase, perf_counter_ns() - start)
+
+
+def timed_phase(phase: str):
+    """
+    Time a block as one of the :data:`PHASES`, e.g. writing the output.
+
+    Returns a `nullcontext` when stats are not being collected.
+    """
+    if _active_stats is None:
+        return nullcontext()
+    return _timed_phase(_active_stats, phase)
@@ -0,0 +1,253 @@
+"""
+I/O policies for reading files to hash them.
+
+The "default" policy reads files as any program would. The "bulk" policy is for
+hashing large trees without disturbing the rest of the system:
+
+- Files are opened with `O_NOATIME` where allowed, so reading them does not
+  write their access times. Linux only allows it for the owner of a file, or
+  with `CAP_FOWNER`, otherwise files are opened without it.
+- The kernel is told the file is read sequentially, with `posix_fadvise` and
+  `POSIX_FADV_SEQUENTIAL`, for more readahead.
+- Pages are dropped from the page cache with `POSIX_FADV_DONTNEED` once they
+  have been hashed, every :data:`RELEASE_EVERY` bytes and when the file is
+  closed, so the pages other programs have cached are not evicted to make room.
+  Pages of the file that were cached before it was opened are kept, as found
+  with `mincore`. Where `mincore` is not available they are dropped as well.
+- Files are not memory mapped, :func:`file_hash.hash_file` reads them with
+  "readinto" instead of "mmap", so their pages can be released as they are
+  read rather than only on close.
+
+Where `posix_fadvise` or `O_NOATIME` are not available, e.g. on macOS or
+Windows, "bulk" reads files as "default" does.
+
+:func:`page_cache_residency` counts the pages of a file in the page cache, with
+`mincore`, to check what a policy leaves behind.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import functools
+import logging
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Literal, get_args
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+IoPolicy = Literal["default", "bulk"]
+IO_POLICIES: tuple[str, ...] = get_args(IoPolicy)
+FADVISE_SUPPORTED = hasattr(os, "posix_fadvise")
+NOATIME_SUPPORTED = hasattr(os, "O_NOATIME")
+# Pages are released in steps of this many bytes, not after every read.
+RELEASE_EVERY = 2**23
+# Maps the bytes of a `mincore` vector to 1 for resident pages, else 0.
+_RESIDENT_TABLE = bytes(value & 1 for value in range(256))
+_NOT_RESIDENT = re.compile(b"\x00+")
+
+
+def open_noatime(path: str, flags: int) -> int:
+    """
+    Open a file with `O_NOATIME` if allowed, as an `opener` for :py:func:`open`.
+
+    Falls back to opening without it when the caller does not own the file.
+    """
+    if NOATIME_SUPPORTED:
+        try:
+            return os.open(path, flags | os.O_NOATIME)
+        except PermissionError:
+            logger.debug("O_NOATIME is not allowed for %s", path)
+    return os.open(path, flags)
+
+
+def _fadvise(file_descriptor: int, offset: int, length: int, advice: str) -> None:
+    if not FADVISE_SUPPORTED:
+        return
+    try:
+        os.posix_fadvise(file_descriptor, offset, length, getattr(os, advice))
+    except OSError as error:
+        # e.g. ESPIPE for a pipe, advice is only ever a hint.
+        logger.debug("posix_fadvise %s failed: %s", advice, error)
+
+
+class ReleasingReader:
+    """
+    Drop the pages of a file from the page cache once they have been read.
+
+    Wraps a file handle for the read functions of :mod:`file_hash`, like
+    :class:`instrument.TimedReader`. Pages are released behind the read position
+    every `release_every` bytes, and from the last release to the end of the
+    file on close, which also covers readahead and memory mapped reads. Pages
+    that were resident when the file was opened are not released, if
+    :func:`page_cache_residency` works for the file.
+
+    Args:
+        file_handle: A file handle, just opened.
+        release_every: The number of bytes read between releases.
+    """
+
+    def __init__(
+        self, file_handle: BinaryIO, release_every: int = RELEASE_EVERY
+    ) -> None:
+        """Create the ReleasingReader, see the class docstring for the arguments."""
+        self.file_handle = file_handle
+        self.release_every = release_every
+        self._file_descriptor = file_handle.fileno()
+        self._position = 0
+        self._released = 0
+        # One byte per page, 1 if it was cached before the file was read.
+        self._resident: bytes | None = None
+        if FADVISE_SUPPORTED:
+            try:
+                self._resident = _resident_pages(self._file_descriptor)
+            except OSError as error:
+                logger.debug("Not checking the page cache: %s", error)
+        _fadvise(self._file_descriptor, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+    def _release(self, start: int, end: int | None) -> None:
+        """Drop the pages from `start` to `end`, or to the end of the file."""
+        if self._resident is None:
+            length = 0 if end is None else end - start
+            _fadvise(self._file_descriptor, start, length, "POSIX_FADV_DONTNEED")
+            return
+        first_page = start // mmap.PAGESIZE
+        end_page = len(self._resident)
+        if end is not None:
+            end_page = min(end_page, end // mmap.PAGESIZE)
+        for run in _NOT_RESIDENT.finditer(self._resident, first_page, end_page):
+            _fadvise(
+                self._file_descriptor,
+                run.start() * mmap.PAGESIZE,
+                (run.end() - run.start()) * mmap.PAGESIZE,
+                "POSIX_FADV_DONTNEED",
+            )
+        if end is None:
+            # Past the pages the file had when it was opened.
+            _fadvise(
+                self._file_descriptor,
+                len(self._resident) * mmap.PAGESIZE,
+                0,
+                "POSIX_FADV_DONTNEED",
+            )
+
+    def _advance(self, size: int) -> None:
+        self._position += size
+        if self._position - self._released >= self.release_every:
+            # Whole pages only, the kernel keeps a page that is partly covered.
+            end = self._position - self._position % mmap.PAGESIZE
+            self._release(self._released, end)
+            self._released = end
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to `size` bytes, releasing the pages behind them when due."""
+        data = self.file_handle.read(size)
+        self._advance(len(data))
+        return data
+
+    def readinto(self, buffer: bytearray | memoryview) -> int | None:
+        """Read into `buffer`, releasing the pages behind it when due."""
+        size = self.file_handle.readinto(buffer)  # type: ignore[attr-defined]
+        self._advance(size or 0)
+        return size
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """Seek the file. Seeking back moves the next release back with it."""
+        self._position = self.file_handle.seek(offset, whence)
+        self._released = min(self._released, self._position)
+        return self._position
+
+    def close(self) -> None:
+        """Release the pages from the last release onwards, and close the file."""
+        if not self.file_handle.closed:
+            self._release(self._released, None)
+        self.file_handle.close()
+
+    def __enter__(self) -> "ReleasingReader":
+        """Return the ReleasingReader itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Release the remaining pages, and close the file."""
+        self.close()
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else to the file handle."""
+        return getattr(self.file_handle, name)
+
+
+@functools.cache
+def _load_libc() -> ctypes.CDLL | None:
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "mincore"):
+        return None
+    libc.mmap.restype = ctypes.c_void_p
+    libc.mmap.argtypes = [
+        ctypes.c_void_p,
+        ctypes.c_size_t,
+        ctypes.c_int,
+        ctypes.c_int,
+        ctypes.c_int,
+        ctypes.c_long,
+    ]
+    libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+    return libc
+
+
+def _resident_pages(file_descriptor: int) -> bytes:
+    """
+    One byte per page of an open file, 1 if the page is in the page cache.
+
+    Raises:
+        OSError: If `mincore` is not available, or fails.
+    """
+    libc = _load_libc()
+    if libc is None:
+        raise OSError(errno.ENOSYS, "mincore is not available")
+    size = os.fstat(file_descriptor).st_size
+    pages = -(-size // mmap.PAGESIZE)
+    if not pages:
+        return b""
+    address = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, file_descriptor, 0)
+    if address in (None, ctypes.c_void_p(-1).value):
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    try:
+        vector = (ctypes.c_ubyte * pages)()
+        if libc.mincore(address, size, vector) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+    finally:
+        libc.munmap(address, size)
+    return bytes(vector).translate(_RESIDENT_TABLE)
+
+
+def page_cache_residency(file_path: Path) -> tuple[int, int]:
+    """
+    Count the pages of a file that are in the page cache.
+
+    The file is mapped but not read, so counting does not change the count.
+
+    Args:
+        file_path: A regular file.
+
+    Returns:
+        The number of resident pages, and the number of pages in the file.
+
+    Raises:
+        OSError: If `mincore` is not available, or fails.
+    """
+    with open(file_path, "rb") as file_handle:
+        try:
+            resident = _resident_pages(file_handle.fileno())
+        except OSError as error:
+            error.filename = os.fspath(file_path)
+            raise
+    return resident.count(1), len(resident)
@@ -0,0 +1,273 @@
+"""
+Read, write and verify `md5sum` compatible hash manifests.
+
+A manifest line is `<hex digest>  <path>`, or `<hex digest> *<path>` for files
+hashed in binary mode. As with coreutils, a path containing a backslash or a
+newline is escaped, and the line is prefixed with a backslash.
+
+Manifests are processed one line at a time, so their size is not limited by
+memory.
+"""
+
+import os
+import re
+import stat
+from collections import defaultdict, deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, TextIO
+
+from pfmsoft_trips.snippets.hash.file_hash import HashedFile, HashedFileProtocol
+from pfmsoft_trips.snippets.hash.parallel_hash import PoolKind, hash_files_concurrently
+
+if TYPE_CHECKING:
+    from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+
+MANIFEST_LINE = re.compile(
+    r"^(?P<escaped>\\?)(?P<digest>[0-9a-fA-F]+) [ *](?P<path>.+)$"
+)
+
+VerifyStatus = Literal["OK", "FAILED", "MISSING"]
+
+
+def _escape(path_str: str) -> tuple[str, str]:
+    if "\\" not in path_str and "\n" not in path_str:
+        return "", path_str
+    return "\\", path_str.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _unescape(path_str: str) -> str:
+    return re.sub(r"\\(.)", lambda m: "\n" if m[1] == "n" else m[1], path_str)
+
+
+def format_manifest_line(file_hash: str, file_path: Path) -> str:
+    """
+    Format a manifest line, without the trailing newline.
+
+    Args:
+        file_hash: The hex digest.
+        file_path: The path, written as given.
+
+    Returns:
+        The manifest line.
+    """
+    prefix, path_str = _escape(os.fspath(file_path))
+    return f"{prefix}{file_hash}  {path_str}"
+
+
+def parse_manifest_line(line: str) -> tuple[str, Path] | None:
+    """
+    Parse a manifest line.
+
+    Args:
+        line: The line, with or without the trailing newline.
+
+    Returns:
+        The hex digest and path, or None if the line is improperly formatted.
+    """
+    match = MANIFEST_LINE.match(line.rstrip("\n"))
+    if match is None:
+        return None
+    path_str = match["path"]
+    if match["escaped"]:
+        path_str = _unescape(path_str)
+    return match["digest"].lower(), Path(path_str)
+
+
+def write_manifest(
+    hashed_files: Iterable[HashedFileProtocol], lines_out: TextIO
+) -> int:
+    """
+    Write hashed files as manifest lines.
+
+    Args:
+        hashed_files: The hashed files.
+        lines_out: A text stream to write to.
+
+    Returns:
+        The number of lines written.
+    """
+    count = 0
+    for hashed_file in hashed_files:
+        lines_out.write(
+            format_manifest_line(hashed_file.file_hash, hashed_file.file_path) + "\n"
+        )
+        count += 1
+    return count
+
+
+@dataclass
+class ManifestStats:
+    """
+    Counts of the lines read from a manifest.
+
+    Attributes:
+        entries: The entries read.
+        improperly_formatted: The lines that were neither entries nor blank.
+    """
+
+    entries: int = 0
+    improperly_formatted: int = 0
+
+
+def read_manifest(
+    lines: Iterable[str],
+    hash_method: str,
+    base_dir: Path | None = None,
+    stats: ManifestStats | None = None,
+) -> Iterator[HashedFileProtocol]:
+    """
+    Lazily read the entries of a manifest.
+
+    Improperly formatted lines are skipped, and counted in `stats`.
+
+    Args:
+        lines: The manifest lines, e.g. an open text file.
+        hash_method: The algorithm the manifest was written with.
+        base_dir: Relative paths are taken relative to this directory. Defaults
+            to the current working directory.
+        stats: Counts entries and improperly formatted lines, if given.
+
+    Yields:
+        The expected digest for each listed file.
+    """
+    for line in lines:
+        parsed = parse_manifest_line(line)
+        if parsed is None:
+            if stats is not None and line.strip():
+                stats.improperly_formatted += 1
+            continue
+        file_hash, file_path = parsed
+        if base_dir is not None and not file_path.is_absolute():
+            file_path = base_dir / file_path
+        if stats is not None:
+            stats.entries += 1
+        yield HashedFile(
+            file_path=file_path, file_hash=file_hash, hash_method=hash_method
+        )
+
+
+@dataclass
+class VerifyResult:
+    """
+    The result of checking one manifest entry.
+
+    Attributes:
+        file_path: The listed file.
+        status: The outcome of the check.
+        expected_hash: The digest in the manifest.
+        actual_hash: The digest of the file, if it was read.
+        error: Why the file could not be read, if it could not.
+    """
+
+    file_path: Path
+    status: VerifyStatus
+    expected_hash: str
+    actual_hash: str | None = None
+    error: str | None = None
+
+    def message(self) -> str:
+        """The result as an `md5sum -c` style line."""
+        if self.status == "OK":
+            return f"{self.file_path}: OK"
+        if self.status == "MISSING":
+            return f"{self.file_path}: FAILED open or read"
+        return f"{self.file_path}: FAILED"
+
+
+def precheck_manifest(entries: Iterable[HashedFileProtocol]) -> Iterator[VerifyResult]:
+    """
+    Check that every listed file exists as a regular file, without hashing.
+
+    An md5sum manifest does not record sizes, so this is the cheapest check that
+    can run before any file is read.
+
+    Args:
+        entries: The manifest entries.
+
+    Yields:
+        A "MISSING" result for each entry that can not be verified.
+    """
+    for entry in entries:
+        try:
+            file_stat = os.stat(entry.file_path)
+        except OSError as error:
+            yield VerifyResult(
+                entry.file_path, "MISSING", entry.file_hash, error=str(error)
+            )
+            continue
+        if not stat.S_ISREG(file_stat.st_mode):
+            yield VerifyResult(
+                entry.file_path,
+                "MISSING",
+                entry.file_hash,
+                error="Not a regular file",
+            )
+
+
+def verify_manifest(
+    entries: Iterable[HashedFileProtocol],
+    hash_method: str,
+    max_workers: int | None = None,
+    pool: PoolKind = "thread",
+    ordered: bool = False,
+    cache: "DigestCache | None" = None,
+) -> Iterator[VerifyResult]:
+    """
+    Hash the listed files concurrently, and compare them to the manifest.
+
+    Entries are pulled from `entries` only as workers become free, so memory use
+    is bounded by the number of files in flight. Stop iterating to stop early,
+    pending work is cancelled when the generator is closed.
+
+    Args:
+        entries: The manifest entries, see :func:`read_manifest`.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        max_workers: The pool size. Defaults to the cpu count.
+        pool: Use a "thread" or "process" pool. Defaults to "thread".
+        ordered: Yield results in manifest order.
+        cache: A digest cache.
+
+    Yields:
+        A result for each entry.
+    """
+    expected: defaultdict[Path, deque[str]] = defaultdict(deque)
+    failures: deque[VerifyResult] = deque()
+
+    def expected_hash(file_path: Path) -> str:
+        hashes = expected[file_path]
+        file_hash = hashes.popleft()
+        if not hashes:
+            del expected[file_path]
+        return file_hash
+
+    def file_paths() -> Iterator[Path]:
+        for entry in entries:
+            expected[entry.file_path].append(entry.file_hash)
+            yield entry.file_path
+
+    def on_error(file_path: Path, error: BaseException) -> None:
+        failures.append(
+            VerifyResult(
+                file_path, "MISSING", expected_hash(file_path), error=str(error)
+            )
+        )
+
+    results = hash_files_concurrently(
+        file_paths(),
+        hash_method=hash_method,
+        max_workers=max_workers,
+        pool=pool,
+        ordered=ordered,
+        on_error=on_error,
+        cache=cache,
+    )
+    for result in results:
+        while failures:
+            yield failures.popleft()
+        file_hash = expected_hash(result.file_path)
+        status: VerifyStatus = "OK" if result.file_hash == file_hash else "FAILED"
+        yield VerifyResult(result.file_path, status, file_hash, result.file_hash)
+    while failures:
+        yield failures.popleft()
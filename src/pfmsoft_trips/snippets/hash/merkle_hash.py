@@ -0,0 +1,224 @@
+"""
+Hash a single large file in parallel, as a Merkle tree of fixed size chunks.
+
+The file is split into `chunk_size` chunks, which are read with `os.pread` from
+one shared file descriptor and hashed on a thread pool. The chunk digests are
+the leaves of a binary tree, and the root digest identifies the whole file.
+
+    leaf = H(0x00 || chunk)
+    node = H(0x01 || left || right)
+
+The prefixes keep leaf and node digests from colliding. A node without a pair is
+carried up to the next level unchanged. An empty file has a single empty chunk.
+
+The root digest is not the same as a plain digest of the file. The chunk
+digests are kept, so a later verify can check any chunk, or range, on its own.
+"""
+
+import hashlib
+import json
+import os
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+DEFAULT_CHUNK_SIZE = 2**20 * 8
+READ_SIZE = 2**20
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+@dataclass
+class MerkleHash:
+    """
+    The Merkle tree hash of a file, with the digest of each chunk.
+
+    Attributes:
+        hash_method: The hash method of the chunks and nodes.
+        chunk_size: The size of each chunk, except the last.
+        size: The size of the file.
+        root_hash: The hex digest of the root of the tree.
+        chunk_hashes: The hex digests of the chunks, in order.
+    """
+
+    hash_method: str
+    chunk_size: int
+    size: int
+    root_hash: str
+    chunk_hashes: list[str]
+
+    def chunk_range(self, index: int) -> tuple[int, int]:
+        """The (offset, length) of a chunk."""
+        offset = index * self.chunk_size
+        return offset, max(0, min(self.chunk_size, self.size - offset))
+
+    def chunks_for_range(self, offset: int, length: int) -> range:
+        """The indexes of the chunks that overlap a byte range."""
+        first = offset // self.chunk_size
+        last = (offset + max(length, 1) - 1) // self.chunk_size
+        return range(first, min(last, len(self.chunk_hashes) - 1) + 1)
+
+    def save(self, file_path: Path) -> None:
+        """Save as JSON."""
+        with open(file_path, "w", encoding="utf-8") as file_out:
+            json.dump(asdict(self), file_out)
+
+    @classmethod
+    def load(cls, file_path: Path) -> "MerkleHash":
+        """Load from JSON written by :meth:`save`."""
+        with open(file_path, encoding="utf-8") as file_in:
+            return cls(**json.load(file_in))
+
+
+def hash_chunk(
+    file_descriptor: int, offset: int, length: int, hash_method: str
+) -> bytes:
+    """
+    Calculate the leaf digest of one chunk.
+
+    Args:
+        file_descriptor: A file descriptor opened for reading, safe to share
+            between threads since `os.pread` does not move the file position.
+        offset: The offset of the chunk.
+        length: The length of the chunk.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+
+    Returns:
+        The raw leaf digest.
+    """
+    hasher = hashlib.new(hash_method, LEAF_PREFIX)
+    end = offset + length
+    while offset < end:
+        block = os.pread(file_descriptor, min(READ_SIZE, end - offset), offset)
+        if not block:
+            raise EOFError(f"File ended at {offset}, expected {end} bytes.")
+        hasher.update(block)
+        offset += len(block)
+    return hasher.digest()
+
+
+def merkle_root(leaves: Iterable[bytes], hash_method: str) -> bytes:
+    """
+    Combine leaf digests into the root digest.
+
+    Args:
+        leaves: The raw leaf digests, in file order.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+
+    Returns:
+        The raw root digest.
+    """
+    level = list(leaves)
+    while len(level) > 1:
+        next_level = [
+            hashlib.new(hash_method, NODE_PREFIX + left + right).digest()
+            for left, right in zip(level[0::2], level[1::2], strict=False)
+        ]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+
+def _hash_chunks(
+    file_path: Path,
+    ranges: list[tuple[int, int]],
+    hash_method: str,
+    max_workers: int | None,
+) -> list[bytes]:
+    file_descriptor = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                executor.map(
+                    lambda chunk: hash_chunk(file_descriptor, *chunk, hash_method),
+                    ranges,
+                )
+            )
+    finally:
+        os.close(file_descriptor)
+
+
+def merkle_hash_file(
+    file_path: Path,
+    hash_method: str = "blake2b",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_workers: int | None = None,
+) -> MerkleHash:
+    """
+    Calculate the Merkle tree hash of a file, hashing chunks in parallel.
+
+    Args:
+        file_path: The file to hash.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        chunk_size: The size of the leaf chunks. Defaults to 8M.
+        max_workers: The thread pool size. Defaults to the executor default.
+
+    Returns:
+        The root digest, along with the digest of every chunk.
+
+    Raises:
+        EOFError: If the file shrinks while it is read.
+    """
+    size = os.stat(file_path).st_size
+    ranges = [
+        (offset, min(chunk_size, size - offset))
+        for offset in range(0, max(size, 1), chunk_size)
+    ]
+    leaves = _hash_chunks(file_path, ranges, hash_method, max_workers)
+    return MerkleHash(
+        hash_method=hash_method,
+        chunk_size=chunk_size,
+        size=size,
+        root_hash=merkle_root(leaves, hash_method).hex(),
+        chunk_hashes=[leaf.hex() for leaf in leaves],
+    )
+
+
+def verify_chunks(
+    file_path: Path,
+    record: MerkleHash,
+    chunk_indexes: Iterable[int] | None = None,
+    max_workers: int | None = None,
+) -> list[tuple[int, int]]:
+    """
+    Find the corrupted byte ranges of a file, by re-hashing chunks.
+
+    Only the chosen chunks are read, e.g. from :meth:`MerkleHash.chunks_for_range`.
+
+    Args:
+        file_path: The file to check.
+        record: A record from :func:`merkle_hash_file`.
+        chunk_indexes: The chunks to check. Defaults to all of them.
+        max_workers: The thread pool size.
+
+    Returns:
+        The (offset, length) of every chunk that does not match. A file that has
+        grown is reported as a single range covering the difference. A file that
+        has shrunk is reported as a single range from the start of the chunk
+        that held the new end, to the old end.
+
+    Raises:
+        EOFError: If the file shrinks while it is read.
+    """
+    size = os.stat(file_path).st_size
+    if chunk_indexes is None:
+        chunk_indexes = range(len(record.chunk_hashes))
+    indexes = [index for index in chunk_indexes if record.chunk_range(index)[1] > 0]
+    if size < record.size:
+        # Chunks past the end can not be read, report the truncation instead.
+        indexes = [index for index in indexes if sum(record.chunk_range(index)) <= size]
+    ranges = [record.chunk_range(index) for index in indexes]
+    leaves = _hash_chunks(file_path, ranges, record.hash_method, max_workers)
+    corrupted = [
+        chunk
+        for index, chunk, leaf in zip(indexes, ranges, leaves, strict=True)
+        if leaf.hex() != record.chunk_hashes[index]
+    ]
+    if size > record.size:
+        corrupted.append((record.size, size - record.size))
+    elif size < record.size:
+        start = size // record.chunk_size * record.chunk_size
+        corrupted.append((start, record.size - start))
+    return corrupted
@@ -0,0 +1,205 @@
+"""
+Hash many files concurrently on a thread or process pool.
+
+hashlib releases the GIL while hashing blocks of more than a couple of KB, so a
+thread pool usually scales well. A process pool is available for the cases
+where it does not, e.g. many tiny files.
+"""
+
+import hashlib
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from pfmsoft_trips.snippets.hash.block_size import BlockSize, resolve_block_size
+from pfmsoft_trips.snippets.hash.file_hash import (
+    HashedFileProtocol,
+    ReadStrategy,
+    hashed_file_result_factory,
+    make_hashed_file,
+)
+from pfmsoft_trips.snippets.hash.instrument import active_stats
+from pfmsoft_trips.snippets.hash.io_policy import IoPolicy
+
+if TYPE_CHECKING:
+    from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+
+PoolKind = Literal["thread", "process"]
+HashJob = Callable[[Path, str, int, ReadStrategy], HashedFileProtocol]
+
+
+def hash_file_job(
+    file_path: Path,
+    hash_method: str,
+    block_size: int = 2**10 * 64,
+    strategy: ReadStrategy = "auto",
+    io_policy: IoPolicy = "default",
+) -> HashedFileProtocol:
+    """
+    Hash a single file, creating the hasher by name.
+
+    Defined at module level so that it can be pickled for a process pool. Use
+    :py:func:`functools.partial` to set `io_policy` for
+    :func:`hash_files_concurrently`.
+
+    Args:
+        file_path: The file to hash.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        block_size: The block size used to read the file.
+        strategy: The read strategy, see :func:`file_hash.hash_file`.
+        io_policy: The I/O policy, see :mod:`io_policy`.
+
+    Returns:
+        The hashed file result.
+    """
+    return make_hashed_file(
+        file_path=file_path,
+        hasher=hashlib.new(hash_method),
+        block_size=block_size,
+        strategy=strategy,
+        io_policy=io_policy,
+    )
+
+
+def hash_files_concurrently(
+    file_paths: Iterable[Path],
+    hash_method: str = "md5",
+    max_workers: int | None = None,
+    pool: PoolKind = "thread",
+    ordered: bool = False,
+    block_size: BlockSize = 2**10 * 64,
+    strategy: ReadStrategy = "auto",
+    max_pending: int | None = None,
+    on_error: Callable[[Path, BaseException], None] | None = None,
+    cache: "DigestCache | None" = None,
+    job: HashJob = hash_file_job,
+    initializer: Callable[..., object] | None = None,
+    initargs: tuple = (),
+) -> Iterator[HashedFileProtocol]:
+    """
+    Hash files concurrently, yielding results as they complete.
+
+    `file_paths` is consumed lazily, and at most `max_pending` files are
+    submitted to the pool at any time, so memory use does not grow with the
+    number of files.
+
+    Args:
+        file_paths: The files to hash.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        max_workers: The pool size. Defaults to the cpu count.
+        pool: Use a "thread" or "process" pool. Defaults to "thread".
+        ordered: Yield results in the order of `file_paths`, instead of
+            in the order they complete.
+        block_size: The block size used to read the files, or "auto" to use
+            the size calibrated for each file's device. Resolved in the calling
+            thread, see :mod:`block_size`.
+        strategy: The read strategy, see :func:`file_hash.hash_file`.
+        max_pending: The maximum number of files in flight. Defaults to
+            four times `max_workers`.
+        on_error: Called with the path and exception when a file fails to hash,
+            and the file is skipped. If None, the exception is raised.
+        cache: A digest cache. It is only used from the calling thread, so
+            cache hits never reach the pool, with either pool kind.
+        job: Called in the pool with (path, hash method, block size, strategy)
+            to hash one file. It must be picklable for a process pool, and must
+            produce full file digests if a cache is used.
+        initializer: Called in each worker when it starts, e.g.
+            :func:`logging.init_queue_logging_worker` to send the logging of
+            process pool workers back to this process.
+        initargs: The arguments for `initializer`.
+
+    Yields:
+        The hashed file results.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = max_workers * 4
+    executor_class = ThreadPoolExecutor if pool == "thread" else ProcessPoolExecutor
+    executor = executor_class(
+        max_workers=max_workers, initializer=initializer, initargs=initargs
+    )
+    # The stat taken before hashing, for files that go to the cache afterwards.
+    file_stats: dict[Future[HashedFileProtocol], os.stat_result] = {}
+
+    def submit(file_path: Path) -> Future[HashedFileProtocol]:
+        future: Future[HashedFileProtocol] = Future()
+        try:
+            file_stat = None
+            if cache is not None or block_size == "auto":
+                file_stat = os.stat(file_path)
+            # Resolved here, so a process pool does not calibrate in every worker.
+            file_block_size = resolve_block_size(file_path, block_size, file_stat)
+        except OSError as error:
+            future.set_exception(error)
+            return future
+        if cache is not None and file_stat is not None:
+            cached_hash = cache.get(file_path, hash_method, file_stat)
+            if cached_hash is not None:
+                stats = active_stats()
+                if stats is not None:
+                    stats.add_cache_hit()
+                future.set_result(
+                    hashed_file_result_factory(file_path, cached_hash, hash_method)
+                )
+                return future
+        future = executor.submit(job, file_path, hash_method, file_block_size, strategy)
+        if cache is not None and file_stat is not None:
+            file_stats[future] = file_stat
+        return future
+
+    def result_of(file_path: Path, future: Future[HashedFileProtocol]):
+        file_stat = file_stats.pop(future, None)
+        try:
+            result = future.result()
+        except Exception as error:
+            if on_error is None:
+                raise
+            on_error(file_path, error)
+            return None
+        if cache is not None and file_stat is not None:
+            cache.put(file_path, hash_method, file_stat, result.file_hash)
+        return result
+
+    try:
+        if ordered:
+            queued: deque[tuple[Path, Future[HashedFileProtocol]]] = deque()
+            for file_path in file_paths:
+                queued.append((file_path, submit(file_path)))
+                if len(queued) >= max_pending:
+                    result = result_of(*queued.popleft())
+                    if result is not None:
+                        yield result
+            while queued:
+                result = result_of(*queued.popleft())
+                if result is not None:
+                    yield result
+        else:
+            running: dict[Future[HashedFileProtocol], Path] = {}
+            path_iter = iter(file_paths)
+            exhausted = False
+            while running or not exhausted:
+                while not exhausted and len(running) < max_pending:
+                    file_path = next(path_iter, None)
+                    if file_path is None:
+                        exhausted = True
+                    else:
+                        running[submit(file_path)] = file_path
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = result_of(running.pop(future), future)
+                    if result is not None:
+                        yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,278 @@
+"""
+Walk and hash directory trees with bounded memory.
+
+The walk is a generator over a stack of open :py:func:`os.scandir` iterators,
+one per directory level, so memory grows with the depth of the tree rather than
+with the number of entries. Hashing pulls paths from the walk only as workers
+become free, see :func:`parallel_hash.hash_files_concurrently`.
+
+    walk -> stat filter -> hash -> emit
+"""
+
+import logging
+import os
+import re
+from collections.abc import Callable, Container, Iterator, Sequence
+from fnmatch import translate
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from pfmsoft_trips.snippets.hash.block_size import BlockSize
+from pfmsoft_trips.snippets.hash.file_hash import HashedFileProtocol, ReadStrategy
+from pfmsoft_trips.snippets.hash.parallel_hash import (
+    HashJob,
+    PoolKind,
+    hash_file_job,
+    hash_files_concurrently,
+)
+
+if TYPE_CHECKING:
+    from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SymlinkPolicy = Literal["skip", "files", "follow"]
+
+GlobMatcher = Callable[[str, str], bool]
+
+
+def compile_globs(patterns: Sequence[str]) -> GlobMatcher | None:
+    """
+    Compile glob patterns into a single matcher.
+
+    A pattern containing a `/` is matched against the path relative to the walk
+    root, using `/` as the separator. Any other pattern is matched against the
+    entry name only, so `*.txt` matches at every level.
+
+    Args:
+        patterns: The glob patterns.
+
+    Returns:
+        A function of (name, relative path), or None if there are no patterns.
+    """
+    if not patterns:
+        return None
+    name_patterns = [translate(pattern) for pattern in patterns if "/" not in pattern]
+    path_patterns = [translate(pattern) for pattern in patterns if "/" in pattern]
+    name_regex = re.compile("|".join(name_patterns)) if name_patterns else None
+    path_regex = re.compile("|".join(path_patterns)) if path_patterns else None
+
+    def matches(name: str, relative_path: str) -> bool:
+        if name_regex is not None and name_regex.match(name):
+            return True
+        return path_regex is not None and path_regex.match(relative_path) is not None
+
+    return matches
+
+
+def walk_entries(
+    root: Path,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    symlinks: SymlinkPolicy = "skip",
+    min_size: int | None = None,
+    max_size: int | None = None,
+    on_error: Callable[[OSError], None] | None = None,
+) -> Iterator[os.DirEntry[str]]:
+    """
+    Lazily yield the directory entries of the regular files below a directory.
+
+    Directories matching `exclude` are not descended into. Files must match
+    `include`, if given, and not match `exclude`. Special files (pipes, sockets,
+    devices) are always skipped.
+
+    Args:
+        root: The directory to walk.
+        include: Glob patterns for the files to yield, see :func:`compile_globs`.
+        exclude: Glob patterns for files and directories to skip.
+        symlinks: "skip" ignores all symlinks, "files" follows symlinks to files
+            but not to directories, and "follow" follows both. Directory loops
+            are detected and skipped.
+        min_size: Skip files smaller than this many bytes.
+        max_size: Skip files larger than this many bytes.
+        on_error: Called with the error when a directory can not be read, or an
+            entry can not be stat'ed. Defaults to logging a warning.
+
+    Yields:
+        The entries of the matching files. `entry.stat()` is cached, and free
+        if a size filter was used.
+    """
+    include_match = compile_globs(include)
+    exclude_match = compile_globs(exclude)
+    need_stat = min_size is not None or max_size is not None
+    # Directories on the current path, to detect loops when following symlinks.
+    ancestors: set[tuple[int, int]] = set()
+    stack: list[tuple[Iterator[os.DirEntry[str]], str, tuple[int, int] | None]] = []
+
+    def report(error: OSError) -> None:
+        if on_error is None:
+            logger.warning("Skipping: %s", error)
+        else:
+            on_error(error)
+
+    def push(dir_path: str, prefix: str, key: tuple[int, int] | None) -> None:
+        try:
+            stack.append((os.scandir(dir_path), prefix, key))
+        except OSError as error:
+            report(error)
+            return
+        if key is not None:
+            ancestors.add(key)
+
+    root_key = None
+    if symlinks == "follow":
+        root_stat = os.stat(root)
+        root_key = (root_stat.st_dev, root_stat.st_ino)
+    push(os.fspath(root), "", root_key)
+    try:
+        while stack:
+            entries, prefix, key = stack[-1]
+            entry = next(entries, None)
+            if entry is None:
+                entries.close()  # type: ignore[attr-defined]
+                stack.pop()
+                if key is not None:
+                    ancestors.discard(key)
+                continue
+            relative_path = prefix + entry.name
+            try:
+                is_link = entry.is_symlink()
+                if is_link and symlinks == "skip":
+                    continue
+                if entry.is_dir():
+                    if is_link and symlinks != "follow":
+                        continue
+                    if exclude_match is not None and exclude_match(
+                        entry.name, relative_path
+                    ):
+                        continue
+                    dir_key = None
+                    if symlinks == "follow":
+                        dir_stat = entry.stat()
+                        dir_key = (dir_stat.st_dev, dir_stat.st_ino)
+                        if dir_key in ancestors:
+                            logger.debug("Skipping directory loop at %s", entry.path)
+                            continue
+                    push(entry.path, relative_path + "/", dir_key)
+                    continue
+                if not entry.is_file():
+                    continue
+                if exclude_match is not None and exclude_match(
+                    entry.name, relative_path
+                ):
+                    continue
+                if include_match is not None and not include_match(
+                    entry.name, relative_path
+                ):
+                    continue
+                if need_stat:
+                    size = entry.stat().st_size
+                    if min_size is not None and size < min_size:
+                        continue
+                    if max_size is not None and size > max_size:
+                        continue
+            except OSError as error:
+                report(error)
+                continue
+            yield entry
+    finally:
+        for entries, _, _ in stack:
+            entries.close()  # type: ignore[attr-defined]
+
+
+def walk_files(
+    root: Path,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    symlinks: SymlinkPolicy = "skip",
+    min_size: int | None = None,
+    max_size: int | None = None,
+    on_error: Callable[[OSError], None] | None = None,
+) -> Iterator[Path]:
+    """
+    Lazily yield the paths of the regular files below a directory.
+
+    See :func:`walk_entries` for the arguments.
+
+    Yields:
+        The paths of the matching files.
+    """
+    for entry in walk_entries(
+        root,
+        include=include,
+        exclude=exclude,
+        symlinks=symlinks,
+        min_size=min_size,
+        max_size=max_size,
+        on_error=on_error,
+    ):
+        yield Path(entry.path)
+
+
+def hash_tree(
+    root: Path,
+    hash_method: str = "md5",
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    symlinks: SymlinkPolicy = "skip",
+    min_size: int | None = None,
+    max_size: int | None = None,
+    max_workers: int | None = None,
+    pool: PoolKind = "thread",
+    ordered: bool = False,
+    block_size: BlockSize = 2**10 * 64,
+    strategy: ReadStrategy = "auto",
+    max_pending: int | None = None,
+    on_error: Callable[[Path, BaseException], None] | None = None,
+    cache: "DigestCache | None" = None,
+    skip_paths: Container[Path] = (),
+    job: HashJob = hash_file_job,
+    initializer: Callable[..., object] | None = None,
+    initargs: tuple = (),
+) -> Iterator[HashedFileProtocol]:
+    """
+    Hash every matching file below a directory.
+
+    See :func:`walk_files` for the walk arguments, and
+    :func:`parallel_hash.hash_files_concurrently` for the rest. Errors while
+    walking are passed to `on_error` with the path of the offending entry.
+    Files in `skip_paths`, e.g. the :class:`hash_job.HashJournal` of a resumed
+    run, are not hashed.
+
+    Yields:
+        The hashed file results.
+    """
+
+    def on_walk_error(error: OSError) -> None:
+        if on_error is None:
+            logger.warning("Skipping: %s", error)
+        else:
+            on_error(Path(error.filename or root), error)
+
+    file_paths = walk_files(
+        root,
+        include=include,
+        exclude=exclude,
+        symlinks=symlinks,
+        min_size=min_size,
+        max_size=max_size,
+        on_error=on_walk_error,
+    )
+    if skip_paths:
+        file_paths = (path for path in file_paths if path not in skip_paths)
+    return hash_files_concurrently(
+        file_paths,
+        hash_method=hash_method,
+        max_workers=max_workers,
+        pool=pool,
+        ordered=ordered,
+        block_size=block_size,
+        strategy=strategy,
+        max_pending=max_pending,
+        on_error=on_error,
+        cache=cache,
+        job=job,
+        initializer=initializer,
+        initargs=initargs,
+    )
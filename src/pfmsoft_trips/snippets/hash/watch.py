@@ -0,0 +1,569 @@
+"""
+Keep the digests of a directory tree up to date as its files change.
+
+On Linux, :class:`InotifyWatcher` watches every directory of the tree with
+inotify, through ctypes. A file is re-hashed when it is closed after writing,
+or moved into the tree. Changes that do not close the file, like writes through
+a long lived mmap, are not seen. If the kernel's event queue overflows, the
+whole tree is rescanned.
+
+Elsewhere, or when asked for, :class:`PollingWatcher` compares the size, mtime
+and inode of every file against the previous scan, every `interval` seconds.
+
+:func:`watch_tree` hashes the tree once, then re-hashes only the changed files,
+in debounced batches.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+from collections.abc import Callable, Container, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Literal, Protocol
+
+from pfmsoft_trips.snippets.hash.block_size import BlockSize
+from pfmsoft_trips.snippets.hash.file_hash import HashedFileProtocol
+from pfmsoft_trips.snippets.hash.parallel_hash import hash_files_concurrently
+from pfmsoft_trips.snippets.hash.tree_walk import hash_tree, walk_entries
+
+if TYPE_CHECKING:
+    from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+WatchMethod = Literal["auto", "inotify", "poll"]
+
+# From <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+)
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 2**16
+
+
+@dataclass
+class Changes:
+    """
+    Paths changed since the last read.
+
+    A removed directory stands for everything that was below it. If `rescan`
+    is set, events were lost, and the whole tree must be scanned again.
+    """
+
+    changed: set[Path] = field(default_factory=set)
+    removed: set[Path] = field(default_factory=set)
+    rescan: bool = False
+
+    def __bool__(self) -> bool:
+        """Whether anything changed, or a rescan is needed."""
+        return bool(self.changed or self.removed or self.rescan)
+
+    def add_changed(self, file_path: Path) -> None:
+        """Record a file as changed, replacing an earlier removal."""
+        self.removed.discard(file_path)
+        self.changed.add(file_path)
+
+    def add_removed(self, file_path: Path) -> None:
+        """Record a path as removed, replacing an earlier change."""
+        self.changed.discard(file_path)
+        self.removed.add(file_path)
+
+    def update(self, other: "Changes") -> None:
+        """Add later changes to these."""
+        for file_path in other.removed:
+            self.add_removed(file_path)
+        for file_path in other.changed:
+            self.add_changed(file_path)
+        self.rescan |= other.rescan
+
+
+class Watcher(Protocol):
+    """
+    A source of changes to a directory tree, for :func:`debounced_changes`.
+
+    Attributes:
+        root: The watched directory.
+    """
+
+    root: Path
+
+    def read(self, timeout: float | None) -> Changes:
+        """Wait up to `timeout` seconds for changes, and return them."""
+        ...
+
+    def close(self) -> None:
+        """Stop watching."""
+        ...
+
+
+def _load_libc() -> ctypes.CDLL | None:
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+_libc = _load_libc()
+
+
+def inotify_available() -> bool:
+    """Whether inotify can be loaded from the C library."""
+    return _libc is not None
+
+
+class InotifyWatcher:
+    """
+    Watch a directory tree with inotify.
+
+    Args:
+        root: The directory to watch. Directories created below it are watched
+            as they appear.
+
+    Raises:
+        OSError: If inotify is not available, or the root can not be watched,
+            e.g. `ENOSPC` when `fs.inotify.max_user_watches` is reached.
+    """
+
+    def __init__(self, root: Path) -> None:
+        """Create the InotifyWatcher, see the class docstring for the arguments."""
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.root = root
+        self._libc = _libc
+        self._watches: dict[int, Path] = {}
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        try:
+            self._add_watch(root, must_exist=True)
+            self._watch_below(root)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def __repr__(self) -> str:
+        """The InotifyWatcher as a constructor call."""
+        return f"{self.__class__.__qualname__}(root={self.root!r})"
+
+    def __enter__(self) -> "InotifyWatcher":
+        """Return the InotifyWatcher itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the inotify file descriptor."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the inotify file descriptor, removing every watch."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def fileno(self) -> int:
+        """The inotify file descriptor, for :py:func:`select.select`."""
+        return self._fd
+
+    def _add_watch(self, dir_path: Path, must_exist: bool = False) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if must_exist or error == errno.ENOSPC:
+                raise OSError(error, os.strerror(error), os.fspath(dir_path))
+            # The directory went away, or is not readable, or was replaced.
+            logger.debug("Not watching %s: %s", dir_path, os.strerror(error))
+            return
+        # Adding a directory again, e.g. after a move, updates its path.
+        self._watches[wd] = dir_path
+
+    def _watch_below(self, dir_path: Path, changes: Changes | None = None) -> None:
+        """Watch the directories below `dir_path`, reporting the files found."""
+        for parent, dir_names, file_names in os.walk(dir_path):
+            parent_path = Path(parent)
+            for dir_name in dir_names:
+                self._add_watch(parent_path / dir_name)
+            if changes is not None:
+                for file_name in file_names:
+                    changes.add_changed(parent_path / file_name)
+
+    def read(self, timeout: float | None) -> Changes:
+        """
+        Wait up to `timeout` seconds for events, and read all that are queued.
+
+        Args:
+            timeout: The longest wait, or None to wait until there are events.
+
+        Returns:
+            The changes, empty if the wait timed out.
+        """
+        changes = Changes()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return changes
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            self._handle_events(data, changes)
+        return changes
+
+    def _handle_events(self, data: bytes, changes: Changes) -> None:
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, rescanning %s", self.root)
+                changes.rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            dir_path = self._watches.get(wd)
+            if dir_path is None or not name:
+                continue
+            event_path = dir_path / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have been written before the watch was added.
+                    self._add_watch(event_path)
+                    self._watch_below(event_path, changes)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.add_removed(event_path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changes.add_changed(event_path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.add_removed(event_path)
+
+
+class PollingWatcher:
+    """
+    Watch a directory tree by comparing stats between scans.
+
+    A file has changed if its size, `st_mtime_ns` or inode has. The first scan
+    is taken when the watcher is created.
+
+    Args:
+        root: The directory to watch.
+        interval: The time between scans, in seconds.
+    """
+
+    def __init__(self, root: Path, interval: float = 2.0) -> None:
+        """Create the PollingWatcher, see the class docstring for the arguments."""
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._last_scan = monotonic()
+
+    def __repr__(self) -> str:
+        """The PollingWatcher as a constructor call."""
+        return (
+            f"{self.__class__.__qualname__}(root={self.root!r}, "
+            f"interval={self.interval!r})"
+        )
+
+    def __enter__(self) -> "PollingWatcher":
+        """Return the PollingWatcher itself, for a `with` block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop watching, see :meth:`close`."""
+        self.close()
+
+    def close(self) -> None:
+        """Nothing to release, for the :class:`Watcher` protocol."""
+
+    def _scan(self) -> dict[str, tuple[int, int, int]]:
+        snapshot = {}
+        for entry in walk_entries(self.root, on_error=lambda error: None):
+            try:
+                entry_stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.path] = (
+                entry_stat.st_size,
+                entry_stat.st_mtime_ns,
+                entry_stat.st_ino,
+            )
+        return snapshot
+
+    def read(self, timeout: float | None) -> Changes:
+        """
+        Scan for changes, if the interval has passed within `timeout` seconds.
+
+        Args:
+            timeout: The longest wait, or None to wait for the next scan.
+
+        Returns:
+            The changes, empty if no scan was due or nothing changed.
+        """
+        changes = Changes()
+        wait = max(0.0, self._last_scan + self.interval - monotonic())
+        if timeout is not None and wait > timeout:
+            sleep(timeout)
+            return changes
+        sleep(wait)
+        snapshot = self._scan()
+        self._last_scan = monotonic()
+        for path_str, stats in snapshot.items():
+            if self._snapshot.get(path_str) != stats:
+                changes.add_changed(Path(path_str))
+        for path_str in self._snapshot.keys() - snapshot.keys():
+            changes.add_removed(Path(path_str))
+        self._snapshot = snapshot
+        return changes
+
+
+def make_watcher(
+    root: Path, method: WatchMethod = "auto", poll_interval: float = 2.0
+) -> Watcher:
+    """
+    Create a watcher for a directory tree.
+
+    Args:
+        root: The directory to watch.
+        method: "inotify", "poll", or "auto" to use inotify where available.
+            Auto falls back to polling if inotify fails, e.g. when out of
+            watches.
+        poll_interval: The time between scans when polling, in seconds.
+
+    Returns:
+        The watcher.
+    """
+    if method == "poll" or (method == "auto" and not inotify_available()):
+        return PollingWatcher(root, interval=poll_interval)
+    try:
+        return InotifyWatcher(root)
+    except OSError as error:
+        if method == "inotify":
+            raise
+        logger.warning("Falling back to polling, inotify failed: %s", error)
+        return PollingWatcher(root, interval=poll_interval)
+
+
+def debounced_changes(
+    watcher: Watcher,
+    debounce: float = 0.5,
+    max_delay: float = 10.0,
+    stop: threading.Event | None = None,
+    idle_interval: float | None = None,
+) -> Iterator[Changes]:
+    """
+    Yield changes in batches, once they have been quiet for `debounce` seconds.
+
+    Args:
+        watcher: The watcher to read from.
+        debounce: How long changes must be quiet before a batch is yielded.
+        max_delay: The longest a batch is held back by continuing changes.
+        stop: Stop watching once set. Checked at least every second.
+        idle_interval: If set, an empty batch is yielded after this many
+            seconds without one, so the caller can do deferred work.
+
+    Yields:
+        The batches of changes.
+    """
+    timeout = 1.0 if idle_interval is None else min(1.0, idle_interval)
+    last_yield = monotonic()
+    while stop is None or not stop.is_set():
+        changes = watcher.read(timeout=timeout)
+        if not changes:
+            if idle_interval is not None and monotonic() - last_yield >= idle_interval:
+                last_yield = monotonic()
+                yield changes
+            continue
+        batch_start = monotonic()
+        while (remaining := max_delay - (monotonic() - batch_start)) > 0:
+            more = watcher.read(timeout=min(debounce, remaining))
+            if not more:
+                break
+            changes.update(more)
+        last_yield = monotonic()
+        yield changes
+
+
+@dataclass
+class WatchUpdate:
+    """
+    The results of one batch of changes.
+
+    `hashed` holds new files and changed digests only. `index` is the live
+    digest index of the whole tree, after this update. Both lists are empty for
+    the updates of an `idle_interval`.
+    """
+
+    hashed: list[HashedFileProtocol]
+    removed: list[Path]
+    index: dict[Path, HashedFileProtocol]
+
+
+def watch_tree(
+    root: Path,
+    hash_method: str = "md5",
+    watcher: Watcher | None = None,
+    debounce: float = 0.5,
+    max_delay: float = 10.0,
+    max_workers: int | None = None,
+    block_size: BlockSize = 2**10 * 64,
+    on_error: Callable[[Path, BaseException], None] | None = None,
+    cache: "DigestCache | None" = None,
+    stop: threading.Event | None = None,
+    idle_interval: float | None = None,
+    skip_paths: Container[Path] = (),
+) -> Iterator[WatchUpdate]:
+    """
+    Hash a directory tree, then re-hash its files as they change.
+
+    The first update holds the whole tree. The watcher is started before it is
+    hashed, so that no change is missed. Symlinks are skipped, as with
+    :func:`tree_walk.hash_tree`.
+
+    Args:
+        root: The directory to watch.
+        hash_method: A hash name accepted by :py:func:`hashlib.new`.
+        watcher: Defaults to :func:`make_watcher` for `root`. Closed when done.
+        debounce: See :func:`debounced_changes`.
+        max_delay: See :func:`debounced_changes`.
+        max_workers: The thread pool size. Defaults to the cpu count.
+        block_size: See :func:`parallel_hash.hash_files_concurrently`.
+        on_error: Called with the path and exception when a file fails to hash.
+            If None, a warning is logged.
+        cache: A digest cache, which makes the initial hash and any rescans
+            cheap for unchanged files.
+        stop: Stop watching once set.
+        idle_interval: See :func:`debounced_changes`.
+        skip_paths: Files that are never hashed, e.g. an index of the tree that
+            is written inside it. Compared to paths below `root` as given.
+
+    Yields:
+        An update for the initial hash, for each batch of changes, and with no
+        changes every `idle_interval` seconds while nothing changes.
+    """
+    if watcher is None:
+        watcher = make_watcher(root)
+    index: dict[Path, HashedFileProtocol] = {}
+    vanished: list[Path] = []
+
+    def report_error(file_path: Path, error: BaseException) -> None:
+        if isinstance(error, FileNotFoundError):
+            vanished.append(file_path)
+        elif on_error is None:
+            logger.warning("Skipping %s: %s", file_path, error)
+        else:
+            on_error(file_path, error)
+
+    def apply(results: Iterator[HashedFileProtocol]) -> list[HashedFileProtocol]:
+        hashed = []
+        for result in results:
+            previous = index.get(result.file_path)
+            if previous is None or previous.file_hash != result.file_hash:
+                hashed.append(result)
+            index[result.file_path] = result
+        return hashed
+
+    def remove(removed_path: Path) -> list[Path]:
+        if removed_path in index:
+            del index[removed_path]
+            return [removed_path]
+        # A directory, so everything that was below it.
+        below = [path for path in index if path.is_relative_to(removed_path)]
+        for path in below:
+            del index[path]
+        return below
+
+    def rehash_tree() -> WatchUpdate:
+        seen: set[Path] = set()
+
+        def note_seen(results: Iterator[HashedFileProtocol]):
+            for result in results:
+                seen.add(result.file_path)
+                yield result
+
+        results = hash_tree(
+            root,
+            hash_method=hash_method,
+            max_workers=max_workers,
+            block_size=block_size,
+            on_error=report_error,
+            cache=cache,
+            skip_paths=skip_paths,
+        )
+        hashed = apply(note_seen(results))
+        removed = [path for path in index if path not in seen]
+        for path in removed:
+            del index[path]
+        return WatchUpdate(hashed=hashed, removed=removed, index=index)
+
+    try:
+        yield rehash_tree()
+        batches = debounced_changes(watcher, debounce, max_delay, stop, idle_interval)
+        for changes in batches:
+            if changes.rescan:
+                yield rehash_tree()
+                continue
+            if not changes:
+                yield WatchUpdate(hashed=[], removed=[], index=index)
+                continue
+            removed = []
+            for removed_path in changes.removed:
+                if removed_path not in skip_paths:
+                    removed.extend(remove(removed_path))
+            file_paths = [
+                path
+                for path in changes.changed
+                if path not in skip_paths
+                and not path.is_symlink()
+                and not path.is_dir()
+            ]
+            vanished.clear()
+            results = hash_files_concurrently(
+                file_paths,
+                hash_method=hash_method,
+                max_workers=max_workers,
+                block_size=block_size,
+                on_error=report_error,
+                cache=cache,
+            )
+            hashed = apply(results)
+            for vanished_path in vanished:
+                removed.extend(remove(vanished_path))
+            if hashed or removed:
+                yield WatchUpdate(hashed=hashed, removed=removed, index=index)
+    finally:
+        watcher.close()
@@ -13,9 +13,19 @@ Convenience functions for logging.
 
 """
 
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from collections.abc import Sequence
+from contextlib import suppress
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    import multiprocessing.queues
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -23,6 +33,10 @@ logger.addHandler(logging.NullHandler())
 DEFAULT_FORMAT = (
     "%(asctime)s %(levelname)s:%(funcName)s: %(message)s [in %(pathname)s:%(lineno)d]"
 )
+DropPolicy = Literal["block", "drop_new", "drop_oldest"]
+type LogQueue = (
+    queue.Queue[logging.LogRecord] | multiprocessing.queues.Queue[logging.LogRecord]
+)
 
 
 def rotating_file_handler(
@@ -60,6 +74,64 @@ def rotating_file_handler(
     return handler
 
 
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Format records as compact JSON, one object per line.
+
+    Each object has the time, level, logger name and message, plus the items of
+    a dict logged as `extra={"data": {...}}`. Serialization happens once, when
+    the handler formats the record, e.g. on the listener thread of a
+    :class:`QueueLogging`, not where the record is logged.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """The record as a single line JSON object."""
+        document = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if isinstance(data, dict):
+            document.update(data)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document["exc_text"] = record.exc_text
+        return json.dumps(document, separators=(",", ":"), default=str)
+
+
+def json_lines_file_handler(
+    log_dir: Path,
+    file_name: str,
+    log_level: int,
+) -> logging.FileHandler:
+    """
+    Convenience function to init a file handler that appends JSON lines.
+
+    Ensures log directory exists, and enforces .jsonl file suffix. The file is
+    not rotated, so no records are lost on long runs.
+
+    Args:
+        log_dir: The log directory.
+        file_name: The name of the log file, without suffix.
+        log_level: The log level
+
+    Returns:
+        FileHandler: The configured FileHandler.
+    """
+    log_dir.mkdir(parents=True, exist_ok=True)
+    if file_name.endswith(".jsonl"):
+        log_file = log_dir / Path(file_name)
+    else:
+        log_file = log_dir / Path(f"{file_name}.jsonl")
+    handler = logging.FileHandler(log_file, mode="a", encoding="utf-8")
+    handler.setFormatter(fmt=JsonLinesFormatter())
+    handler.setLevel(log_level)
+    return handler
+
+
 def rotating_file_logger(
     logger_name: str,
     log_dir: Path,
@@ -123,3 +195,209 @@ def add_handlers_to_target_logger(
         )
         target_logger.addHandler(handler)
     target_logger.info("Added handlers from %s to %s", source_logger, target_logger)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    A QueueHandler for a bounded queue, that leaves formatting to the listener.
+
+    Records have their message merged with its args before they are queued, so
+    they can be pickled and later changes to the args do not show. Unlike
+    `QueueHandler`, the formatter is not run on the logging thread.
+
+    Args:
+        log_queue: The queue, a `queue.Queue` or a `multiprocessing.Queue`.
+        drop_policy: What to do when the queue is full. "block" waits for
+            space, "drop_new" discards the new record, and "drop_oldest"
+            discards the oldest queued record to make room.
+    """
+
+    def __init__(self, log_queue: LogQueue, drop_policy: DropPolicy = "drop_new"):
+        """Create the BoundedQueueHandler, see the class docstring for the arguments."""
+        super().__init__(log_queue)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """A copy of the record, with its message and traceback as text."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queue a record, following the drop policy if the queue is full."""
+        if self.drop_policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.drop_policy == "drop_oldest":
+                with suppress(queue.Empty):
+                    self.queue.get_nowait()
+                with suppress(queue.Full):
+                    self.queue.put_nowait(record)
+
+
+class _DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for space, a full queue must not stop the listener from stopping.
+        self.queue.put(self._sentinel)
+
+
+class QueueLogging:
+    """
+    Log through a bounded queue, running the handlers on one background thread.
+
+    The logging threads only queue records. Formatting and disk I/O happen on
+    the listener thread. Stopping, or exiting the interpreter, drains the queue
+    and flushes the handlers.
+
+    With `multiprocess=True` the queue is a `multiprocessing.Queue`, so worker
+    processes can log to it, see :func:`init_queue_logging_worker`.
+
+    Example:
+        with QueueLogging([rotating_file_handler(...)]) as queue_logging:
+            logging.getLogger("pfmsoft_trips").addHandler(queue_logging.handler)
+            ...
+
+    Args:
+        handlers: The handlers that do the work, run on the listener thread.
+        max_size: The maximum number of queued records.
+        drop_policy: What to do when the queue is full, see
+            :class:`BoundedQueueHandler`.
+        multiprocess: Use a queue that can be shared with worker processes.
+    """
+
+    def __init__(
+        self,
+        handlers: Sequence[logging.Handler],
+        max_size: int = 10_000,
+        drop_policy: DropPolicy = "drop_new",
+        multiprocess: bool = False,
+    ) -> None:
+        """Create the QueueLogging, see the class docstring for the arguments."""
+        self.handlers = tuple(handlers)
+        self.drop_policy = drop_policy
+        self.queue: LogQueue
+        if multiprocess:
+            # Imported here, multiprocessing is slow to import and rarely needed.
+            import multiprocessing
+
+            self.queue = multiprocessing.Queue(max_size)
+        else:
+            self.queue = queue.Queue(max_size)
+        self.handler = BoundedQueueHandler(self.queue, drop_policy)
+        self.listener = _DrainingQueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self._started = False
+
+    def start(self) -> None:
+        """Start the listener thread."""
+        if self._started:
+            return
+        self.listener.start()
+        self._started = True
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Handle the queued records, flush the handlers, and stop the thread."""
+        if not self._started:
+            return
+        self._started = False
+        atexit.unregister(self.stop)
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.flush()
+        if self.handler.dropped:
+            logger.warning("Dropped %d log records", self.handler.dropped)
+
+    @property
+    def worker_initargs(self) -> tuple:
+        """The `initargs` for :func:`init_queue_logging_worker`."""
+        return (self.queue, self.drop_policy)
+
+    def __enter__(self) -> "QueueLogging":
+        """Start the listener thread, and return the :class:`QueueLogging`."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Handle the queued records, and stop the listener thread."""
+        self.stop()
+
+
+def init_queue_logging_worker(
+    log_queue: LogQueue,
+    drop_policy: DropPolicy = "drop_new",
+    logger_name: str | None = None,
+    log_level: int = logging.DEBUG,
+) -> None:
+    """
+    Send a worker process's logging to the queue of a :class:`QueueLogging`.
+
+    Use as a process pool initializer, with `QueueLogging.worker_initargs`.
+    Any handlers the worker inherited on the logger are replaced.
+
+    Args:
+        log_queue: The multiprocessing queue.
+        drop_policy: What to do when the queue is full.
+        logger_name: The logger to send, defaults to the root logger.
+        log_level: The level to set on the logger.
+    """
+    logger_ = logging.getLogger(logger_name)
+    for handler in list(logger_.handlers):
+        logger_.removeHandler(handler)
+    logger_.addHandler(BoundedQueueHandler(log_queue, drop_policy))
+    logger_.setLevel(log_level)
+
+
+def rotating_file_queue_logger(
+    logger_name: str,
+    log_dir: Path,
+    log_level: int,
+    logfile_name: str | None = None,
+    formater: logging.Formatter | None = None,
+    max_size: int = 10_000,
+    drop_policy: DropPolicy = "drop_new",
+    multiprocess: bool = False,
+) -> tuple[logging.Logger, QueueLogging]:
+    """
+    Configures a logger with a rotating file handler, behind a queue.
+
+    Like :func:`rotating_file_logger`, but the file is written by a background
+    thread. The listener is started, stop it when done.
+
+    Args:
+        logger_name: The name of the logger.
+        log_dir: The log directory.
+        log_level: The log level.
+        logfile_name: The name of the log file, defaults to the logger name.
+        formater: The formatter, defaults to `DEFAULT_FORMAT`.
+        max_size: The maximum number of queued records.
+        drop_policy: What to do when the queue is full.
+        multiprocess: Use a queue that can be shared with worker processes.
+
+    Returns:
+        The logger, and the started :class:`QueueLogging`.
+    """
+    if logfile_name is None:
+        logfile_name = logger_name
+    handler = rotating_file_handler(
+        log_dir=log_dir, file_name=logfile_name, log_level=log_level, formater=formater
+    )
+    queue_logging = QueueLogging(
+        [handler], max_size=max_size, drop_policy=drop_policy, multiprocess=multiprocess
+    )
+    queue_logging.start()
+    logger_ = logging.getLogger(logger_name)
+    logger_.addHandler(queue_logging.handler)
+    logger_.setLevel(log_level)
+    logger_.info("Rotating file queue logger initialized with %r", handler)
+    return logger_, queue_logging
@@ -32,3 +32,27 @@ def test_output_dir_(tmp_path_factory) -> Path:
     """make a temp directory for output data."""
     test_app_data_dir = tmp_path_factory.mktemp("pfmsoft_trips")
     return test_app_data_dir
+
+
+@pytest.fixture(autouse=True)
+def digest_cache_file_(tmp_path, monkeypatch) -> Path:
+    """Keep the cli digest cache out of the user's app directory."""
+    cache_file = tmp_path / "digest-cache.sqlite3"
+    monkeypatch.setenv("PFMSOFT_TRIPS_CACHE_FILE", str(cache_file))
+    return cache_file
+
+
+@pytest.fixture(autouse=True)
+def block_size_file_(tmp_path, monkeypatch) -> Path:
+    """Keep the cli block size choices out of the user's app directory."""
+    block_size_file = tmp_path / "block-sizes.json"
+    monkeypatch.setenv("PFMSOFT_TRIPS_BLOCK_SIZE_FILE", str(block_size_file))
+    return block_size_file
+
+
+@pytest.fixture(autouse=True)
+def chunk_index_file_(tmp_path, monkeypatch) -> Path:
+    """Keep the cli chunk index out of the user's app directory."""
+    index_file = tmp_path / "chunk-index.sqlite3"
+    monkeypatch.setenv("PFMSOFT_TRIPS_CHUNK_INDEX_FILE", str(index_file))
+    return index_file
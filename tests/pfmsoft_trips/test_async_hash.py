@@ -0,0 +1,142 @@
+"""Test cases for the async_hash module."""
+
+import asyncio
+import io
+import threading
+import time
+from hashlib import md5, sha256
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash import async_hash
+from pfmsoft_trips.snippets.hash.async_hash import (
+    hash_file_async,
+    hash_files_as_completed,
+    make_hashed_file_async,
+)
+
+
+@pytest.fixture
+def data_files(tmp_path: Path) -> list[Path]:
+    file_paths = []
+    for index in range(12):
+        file_path = tmp_path / f"file_{index}.bin"
+        file_path.write_bytes(bytes([index]) * (index * 5000 + 1))
+        file_paths.append(file_path)
+    return file_paths
+
+
+def test_hash_file_async(data_files: list[Path]) -> None:
+    file_path = data_files[-1]
+    hashcode = asyncio.run(hash_file_async(file_path, md5(), block_size=4096))
+    assert hashcode == md5(file_path.read_bytes()).hexdigest()
+    result = asyncio.run(make_hashed_file_async(file_path, sha256()))
+    assert result.file_hash == sha256(file_path.read_bytes()).hexdigest()
+
+
+def test_hash_files_as_completed(data_files: list[Path], tmp_path: Path) -> None:
+    errors = []
+
+    async def collect():
+        return [
+            result
+            async for result in hash_files_as_completed(
+                [*data_files, tmp_path / "missing.bin"],
+                concurrency=3,
+                block_size=4096,
+                on_error=lambda path, error: errors.append(path),
+            )
+        ]
+
+    results = asyncio.run(collect())
+    assert sorted(result.file_path for result in results) == sorted(data_files)
+    for result in results:
+        assert result.file_hash == md5(result.file_path.read_bytes()).hexdigest()
+    assert errors == [tmp_path / "missing.bin"]
+
+
+def test_cancel_between_blocks(data_files: list[Path]) -> None:
+    class SlowHasher:
+        name = "slow"
+
+        def __init__(self) -> None:
+            self.blocks = 0
+
+        def update(self, data) -> None:
+            self.blocks += 1
+
+        def hexdigest(self) -> str:
+            return ""
+
+    async def cancel_midway(hasher: SlowHasher) -> None:
+        task = asyncio.create_task(
+            hash_file_async(data_files[-1], hasher, block_size=1)  # type: ignore[arg-type]
+        )
+        while hasher.blocks < 10:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    hasher = SlowHasher()
+    asyncio.run(cancel_midway(hasher))
+    assert 10 <= hasher.blocks < data_files[-1].stat().st_size
+
+
+def test_limit_bounds_concurrency(
+    data_files: list[Path], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    class CountingFile(io.FileIO):
+        """Count the files open at once."""
+
+        def __init__(self, *args, **kwargs) -> None:
+            nonlocal in_flight, peak
+            super().__init__(*args, **kwargs)
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+
+        def close(self) -> None:
+            nonlocal in_flight
+            if not self.closed:
+                with lock:
+                    in_flight -= 1
+            super().close()
+
+    def counting_open(file_path, mode="rb", buffering=-1):
+        return CountingFile(file_path, mode.replace("b", ""))
+
+    class SlowHasher:
+        """An md5 hasher that takes long enough per block for files to overlap."""
+
+        name = "md5"
+
+        def __init__(self) -> None:
+            self.hasher = md5()
+
+        def update(self, data) -> None:
+            time.sleep(0.001)
+            self.hasher.update(data)
+
+        def hexdigest(self) -> str:
+            return self.hasher.hexdigest()
+
+    monkeypatch.setattr(async_hash, "open", counting_open, raising=False)
+
+    async def run() -> list[str]:
+        limit = asyncio.Semaphore(2)
+        return await asyncio.gather(
+            *(
+                hash_file_async(path, SlowHasher(), block_size=4096, limit=limit)  # type: ignore[arg-type]
+                for path in data_files
+            )
+        )
+
+    hashcodes = asyncio.run(run())
+    assert hashcodes == [md5(path.read_bytes()).hexdigest() for path in data_files]
+    assert in_flight == 0
+    assert peak == 2
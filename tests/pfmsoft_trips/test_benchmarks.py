@@ -0,0 +1,33 @@
+"""Smoke test the benchmark suite, on tiny files."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parents[2]
+BENCH_SUITE = ROOT / "benchmarks" / "bench_suite.py"
+
+
+@pytest.mark.slow
+def test_bench_suite(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # The package may not be installed, match the pytest pythonpath setting.
+    pythonpath = [str(ROOT / "src"), os.environ.get("PYTHONPATH", "")]
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(filter(None, pythonpath)))
+    baseline = tmp_path / "baseline.json"
+    args = [sys.executable, str(BENCH_SUITE), "--sizes", "4K", "--repeat", "1"]
+    args += ["--block-sizes", "1K", "--algos", "md5"]
+    subprocess.run([*args, "--save", str(baseline)], check=True)
+    results = json.loads(baseline.read_text())["results"]
+    assert "hash_file/md5/1K/4K" in results
+    assert "cli/hash-md5/4K" in results
+
+    document = json.loads(baseline.read_text())
+    for result in document["results"].values():
+        result["mb_per_s"] *= 1000
+    baseline.write_text(json.dumps(document))
+    completed = subprocess.run([*args, "--no-cli", "--compare", str(baseline)])
+    assert completed.returncode == 1
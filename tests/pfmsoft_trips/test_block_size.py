@@ -0,0 +1,83 @@
+"""Test cases for the block_size module."""
+
+import json
+import os
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash import block_size
+from pfmsoft_trips.snippets.hash.block_size import (
+    DEFAULT_BLOCK_SIZE,
+    MIN_CALIBRATION_BYTES,
+    BlockSizeTuner,
+    configure_block_size_tuner,
+    resolve_block_size,
+)
+from pfmsoft_trips.snippets.hash.file_hash import hash_file
+
+
+@pytest.fixture
+def large_file(tmp_path: Path) -> Path:
+    file_path = tmp_path / "large.bin"
+    file_path.write_bytes(os.urandom(MIN_CALIBRATION_BYTES))
+    return file_path
+
+
+@pytest.fixture(autouse=True)
+def reset_default_tuner(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(block_size, "_default_tuner", None)
+
+
+def test_tuner_calibrates_once_per_device(large_file: Path, tmp_path: Path) -> None:
+    cache_file = tmp_path / "sizes.json"
+    tuner = BlockSizeTuner(cache_file, candidates=(2**12, 2**16), sample_bytes=2**20)
+    small_file = tmp_path / "small.bin"
+    small_file.write_bytes(b"small")
+    assert tuner.block_size_for(small_file) == DEFAULT_BLOCK_SIZE
+    assert not tuner.choices
+
+    chosen = tuner.block_size_for(large_file)
+    assert chosen in (2**12, 2**16)
+    device = large_file.stat().st_dev
+    assert set(tuner.choices[device].throughputs) == {2**12, 2**16}
+    assert tuner.block_size_for(small_file) == chosen
+    saved = json.loads(cache_file.read_text())
+    assert saved[str(device)]["block_size"] == chosen
+
+    reloaded = BlockSizeTuner(cache_file)
+    assert reloaded.choices == tuner.choices
+
+
+def test_damaged_cache_file(tmp_path: Path) -> None:
+    cache_file = tmp_path / "sizes.json"
+    cache_file.write_text("{not json")
+    assert BlockSizeTuner(cache_file).choices == {}
+
+
+def test_hash_file_auto(large_file: Path, tmp_path: Path) -> None:
+    configure_block_size_tuner(tmp_path / "sizes.json").sample_bytes = 2**20
+    assert resolve_block_size(large_file, 1234) == 1234
+    expected = md5(large_file.read_bytes()).hexdigest()
+    assert hash_file(large_file, md5(), block_size="auto") == expected
+    assert hash_file(large_file, md5(), block_size="auto", strategy="auto") == (
+        expected
+    )
+
+
+def test_cli_block_size(large_file: Path) -> None:
+    runner = CliRunner()
+    result = runner.invoke(
+        app,
+        ["hash-md5", "--block-size", "auto", "--show-block-size", str(large_file)],
+    )
+    assert result.exit_code == 0
+    assert md5(large_file.read_bytes()).hexdigest() in result.stdout
+    assert f"Device {large_file.stat().st_dev}: block size" in result.stderr
+
+    result = runner.invoke(app, ["hash-md5", "--block-size", "1M", str(large_file)])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["hash-md5", "--block-size", "big", str(large_file)])
+    assert result.exit_code == 2
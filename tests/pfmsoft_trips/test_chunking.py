@@ -0,0 +1,103 @@
+"""Test cases for the chunking module."""
+
+import os
+import random
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash.chunk_index import ChunkIndex
+from pfmsoft_trips.snippets.hash.chunking import (
+    ContentDefinedChunker,
+    chunk_file,
+)
+
+DATA = random.Random(23).randbytes(2**20)
+
+
+def chunk(data: bytes, update_size: int) -> list:
+    chunker = ContentDefinedChunker(min_size=512, avg_size=2048, max_size=8192)
+    for start in range(0, len(data), update_size):
+        chunker.update(data[start : start + update_size])
+    return chunker.finish()
+
+
+def test_chunk_boundaries():
+    chunks = chunk(DATA, 2**16)
+    assert chunk(DATA, 1000) == chunks
+    assert sum(item.length for item in chunks) == len(DATA)
+    assert all(512 <= item.length <= 8192 for item in chunks[:-1])
+    assert 1024 < len(DATA) / len(chunks) < 4096
+
+    # An insert only changes the chunks around it.
+    shifted = {item.digest for item in chunk(DATA[:1000] + b"x" + DATA[1000:], 2**16)}
+    shared = [item for item in chunks if item.digest in shifted]
+    assert len(shared) >= len(chunks) - 2
+
+
+def test_chunker_sizes():
+    with pytest.raises(ValueError):
+        ContentDefinedChunker(avg_size=5000)
+    with pytest.raises(ValueError):
+        ContentDefinedChunker(min_size=2**14, avg_size=2**13)
+    chunks = chunk(bytes(20_000), 4096)
+    assert [item.length for item in chunks] == [8192, 8192, 3616]
+
+
+def test_chunk_file_and_index(tmp_path: Path):
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(DATA)
+    result = chunk_file(file_path, "md5", avg_size=4096, min_size=1024)
+    assert result.file_hash == md5(DATA).hexdigest()
+    assert sum(item.length for item in result.chunks) == len(DATA)
+
+    db_path = tmp_path / "chunks.sqlite3"
+    with ChunkIndex(db_path, 1024, 4096, 2**16) as index:
+        assert not index.is_current(file_path, os.stat(file_path))
+        index.add(result, os.stat(file_path))
+        assert index.is_current(file_path, os.stat(file_path))
+        index.add(result, os.stat(file_path))
+        shared_a, shared_b = index.compare([tmp_path], [file_path])
+    assert shared_a.files == shared_b.files == 1
+    assert shared_a.ratio == 1.0
+    with pytest.raises(ValueError):
+        ChunkIndex(db_path, avg_size=2**13)
+
+
+def test_chunk_commands(tmp_path: Path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "one.bin").write_bytes(DATA[: 2**19])
+    (tmp_path / "b" / "two.bin").write_bytes(DATA)
+    runner = CliRunner()
+    result = runner.invoke(app, ["chunk-index", str(tmp_path)])
+    assert result.exit_code == 0
+    assert f"{md5(DATA).hexdigest()}  {tmp_path / 'b' / 'two.bin'}" in result.stdout
+    result = runner.invoke(app, ["chunk-index", str(tmp_path)])
+    assert "2 files unchanged" in result.stderr
+    (tmp_path / "b" / "two.bin").write_bytes(DATA[::-1])
+    # Overlapping arguments index each file once.
+    result = runner.invoke(
+        app, ["chunk-index", str(tmp_path), str(tmp_path / "b" / "two.bin")]
+    )
+    assert result.exit_code == 0
+    assert "1 files unchanged, 0 failed." in result.stderr
+    assert result.stdout.count("two.bin") == 1
+    (tmp_path / "b" / "two.bin").write_bytes(DATA)
+    result = runner.invoke(app, ["chunk-index", str(tmp_path)])
+    assert result.exit_code == 0
+
+    result = runner.invoke(
+        app, ["chunk-compare", str(tmp_path / "a"), str(tmp_path / "b")]
+    )
+    assert result.exit_code == 0
+    # The last chunk of the shorter file ends early, so it is not shared.
+    line_a, line_b = result.stdout.splitlines()[-2:]
+    assert "(9" in line_a
+    assert "(4" in line_b
+    result = runner.invoke(
+        app, ["chunk-compare", str(tmp_path / "a"), str(tmp_path / "missing")]
+    )
+    assert result.exit_code == 2
@@ -0,0 +1,91 @@
+"""Check the cli startup cost, with `python -X importtime`."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter_ns
+
+import pytest
+
+ROOT = Path(__file__).parents[2]
+# Generous, to allow for slow CI machines. Override to tighten it locally.
+STARTUP_BUDGET_MS = float(os.environ.get("PFMSOFT_TRIPS_STARTUP_BUDGET_MS", "1000"))
+# Modules that no command needs just to start.
+HEAVY_MODULES = {
+    "concurrent.futures.process",
+    "multiprocessing",
+    "sqlite3",
+    "pfmsoft_trips.snippets.hash.parallel_hash",
+    "pfmsoft_trips.snippets.hash.dedupe",
+    "pfmsoft_trips.snippets.hash.manifest",
+}
+# The digest cache is on by default, so hashing a file needs sqlite3.
+CACHE_MODULES = {"sqlite3"}
+
+
+def import_times(args: list[str], env: dict[str, str]) -> dict[str, int]:
+    """
+    Run the cli, returning the cumulative import time of each module in us.
+
+    `<total>` is the total import time, and `<wall>` the time of the whole run.
+    """
+    start = perf_counter_ns()
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from pfmsoft_trips.cli.main_typer import app; app()",
+            *args,
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    wall_us = (perf_counter_ns() - start) // 1000
+    assert completed.returncode == 0, completed.stderr
+    times: dict[str, int] = {}
+    top_level: dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative)
+    times["<total>"] = sum(top_level.values())
+    times["<wall>"] = wall_us
+    return times
+
+
+@pytest.fixture
+def cli_env(tmp_path: Path) -> dict[str, str]:
+    env = dict(os.environ)
+    pythonpath = [str(ROOT / "src"), env.get("PYTHONPATH", "")]
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, pythonpath))
+    env["PFMSOFT_TRIPS_CACHE_FILE"] = str(tmp_path / "digest-cache.sqlite3")
+    return env
+
+
+@pytest.mark.parametrize("args", [["--help"], ["hash-md5", "--no-cache"], ["hash-md5"]])
+def test_startup_budget(
+    args: list[str], cli_env: dict[str, str], tmp_path: Path
+) -> None:
+    heavy_modules = HEAVY_MODULES
+    if args[0] == "hash-md5":
+        file_path = tmp_path / "small.txt"
+        file_path.write_bytes(b"small file")
+        args = [*args, str(file_path)]
+        if "--no-cache" not in args:
+            heavy_modules = HEAVY_MODULES - CACHE_MODULES
+    times = import_times(args, cli_env)
+    assert not heavy_modules & times.keys()
+    assert times["<total>"] / 1000 < STARTUP_BUDGET_MS
+    if args[0] == "hash-md5" and "--no-cache" not in args:
+        # The default run creates and uses the cache, within the same budget.
+        assert (tmp_path / "digest-cache.sqlite3").exists()
+        assert times["<wall>"] / 1000 < STARTUP_BUDGET_MS
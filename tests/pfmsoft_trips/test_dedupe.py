@@ -0,0 +1,83 @@
+"""Test cases for the dedupe module."""
+
+import csv
+import io
+import json
+import os
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash.dedupe import (
+    DedupeStats,
+    find_duplicates,
+    write_duplicates_csv,
+    write_duplicates_json,
+)
+
+EDGE_SIZE = 16
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / "tree"
+    (root / "sub").mkdir(parents=True)
+    big = b"A" * 40 + b"middle" + b"Z" * 40
+    # Same size and edges as `big`, different middle.
+    (root / "big_1.bin").write_bytes(big)
+    (root / "sub" / "big_2.bin").write_bytes(big)
+    (root / "big_other.bin").write_bytes(big.replace(b"middle", b"MIDDLE"))
+    # Small enough to be fully hashed by the edge stage.
+    (root / "small_1.txt").write_bytes(b"small")
+    (root / "sub" / "small_2.txt").write_bytes(b"small")
+    (root / "unique.txt").write_bytes(b"one of a kind")
+    (root / "empty_1.txt").write_bytes(b"")
+    (root / "empty_2.txt").write_bytes(b"")
+    return root
+
+
+def test_find_duplicates(tree: Path) -> None:
+    stats = DedupeStats()
+    groups = find_duplicates([tree], edge_size=EDGE_SIZE, stats=stats)
+    assert [[path.name for path in group.file_paths] for group in groups] == [
+        ["big_1.bin", "big_2.bin"],
+        ["small_1.txt", "small_2.txt"],
+    ]
+    assert groups[0].reclaimable_bytes == 86
+    # unique.txt is never opened, and only the three big files are fully read.
+    assert stats.files_seen == 6
+    assert stats.edge_hashed == 5
+    assert stats.full_hashed == 3
+
+
+@pytest.mark.skipif(not hasattr(os, "link"), reason="requires hard links")
+def test_hard_links_skipped(tree: Path) -> None:
+    os.link(tree / "unique.txt", tree / "unique_link.txt")
+    stats = DedupeStats()
+    groups = find_duplicates([tree], edge_size=EDGE_SIZE, stats=stats)
+    assert len(groups) == 2
+    assert stats.hard_links_skipped == 1
+
+
+def test_writers(tree: Path) -> None:
+    groups = find_duplicates([tree], edge_size=EDGE_SIZE, pool="process")
+    json_out = io.StringIO()
+    write_duplicates_json(groups, json_out)
+    document = json.loads(json_out.getvalue())
+    assert document["reclaimable_bytes"] == 86 + 5
+    assert len(document["groups"]) == 2
+    csv_out = io.StringIO()
+    write_duplicates_csv(groups, csv_out)
+    rows = list(csv.DictReader(io.StringIO(csv_out.getvalue())))
+    assert len(rows) == 4
+    assert {row["group"] for row in rows} == {"0", "1"}
+
+
+def test_dedupe_command(tree: Path) -> None:
+    result = CliRunner().invoke(
+        app, ["dedupe", "--format", "csv", "--edge-size", str(EDGE_SIZE), str(tree)]
+    )
+    assert result.exit_code == 0
+    assert "big_2.bin" in result.stdout
+    assert "2 duplicate groups, 91 bytes reclaimable" in result.stderr
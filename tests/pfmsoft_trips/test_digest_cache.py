@@ -0,0 +1,109 @@
+"""Test cases for the digest_cache module."""
+
+import os
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.digest_cache import DigestCache
+from pfmsoft_trips.snippets.hash.file_hash import make_hashed_file
+from pfmsoft_trips.snippets.hash.parallel_hash import hash_files_concurrently
+
+
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(b"original")
+    return file_path
+
+
+def test_hit_skips_hashing(data_file: Path, tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "cache" / "digests.sqlite3"
+    with DigestCache(db_path) as cache:
+        first = make_hashed_file(data_file, md5(), cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("hash_file should not be called on a cache hit")
+
+    monkeypatch.setattr("pfmsoft_trips.snippets.hash.file_hash.hash_file", fail)
+    with DigestCache(db_path) as cache:
+        second = make_hashed_file(data_file, md5(), cache=cache)
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert second.file_hash == first.file_hash == md5(b"original").hexdigest()
+
+
+def test_changed_file_misses(data_file: Path, tmp_path: Path) -> None:
+    with DigestCache(tmp_path / "digests.sqlite3") as cache:
+        make_hashed_file(data_file, md5(), cache=cache)
+        data_file.write_bytes(b"modified")
+        stat = data_file.stat()
+        os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        result = make_hashed_file(data_file, md5(), cache=cache)
+    assert result.file_hash == md5(b"modified").hexdigest()
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_refresh(data_file: Path, tmp_path: Path) -> None:
+    db_path = tmp_path / "digests.sqlite3"
+    with DigestCache(db_path) as cache:
+        make_hashed_file(data_file, md5(), cache=cache)
+    with DigestCache(db_path, refresh=True) as cache:
+        make_hashed_file(data_file, md5(), cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_lru_eviction(tmp_path: Path) -> None:
+    file_paths = []
+    for index in range(5):
+        file_path = tmp_path / f"file_{index}.bin"
+        file_path.write_bytes(bytes([index]))
+        file_paths.append(file_path)
+    db_path = tmp_path / "digests.sqlite3"
+    with DigestCache(db_path, max_entries=3) as cache:
+        for file_path in file_paths[:3]:
+            make_hashed_file(file_path, md5(), cache=cache)
+        # Touch the first entry, so the second is the least recently used.
+        make_hashed_file(file_paths[0], md5(), cache=cache)
+        for file_path in file_paths[3:]:
+            make_hashed_file(file_path, md5(), cache=cache)
+    with DigestCache(db_path, max_entries=3) as cache:
+        for file_path in file_paths:
+            make_hashed_file(file_path, md5(), cache=cache)
+    # 0, 3 and 4 survive; 1 and 2 were evicted.
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_commit_below_limit_skips_count(data_file: Path, tmp_path: Path) -> None:
+    statements: list[str] = []
+    with DigestCache(tmp_path / "digests.sqlite3", max_entries=2) as cache:
+        cache._connection.set_trace_callback(statements.append)
+        make_hashed_file(data_file, md5(), cache=cache)
+        cache.commit()
+        assert not any("count(*)" in statement for statement in statements)
+        for data in [b"changed", b"changed again"]:
+            data_file.write_bytes(data)
+            make_hashed_file(data_file, md5(), cache=cache)
+        # The replaced rows were counted as new, so the cache is counted again.
+        assert cache.evict() == 0
+        assert any("count(*)" in statement for statement in statements)
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_concurrent_cache(tmp_path: Path, pool) -> None:
+    file_paths = []
+    for index in range(10):
+        file_path = tmp_path / f"file_{index}.bin"
+        file_path.write_bytes(bytes([index]) * 100)
+        file_paths.append(file_path)
+    db_path = tmp_path / "digests.sqlite3"
+    with DigestCache(db_path) as cache:
+        list(hash_files_concurrently(file_paths, pool=pool, cache=cache))
+    with DigestCache(db_path) as cache:
+        results = list(
+            hash_files_concurrently(file_paths, pool=pool, ordered=True, cache=cache)
+        )
+    assert (cache.hits, cache.misses) == (10, 0)
+    assert [result.file_path for result in results] == file_paths
+    for result in results:
+        assert result.file_hash == md5(result.file_path.read_bytes()).hexdigest()
@@ -0,0 +1,177 @@
+"""Test cases for the file_hash module."""
+
+import io
+import logging
+import os
+import threading
+from hashlib import blake2b, md5, sha256
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.bytes_iterator_hash import bytes_iterator_multi_hash
+from pfmsoft_trips.snippets.hash.file_hash import (
+    SPARSE_SUPPORTED,
+    MultiHasher,
+    SparseStats,
+    StreamStats,
+    hash_binary_file_readinto,
+    hash_binary_file_sparse,
+    hash_file,
+    hash_stream,
+    make_hashed_file,
+    make_multi_hashed_file,
+    resolve_read_strategy,
+    sparse_file_stats,
+)
+
+# Not a multiple of the block sizes used below, to exercise the final short read.
+DATA = bytes(range(256)) * 1000 + b"tail"
+
+
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(DATA)
+    return file_path
+
+
+@pytest.mark.parametrize("strategy", ["read", "readinto", "mmap", "sparse", "auto"])
+@pytest.mark.parametrize("block_size", [1, 4096, 2**10 * 64])
+def test_hash_file_strategies(data_file: Path, strategy, block_size) -> None:
+    hashcode = hash_file(data_file, md5(), block_size=block_size, strategy=strategy)
+    assert hashcode == md5(DATA).hexdigest()
+
+
+def test_readinto_reuses_buffer(data_file: Path, tmp_path: Path) -> None:
+    empty_file = tmp_path / "empty.bin"
+    empty_file.write_bytes(b"")
+    buffer = bytearray(1000)
+    for file_path, expected in ((data_file, DATA), (empty_file, b"")):
+        with open(file_path, "rb", buffering=0) as file_handle:
+            hashcode = hash_binary_file_readinto(file_handle, md5(), buffer=buffer)
+        assert hashcode == md5(expected).hexdigest()
+
+
+def test_make_hashed_file_readinto(data_file: Path) -> None:
+    result = make_hashed_file(data_file, md5(), strategy="readinto")
+    assert result.file_hash == md5(DATA).hexdigest()
+    assert result.hash_method == "md5"
+
+
+def test_unknown_strategy(data_file: Path) -> None:
+    with pytest.raises(ValueError):
+        hash_file(data_file, md5(), strategy="bogus")  # type: ignore[arg-type]
+
+
+def test_resolve_read_strategy(data_file: Path, tmp_path: Path) -> None:
+    empty_file = tmp_path / "empty.bin"
+    empty_file.write_bytes(b"")
+    with open(data_file, "rb") as file_handle:
+        fd = file_handle.fileno()
+        assert resolve_read_strategy(fd, "mmap") == "mmap"
+        assert resolve_read_strategy(fd, "auto") == "readinto"
+        assert resolve_read_strategy(fd, "auto", mmap_threshold=len(DATA)) == "mmap"
+        assert resolve_read_strategy(fd, "read") == "read"
+    with open(empty_file, "rb") as file_handle:
+        assert resolve_read_strategy(file_handle.fileno(), "mmap") == "readinto"
+
+
+def test_mmap_empty_file(tmp_path: Path) -> None:
+    empty_file = tmp_path / "empty.bin"
+    empty_file.write_bytes(b"")
+    assert hash_file(empty_file, md5(), strategy="mmap") == md5().hexdigest()
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="requires named pipes")
+def test_mmap_falls_back_for_pipe(tmp_path: Path, caplog) -> None:
+    fifo_path = tmp_path / "pipe"
+    os.mkfifo(fifo_path)
+
+    def writer():
+        with open(fifo_path, "wb") as fifo:
+            fifo.write(DATA)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    with caplog.at_level(logging.DEBUG, logger="pfmsoft_trips"):
+        hashcode = hash_file(fifo_path, md5(), strategy="mmap")
+    thread.join()
+    assert hashcode == md5(DATA).hexdigest()
+    assert "'readinto' strategy (requested 'mmap')" in caplog.text
+
+
+@pytest.mark.parametrize("strategy", ["read", "readinto", "mmap"])
+def test_make_multi_hashed_file(data_file: Path, strategy) -> None:
+    result = make_multi_hashed_file(
+        data_file, [md5(), sha256(), blake2b()], block_size=4096, strategy=strategy
+    )
+    assert result.file_hashes == {
+        "md5": md5(DATA).hexdigest(),
+        "sha256": sha256(DATA).hexdigest(),
+        "blake2b": blake2b(DATA).hexdigest(),
+    }
+    assert [hashed.hash_method for hashed in result.hashed_files()] == [
+        "md5",
+        "sha256",
+        "blake2b",
+    ]
+
+
+def test_multi_hasher_rejects_duplicates() -> None:
+    with pytest.raises(ValueError):
+        MultiHasher([md5(), md5()])
+
+
+def test_bytes_iterator_multi_hash() -> None:
+    blocks = iter([DATA[:100], DATA[100:]])
+    digests = bytes_iterator_multi_hash(blocks, [md5(), sha256()])
+    assert digests == {"md5": md5(DATA).hexdigest(), "sha256": sha256(DATA).hexdigest()}
+
+
+def test_hash_stream_does_not_close() -> None:
+    data = b"some streamed data" * 100
+    stream, tee = io.BytesIO(data), io.BytesIO()
+    stats = StreamStats()
+    assert hash_stream(stream, md5(), block_size=64, tee=tee, stats=stats) == (
+        md5(data).hexdigest()
+    )
+    assert not stream.closed and not tee.closed
+    assert tee.getvalue() == data
+    assert stats.bytes_read == len(data)
+
+
+@pytest.mark.skipif(not SPARSE_SUPPORTED, reason="requires SEEK_DATA")
+def test_hash_sparse_file(tmp_path: Path) -> None:
+    sparse_file = tmp_path / "sparse.bin"
+    size = 2**23
+    with open(sparse_file, "wb") as file_out:
+        file_out.truncate(size)
+        file_out.seek(2**20 + 100)
+        file_out.write(DATA)
+        file_out.seek(size - 4)
+        file_out.write(b"tail")
+    expected = bytearray(size)
+    expected[2**20 + 100 : 2**20 + 100 + len(DATA)] = DATA
+    expected[-4:] = b"tail"
+    if os.stat(sparse_file).st_blocks * 512 >= size:
+        pytest.skip("the filesystem does not support holes")
+
+    stats = SparseStats()
+    with open(sparse_file, "rb", buffering=0) as file_handle:
+        assert resolve_read_strategy(file_handle.fileno(), "auto") == "sparse"
+        hashcode = hash_binary_file_sparse(file_handle, md5(), 4096, stats=stats)
+    assert hashcode == md5(expected).hexdigest()
+    assert stats.logical_bytes == size
+    assert len(DATA) + 4 <= stats.data_bytes < size // 2
+    assert stats.allocated_bytes < size // 2
+    assert stats.extents == 2
+    assert sparse_file_stats(sparse_file) == stats
+    assert hash_file(sparse_file, md5(), strategy="auto") == md5(expected).hexdigest()
+
+    # Holes at the end are hashed, but not read.
+    with open(sparse_file, "r+b") as file_out:
+        file_out.truncate(size * 2)
+    expected.extend(bytes(size))
+    assert hash_file(sparse_file, md5(), strategy="sparse") == (
+        md5(expected).hexdigest()
+    )
@@ -0,0 +1,43 @@
+"""Test cases for the hash_job module."""
+
+import os
+import signal
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.file_hash import HashedFile
+from pfmsoft_trips.snippets.hash.hash_job import HashJournal, interrupt_on_terminate
+
+DIGEST = "d41d8cd98f00b204e9800998ecf8427e"
+
+
+def test_journal_resume(tmp_path: Path):
+    journal_file = tmp_path / "job.journal"
+    with HashJournal(journal_file, "md5", sync_every=2) as journal:
+        journal.append(HashedFile(tmp_path / "a", DIGEST, "md5"))
+        journal.append(HashedFile(tmp_path / "b", DIGEST, "md5"))
+    with pytest.raises(FileExistsError):
+        HashJournal(journal_file, "md5")
+    with pytest.raises(ValueError):
+        HashJournal(journal_file, "sha1", resume=True)
+
+    with open(journal_file, "ab") as journal_out:
+        journal_out.write(b'{"file_path": "')
+    with HashJournal(journal_file, "md5", resume=True) as journal:
+        assert len(journal) == 2
+        assert tmp_path / "a" in journal
+        assert [row.file_path for row in journal.completed] == [
+            tmp_path / "a",
+            tmp_path / "b",
+        ]
+        paths = [tmp_path / "a", tmp_path / "c"]
+        assert list(journal.pending(paths)) == [tmp_path / "c"]
+        results = [HashedFile(tmp_path / "c", DIGEST, "md5")]
+        assert list(journal.record(results)) == results
+    assert len(HashJournal(journal_file, "md5", resume=True)) == 3
+
+
+def test_interrupt_on_terminate():
+    with pytest.raises(KeyboardInterrupt), interrupt_on_terminate():
+        os.kill(os.getpid(), signal.SIGTERM)
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
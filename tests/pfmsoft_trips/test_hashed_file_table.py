@@ -0,0 +1,88 @@
+"""Test cases for the hashed_file_table module."""
+
+import os
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.file_hash import make_hashed_file
+from pfmsoft_trips.snippets.hash.hashed_file_table import (
+    CompactHashedFile,
+    HashedFileTable,
+    compact_hashed_file_result_factory,
+)
+
+
+def test_compact_hashed_file(tmp_path: Path):
+    file_path = tmp_path / "a.txt"
+    file_path.write_bytes(b"hello")
+    result = make_hashed_file(
+        file_path, md5(), result_factory=compact_hashed_file_result_factory
+    )
+    assert isinstance(result, CompactHashedFile)
+    assert result.digest == md5(b"hello").digest()
+    assert result.file_hash == md5(b"hello").hexdigest()
+    assert result.file_path == file_path
+    assert not hasattr(result, "__dict__")
+
+
+def test_table_rows(tmp_path: Path):
+    table = HashedFileTable("md5")
+    odd_name = tmp_path / os.fsdecode(b"caf\xe9")
+    table.append(tmp_path / "a", md5(b"a").hexdigest())
+    table.append(odd_name, md5(b"b").digest())
+    assert len(table) == 2
+    assert table[0].file_path == tmp_path / "a"
+    assert table[-1].file_path == odd_name
+    assert table[1].file_hash == md5(b"b").hexdigest()
+    assert [row.hash_method for row in table] == ["md5", "md5"]
+    with pytest.raises(IndexError):
+        table[2]
+    with pytest.raises(ValueError):
+        table.append(tmp_path / "c", "abcd")
+
+
+def test_table_extend_and_save(tmp_path: Path):
+    results = []
+    for name in ("a", "b", "c"):
+        file_path = tmp_path / name
+        file_path.write_text(name)
+        results.append(make_hashed_file(file_path, md5()))
+    table = HashedFileTable("md5")
+    table.extend(results)
+    table_file = tmp_path / "results.table"
+    table.save(table_file)
+
+    loaded = HashedFileTable.load(table_file)
+    assert [(row.file_path, row.file_hash) for row in loaded] == [
+        (result.file_path, result.file_hash) for result in results
+    ]
+    assert loaded.nbytes() == table.nbytes()
+
+    with pytest.raises(ValueError):
+        HashedFileTable("sha1").extend(results)
+    table_file.write_bytes(table_file.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        HashedFileTable.load(table_file)
+
+
+@pytest.mark.parametrize("cut", ["offset", "offsets", "paths", "digests"])
+def test_table_load_truncated(tmp_path: Path, cut: str):
+    table = HashedFileTable("md5")
+    for name in ("a", "b", "c"):
+        table.append(tmp_path / name, md5(name.encode()).digest())
+    table_file = tmp_path / "results.table"
+    table.save(table_file)
+    data = table_file.read_bytes()
+    rows_start = data.index(b"}\n") + 2
+    paths_start = rows_start + 8 * len(table)
+    digests_start = len(data) - table.digest_size * len(table)
+    end = {
+        "offset": rows_start + 12,
+        "offsets": rows_start + 16,
+        "paths": (paths_start + digests_start) // 2,
+        "digests": digests_start,
+    }[cut]
+    table_file.write_bytes(data[:end])
+    with pytest.raises(ValueError, match="truncated"):
+        HashedFileTable.load(table_file)
@@ -0,0 +1,103 @@
+"""Test cases for the instrument module."""
+
+import json
+from contextlib import nullcontext
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash.file_hash import hash_file
+from pfmsoft_trips.snippets.hash.instrument import (
+    active_stats,
+    start_stats,
+    stop_stats,
+    timed_phase,
+)
+
+DATA = bytes(range(256)) * 100
+
+
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(DATA)
+    return file_path
+
+
+@pytest.mark.parametrize("strategy", ["read", "readinto", "mmap"])
+def test_hash_file_stats(data_file: Path, strategy) -> None:
+    stats = start_stats()
+    try:
+        for _ in range(2):
+            hash_file(data_file, md5(), block_size=1000, strategy=strategy)
+        with timed_phase("output"):
+            pass
+    finally:
+        assert stop_stats() is stats
+    assert stats.files == 2
+    assert stats.bytes == 2 * len(DATA)
+    assert stats.update_ns > 0
+    if strategy != "mmap":
+        assert stats.read_ns > 0
+    summary = stats.summary()
+    assert summary["files"] == 2
+    assert summary["startup_ns"] >= 0
+    assert summary["mb_per_s"] > 0
+
+
+def test_stats_off(data_file: Path) -> None:
+    assert active_stats() is None
+    assert hash_file(data_file, md5()) == md5(DATA).hexdigest()
+    assert isinstance(timed_phase("output"), nullcontext)
+
+
+def test_stats_json(data_file: Path, tmp_path: Path) -> None:
+    stats_file = tmp_path / "stats.json"
+    result = CliRunner().invoke(
+        app,
+        ["-vv", "--stats-json", str(stats_file)]
+        + ["hash-files", "--no-cache", str(data_file)],
+    )
+    assert result.exit_code == 0
+    assert "1 files, 25600 bytes" in result.stderr
+    assert "Phases: startup" in result.stderr
+    summary = json.loads(stats_file.read_text())
+    assert summary["files"] == 1
+    assert summary["bytes"] == len(DATA)
+    assert summary["output_ns"] > 0
+    assert active_stats() is None
+
+
+def test_stats_json_cache_hits(data_file: Path, tmp_path: Path) -> None:
+    stats_file = tmp_path / "stats.json"
+    cache_args = ["--cache-file", str(tmp_path / "cache.sqlite3")]
+    for _ in range(2):
+        result = CliRunner().invoke(
+            app,
+            ["--stats-json", str(stats_file), "hash-files", *cache_args]
+            + [str(data_file)],
+        )
+        assert result.exit_code == 0
+    summary = json.loads(stats_file.read_text())
+    assert summary["files"] == 0
+    assert summary["cache_hits"] == 1
+
+
+def test_stats_json_processes(data_file: Path, tmp_path: Path) -> None:
+    stats_file = tmp_path / "stats.json"
+    result = CliRunner().invoke(
+        app,
+        ["--stats-json", str(stats_file), "hash-files", "--processes"]
+        + ["--no-cache", str(data_file)],
+    )
+    assert result.exit_code == 2
+    assert "--processes" in result.stderr
+    assert not stats_file.exists()
+    assert active_stats() is None
+    result = CliRunner().invoke(
+        app, ["-vv", "hash-files", "--processes", "--no-cache", str(data_file)]
+    )
+    assert result.exit_code == 0
+    assert "not counted in the stats" in result.stderr
@@ -0,0 +1,151 @@
+"""Test cases for the io_policy module."""
+
+import os
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash.file_hash import hash_file
+from pfmsoft_trips.snippets.hash.io_policy import (
+    FADVISE_SUPPORTED,
+    NOATIME_SUPPORTED,
+    open_noatime,
+    page_cache_residency,
+)
+
+DATA = os.urandom(2**24)
+
+
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    file_path = tmp_path / "data.bin"
+    with open(file_path, "wb") as file_out:
+        file_out.write(DATA)
+        # Dirty pages can not be dropped until they are written.
+        file_out.flush()
+        os.fsync(file_out.fileno())
+    return file_path
+
+
+@pytest.fixture(scope="module")
+def large_file(tmp_path_factory: pytest.TempPathFactory) -> tuple[Path, str]:
+    # Several times the readahead of a sequential read, which can be 16M.
+    file_path = tmp_path_factory.mktemp("io_policy") / "large.bin"
+    data = os.urandom(2**26)
+    with open(file_path, "wb") as file_out:
+        file_out.write(data)
+        file_out.flush()
+        os.fsync(file_out.fileno())
+    return file_path, md5(data).hexdigest()
+
+
+def drop_pages(file_path: Path, offset: int = 0) -> None:
+    file_descriptor = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(file_descriptor, offset, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(file_descriptor)
+
+
+class ResidencyHasher:
+    """An md5 hasher that records the peak page cache residency of a file."""
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = file_path
+        self.hasher = md5()
+        self.name = self.hasher.name
+        self.peak = 0
+
+    def update(self, data) -> None:
+        self.hasher.update(data)
+        resident, _ = page_cache_residency(self.file_path)
+        self.peak = max(self.peak, resident)
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+
+@pytest.mark.skipif(not FADVISE_SUPPORTED, reason="requires posix_fadvise")
+@pytest.mark.parametrize("strategy", ["read", "readinto", "mmap", "sparse", "auto"])
+def test_bulk_policy_releases_pages(large_file: tuple[Path, str], strategy) -> None:
+    file_path, file_hash = large_file
+    try:
+        page_cache_residency(file_path)
+    except OSError:
+        pytest.skip("mincore is not available")
+    drop_pages(file_path)
+    assert hash_file(file_path, md5(), strategy=strategy) == file_hash
+    resident, pages = page_cache_residency(file_path)
+    if resident < pages // 2:
+        pytest.skip("the page cache does not keep the file")
+
+    drop_pages(file_path)
+    hasher = ResidencyHasher(file_path)
+    assert (
+        hash_file(file_path, hasher, strategy=strategy, io_policy="bulk")  # type: ignore[arg-type]
+        == file_hash
+    )
+    resident, pages = page_cache_residency(file_path)
+    assert resident <= pages // 20
+    # Released while reading, not only on close.
+    assert hasher.peak <= pages * 3 // 4
+
+
+@pytest.mark.skipif(not FADVISE_SUPPORTED, reason="requires posix_fadvise")
+@pytest.mark.parametrize("strategy", ["read", "mmap"])
+def test_bulk_policy_keeps_cached_pages(data_file: Path, strategy) -> None:
+    try:
+        page_cache_residency(data_file)
+    except OSError:
+        pytest.skip("mincore is not available")
+    # Cache the first half of the file, as if another program had read it.
+    assert data_file.read_bytes() == DATA
+    drop_pages(data_file, offset=len(DATA) // 2)
+    resident_before, pages = page_cache_residency(data_file)
+    if not pages // 4 < resident_before < pages * 3 // 4:
+        pytest.skip("the page cache does not keep half of the file")
+
+    assert hash_file(data_file, md5(), strategy=strategy, io_policy="bulk") == (
+        md5(DATA).hexdigest()
+    )
+    resident, pages = page_cache_residency(data_file)
+    assert abs(resident - resident_before) <= pages // 20
+
+
+@pytest.mark.skipif(not NOATIME_SUPPORTED, reason="requires O_NOATIME")
+def test_bulk_policy_keeps_atime(data_file: Path) -> None:
+    # Older than the mtime, so that a relatime mount updates it on read.
+    old_atime_ns = os.stat(data_file).st_mtime_ns - 10**12
+    os.utime(data_file, ns=(old_atime_ns, os.stat(data_file).st_mtime_ns))
+    hash_file(data_file, md5(), io_policy="bulk")
+    assert os.stat(data_file).st_atime_ns == old_atime_ns
+    hash_file(data_file, md5())
+    if os.stat(data_file).st_atime_ns == old_atime_ns:
+        pytest.skip("the filesystem does not update access times")
+
+
+def test_open_noatime_falls_back(
+    data_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    real_open = os.open
+
+    def open_not_owner(path, flags, *args):
+        if flags & getattr(os, "O_NOATIME", 0):
+            raise PermissionError(1, "Operation not permitted", path)
+        return real_open(path, flags, *args)
+
+    monkeypatch.setattr(os, "open", open_not_owner)
+    with open(data_file, "rb", opener=open_noatime) as file_handle:
+        assert file_handle.read(16) == DATA[:16]
+    with pytest.raises(ValueError):
+        hash_file(data_file, md5(), io_policy="bogus")  # type: ignore[arg-type]
+
+
+def test_hash_files_bulk(data_file: Path) -> None:
+    result = CliRunner().invoke(
+        app, ["hash-files", "--no-cache", "--io-policy", "bulk", str(data_file)]
+    )
+    assert result.exit_code == 0
+    assert f"{md5(DATA).hexdigest()}  {data_file}" in result.stdout
@@ -0,0 +1,198 @@
+"""Test cases for the queue based logging."""
+
+import json
+import logging
+import threading
+from hashlib import md5
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash.file_hash import make_hashed_file
+from pfmsoft_trips.snippets.hash.parallel_hash import hash_files_concurrently
+from pfmsoft_trips.snippets.logging.logging import (
+    BoundedQueueHandler,
+    JsonLinesFormatter,
+    QueueLogging,
+    init_queue_logging_worker,
+    json_lines_file_handler,
+    rotating_file_queue_logger,
+)
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[str] = []
+        self.threads: set[str] = set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+
+@pytest.fixture
+def test_logger() -> logging.Logger:
+    logger_ = logging.getLogger("pfmsoft_trips.tests.queue_logging")
+    logger_.setLevel(logging.DEBUG)
+    logger_.propagate = False
+    yield logger_
+    logger_.handlers.clear()
+
+
+def test_queue_logging(test_logger: logging.Logger) -> None:
+    collector = CollectingHandler()
+    with QueueLogging([collector]) as queue_logging:
+        test_logger.addHandler(queue_logging.handler)
+        items = ["a"]
+        test_logger.info("items %s", items)
+        items.append("b")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            test_logger.exception("failed")
+    assert collector.messages[0] == "items ['a']"
+    assert collector.messages[1].startswith("failed\nTraceback")
+    assert threading.current_thread().name not in collector.threads
+
+
+@pytest.mark.parametrize(
+    "drop_policy, expected", [("drop_new", ["0", "1"]), ("drop_oldest", ["3", "4"])]
+)
+def test_drop_policy(
+    test_logger: logging.Logger, drop_policy: str, expected: list[str]
+) -> None:
+    collector = CollectingHandler()
+    queue_logging = QueueLogging([collector], max_size=2, drop_policy=drop_policy)
+    test_logger.addHandler(queue_logging.handler)
+    # Nothing is handled until the listener starts, so the queue fills up.
+    for index in range(5):
+        test_logger.info("%d", index)
+    assert queue_logging.handler.dropped == 3
+    queue_logging.start()
+    queue_logging.stop()
+    assert collector.messages == expected
+
+
+def test_process_pool_workers(tmp_path: Path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    collector = CollectingHandler()
+    with QueueLogging([collector], multiprocess=True) as queue_logging:
+        results = hash_files_concurrently(
+            [file_path],
+            max_workers=1,
+            pool="process",
+            initializer=init_queue_logging_worker,
+            initargs=(*queue_logging.worker_initargs, "pfmsoft_trips"),
+        )
+        assert len(list(results)) == 1
+    assert any(str(file_path) in message for message in collector.messages)
+
+
+def test_rotating_file_queue_logger(tmp_path: Path) -> None:
+    logger_, queue_logging = rotating_file_queue_logger(
+        "pfmsoft_trips.tests.rotating", tmp_path, logging.INFO
+    )
+    try:
+        logger_.info("written by the listener")
+    finally:
+        queue_logging.stop()
+        queue_logging.handlers[0].close()
+        logger_.handlers.clear()
+    log_text = (tmp_path / "pfmsoft_trips.tests.rotating.log").read_text()
+    assert "written by the listener" in log_text
+
+
+def test_json_lines_formatter(test_logger: logging.Logger) -> None:
+    collector = CollectingHandler()
+    collector.setFormatter(JsonLinesFormatter())
+    test_logger.addHandler(collector)
+    test_logger.info("hashed %s", "file", extra={"data": {"path": Path("a b")}})
+    document = json.loads(collector.messages[0])
+    assert document["message"] == "hashed file"
+    assert document["path"] == "a b"
+    assert document["level"] == "INFO"
+    assert '", "' not in collector.messages[0]
+    assert '": ' not in collector.messages[0]
+
+
+def test_metrics_file(tmp_path: Path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    metrics_file = tmp_path / "metrics.jsonl"
+    result = CliRunner().invoke(
+        app,
+        ["--metrics-file", str(metrics_file), "hash-md5", "--no-cache", str(file_path)],
+    )
+    assert result.exit_code == 0
+    (line,) = metrics_file.read_text().splitlines()
+    document = json.loads(line)
+    assert document["path"] == str(file_path)
+    assert document["size"] == 9
+    assert document["algorithm"] == "md5"
+    assert document["digest"] == md5(b"some data").hexdigest()
+    assert document["elapsed_ns"] > 0
+    metrics_logger = logging.getLogger("pfmsoft_trips.metrics.hash")
+    assert not metrics_logger.isEnabledFor(logging.INFO)
+    assert not [
+        handler
+        for handler in metrics_logger.handlers
+        if isinstance(handler, BoundedQueueHandler)
+    ]
+
+
+@pytest.mark.parametrize("pool", ["--threads", "--processes"])
+def test_metrics_file_hash_files(tmp_path: Path, pool: str) -> None:
+    file_paths = []
+    for name in ("a", "b", "c"):
+        file_path = tmp_path / f"{name}.txt"
+        file_path.write_text(name)
+        file_paths.append(str(file_path))
+    metrics_file = tmp_path / "metrics.jsonl"
+    result = CliRunner().invoke(
+        app,
+        [
+            "--metrics-file",
+            str(metrics_file),
+            "hash-files",
+            "--no-cache",
+            pool,
+            "--workers",
+            "2",
+            *file_paths,
+        ],
+    )
+    assert result.exit_code == 0
+    documents = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert sorted(document["path"] for document in documents) == file_paths
+
+
+def test_json_lines_file_handler_appends(tmp_path: Path) -> None:
+    for run in range(2):
+        handler = json_lines_file_handler(tmp_path, "metrics", logging.INFO)
+        handler.handle(logging.makeLogRecord({"msg": f"run {run}", "levelno": 20}))
+        handler.close()
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert [json.loads(line)["message"] for line in lines] == ["run 0", "run 1"]
+    assert not isinstance(handler, RotatingFileHandler)
+
+
+def test_metrics_are_opt_in(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    result = CliRunner().invoke(
+        app, ["--debug", "hash-md5", "--no-cache", str(file_path)]
+    )
+    assert result.exit_code == 0
+    assert "pfmsoft_trips.metrics" not in result.stderr
+    # As with logging.basicConfig(level=logging.INFO).
+    with caplog.at_level(logging.INFO):
+        make_hashed_file(file_path, md5())
+    assert not [
+        record
+        for record in caplog.records
+        if record.name.startswith("pfmsoft_trips.metrics")
+    ]
@@ -0,0 +1,68 @@
+"""Test cases for the manifest module."""
+
+import io
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.file_hash import HashedFile
+from pfmsoft_trips.snippets.hash.manifest import (
+    ManifestStats,
+    format_manifest_line,
+    parse_manifest_line,
+    precheck_manifest,
+    read_manifest,
+    verify_manifest,
+    write_manifest,
+)
+
+
+@pytest.mark.parametrize(
+    "path_str", ["plain.txt", "dir/with space.txt", "back\\slash", "new\nline"]
+)
+def test_line_round_trip(path_str: str) -> None:
+    digest = md5(b"x").hexdigest()
+    line = format_manifest_line(digest, Path(path_str))
+    assert "\n" not in line
+    assert parse_manifest_line(line) == (digest, Path(path_str))
+
+
+def test_parse_binary_marker_and_garbage() -> None:
+    digest = md5(b"x").hexdigest()
+    assert parse_manifest_line(f"{digest} *file.bin\n") == (digest, Path("file.bin"))
+    assert parse_manifest_line("Verbosity: 1") is None
+
+
+def test_read_manifest_counts_bad_lines(tmp_path: Path) -> None:
+    digest = md5(b"x").hexdigest()
+    stats = ManifestStats()
+    lines = ["garbage\n", f"{digest}  a.txt\n", "\n"]
+    entries = list(read_manifest(lines, "md5", base_dir=tmp_path, stats=stats))
+    assert entries == [HashedFile(tmp_path / "a.txt", digest, "md5")]
+    assert (stats.entries, stats.improperly_formatted) == (1, 1)
+
+
+def test_verify_manifest(tmp_path: Path) -> None:
+    hashed_files = []
+    for index in range(10):
+        file_path = tmp_path / f"file_{index}.txt"
+        file_path.write_bytes(str(index).encode())
+        hashed_files.append(
+            HashedFile(file_path, md5(str(index).encode()).hexdigest(), "md5")
+        )
+    manifest = io.StringIO()
+    assert write_manifest(hashed_files, manifest) == 10
+    (tmp_path / "file_3.txt").write_bytes(b"changed")
+    (tmp_path / "file_7.txt").unlink()
+
+    manifest.seek(0)
+    results = list(verify_manifest(read_manifest(manifest, "md5"), "md5", ordered=True))
+    statuses = {result.file_path.name: result.status for result in results}
+    assert len(results) == 10
+    assert statuses.pop("file_3.txt") == "FAILED"
+    assert statuses.pop("file_7.txt") == "MISSING"
+    assert set(statuses.values()) == {"OK"}
+
+    manifest.seek(0)
+    missing = list(precheck_manifest(read_manifest(manifest, "md5")))
+    assert [result.file_path.name for result in missing] == ["file_7.txt"]
@@ -0,0 +1,138 @@
+"""Test cases for the merkle_hash module."""
+
+import hashlib
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.cli.options import DEFAULT_MERKLE_CHUNK_SIZE
+from pfmsoft_trips.snippets.hash import merkle_hash
+from pfmsoft_trips.snippets.hash.merkle_hash import (
+    DEFAULT_CHUNK_SIZE,
+    MerkleHash,
+    merkle_hash_file,
+    merkle_root,
+    verify_chunks,
+)
+
+CHUNK_SIZE = 1000
+
+
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(bytes(range(256)) * 20)
+    return file_path
+
+
+def test_merkle_root() -> None:
+    leaves = [hashlib.sha256(bytes([index])).digest() for index in range(3)]
+    left = hashlib.sha256(b"\x01" + leaves[0] + leaves[1]).digest()
+    assert (
+        merkle_root(leaves, "sha256")
+        == hashlib.sha256(b"\x01" + left + leaves[2]).digest()
+    )
+    assert merkle_root(leaves[:1], "sha256") == leaves[0]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_merkle_hash_file(data_file: Path, max_workers: int) -> None:
+    result = merkle_hash_file(
+        data_file, "sha256", chunk_size=CHUNK_SIZE, max_workers=max_workers
+    )
+    data = data_file.read_bytes()
+    leaves = [
+        hashlib.sha256(b"\x00" + data[offset : offset + CHUNK_SIZE]).digest()
+        for offset in range(0, len(data), CHUNK_SIZE)
+    ]
+    assert result.size == len(data)
+    assert result.chunk_hashes == [leaf.hex() for leaf in leaves]
+    assert result.root_hash == merkle_root(leaves, "sha256").hex()
+
+
+def test_empty_file(tmp_path: Path) -> None:
+    file_path = tmp_path / "empty.bin"
+    file_path.touch()
+    result = merkle_hash_file(file_path, "sha256")
+    assert result.root_hash == hashlib.sha256(b"\x00").hexdigest()
+    assert verify_chunks(file_path, result) == []
+
+
+def test_verify_chunks(data_file: Path, tmp_path: Path) -> None:
+    record_path = tmp_path / "record.json"
+    merkle_hash_file(data_file, chunk_size=CHUNK_SIZE).save(record_path)
+    record = MerkleHash.load(record_path)
+    assert verify_chunks(data_file, record) == []
+
+    data = bytearray(data_file.read_bytes())
+    data[2500] ^= 0xFF
+    data_file.write_bytes(data)
+    assert verify_chunks(data_file, record) == [(2000, 1000)]
+    assert verify_chunks(data_file, record, record.chunks_for_range(0, 2000)) == []
+    assert list(record.chunks_for_range(1999, 2)) == [1, 2]
+
+    data_file.write_bytes(data[:4500])
+    assert verify_chunks(data_file, record) == [(2000, 1000), (4000, 1120)]
+    data_file.write_bytes(data[:4000])
+    assert verify_chunks(data_file, record) == [(2000, 1000), (4000, 1120)]
+    data_file.write_bytes(data + b"more")
+    assert verify_chunks(data_file, record) == [(2000, 1000), (5120, 4)]
+
+
+def test_merkle_cli(data_file: Path, tmp_path: Path) -> None:
+    runner = CliRunner()
+    record_path = tmp_path / "record.json"
+    result = runner.invoke(
+        app,
+        ["merkle-hash", "--chunk-size", "1000", "--record", str(record_path)]
+        + [str(data_file)],
+    )
+    assert result.exit_code == 0
+    root_hash = MerkleHash.load(record_path).root_hash
+    assert f"{root_hash}  {data_file}" in result.stdout
+
+    result = runner.invoke(app, ["merkle-verify", str(record_path), str(data_file)])
+    assert result.exit_code == 0
+    assert f"{data_file}: OK" in result.stdout
+
+    data = bytearray(data_file.read_bytes())
+    data[10] ^= 0xFF
+    data_file.write_bytes(data)
+    result = runner.invoke(
+        app,
+        ["merkle-verify", "--offset", "1000", str(record_path), str(data_file)],
+    )
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["merkle-verify", str(record_path), str(data_file)])
+    assert result.exit_code == 1
+    assert f"{data_file}: corrupted at 0, 1000 bytes" in result.stdout
+
+
+@pytest.mark.parametrize("command", ["merkle-hash", "merkle-verify"])
+def test_merkle_cli_file_shrinks(
+    data_file: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, command: str
+) -> None:
+    record_path = tmp_path / "record.json"
+    merkle_hash_file(data_file, chunk_size=CHUNK_SIZE).save(record_path)
+    original_hash_chunk = merkle_hash.hash_chunk
+
+    def shrinking_hash_chunk(*args, **kwargs) -> bytes:
+        with data_file.open("r+b") as file:
+            file.truncate(100)
+        return original_hash_chunk(*args, **kwargs)
+
+    monkeypatch.setattr(merkle_hash, "hash_chunk", shrinking_hash_chunk)
+    if command == "merkle-hash":
+        args = [command, "--chunk-size", "1000", str(data_file)]
+    else:
+        args = [command, str(record_path), str(data_file)]
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 1
+    assert f"{data_file}: changed while" in result.stderr
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+
+
+def test_default_chunk_size():
+    # The cli repeats the default, so it does not import merkle_hash at startup.
+    assert DEFAULT_MERKLE_CHUNK_SIZE == DEFAULT_CHUNK_SIZE
@@ -0,0 +1,59 @@
+"""Test cases for the parallel_hash module."""
+
+from hashlib import md5, sha256
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.parallel_hash import hash_files_concurrently
+
+
+@pytest.fixture
+def data_files(tmp_path: Path) -> list[Path]:
+    file_paths = []
+    for index in range(20):
+        file_path = tmp_path / f"file_{index}.bin"
+        file_path.write_bytes(str(index).encode() * (index * 1000 + 1))
+        file_paths.append(file_path)
+    return file_paths
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_hash_files_concurrently(data_files: list[Path], pool) -> None:
+    results = list(
+        hash_files_concurrently(data_files, "sha256", max_workers=3, pool=pool)
+    )
+    assert len(results) == len(data_files)
+    for result in results:
+        assert result.file_hash == sha256(result.file_path.read_bytes()).hexdigest()
+        assert result.hash_method == "sha256"
+
+
+def test_ordered(data_files: list[Path]) -> None:
+    results = hash_files_concurrently(
+        data_files, max_workers=4, ordered=True, max_pending=2
+    )
+    assert [result.file_path for result in results] == data_files
+
+
+def test_on_error(data_files: list[Path], tmp_path: Path) -> None:
+    missing = tmp_path / "missing.bin"
+    errors = []
+    results = list(
+        hash_files_concurrently(
+            [*data_files, missing],
+            on_error=lambda path, error: errors.append((path, error)),
+        )
+    )
+    assert len(results) == len(data_files)
+    assert errors[0][0] == missing
+    assert isinstance(errors[0][1], FileNotFoundError)
+
+
+def test_error_raises_without_handler(tmp_path: Path) -> None:
+    with pytest.raises(FileNotFoundError):
+        list(hash_files_concurrently([tmp_path / "missing.bin"]))
+
+
+def test_results_match_md5(data_files: list[Path]) -> None:
+    for result in hash_files_concurrently(data_files, ordered=True):
+        assert result.file_hash == md5(result.file_path.read_bytes()).hexdigest()
@@ -0,0 +1,45 @@
+"""Test cases for the --profile option."""
+
+import pstats
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+
+
+def test_profile_cprofile(tmp_path: Path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    profile_file = tmp_path / "hash.pstats"
+    result = CliRunner().invoke(
+        app,
+        ["--profile", str(profile_file), "--profiler", "cprofile"]
+        + ["--profile-top", "5", "hash-md5", "--no-cache", str(file_path)],
+    )
+    assert result.exit_code == 0
+    assert "cumulative" in result.stderr
+    assert f"Profile saved to {profile_file}" in result.stderr
+    stats = pstats.Stats(str(profile_file))
+    assert any(
+        function_name == "hash_file"
+        for _, _, function_name in stats.stats  # type: ignore[attr-defined]
+    )
+
+
+def test_profile_pyinstrument(tmp_path: Path) -> None:
+    pytest.importorskip("pyinstrument")
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(bytes(2**24))
+    profile_file = tmp_path / "hash.pstats"
+    result = CliRunner().invoke(
+        app,
+        ["--profile", str(profile_file), "--profiler", "pyinstrument"]
+        + ["--profile-top", "3", "hash-md5", "--no-cache", str(file_path)],
+    )
+    assert result.exit_code == 0
+    assert "cumulative" in result.stderr
+    assert "List reduced from" in result.stderr
+    assert f"Profile saved to {profile_file}" in result.stderr
+    stats = pstats.Stats(str(profile_file))
+    assert stats.total_tt > 0  # type: ignore[attr-defined]
@@ -0,0 +1,86 @@
+"""Test cases for the tree_walk module."""
+
+import os
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+from pfmsoft_trips.snippets.hash.tree_walk import hash_tree, walk_files
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / "tree"
+    for relative in [
+        "a.txt",
+        "b.log",
+        "sub/c.txt",
+        "sub/deeper/d.txt",
+        "skip_me/e.txt",
+        "big.bin",
+    ]:
+        file_path = root / relative
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(relative)
+    (root / "big.bin").write_bytes(b"x" * 1000)
+    return root
+
+
+def relative_names(root: Path, paths) -> set[str]:
+    return {path.relative_to(root).as_posix() for path in paths}
+
+
+def test_walk_all(tree: Path) -> None:
+    assert relative_names(tree, walk_files(tree)) == {
+        "a.txt",
+        "b.log",
+        "sub/c.txt",
+        "sub/deeper/d.txt",
+        "skip_me/e.txt",
+        "big.bin",
+    }
+
+
+def test_walk_globs_and_sizes(tree: Path) -> None:
+    found = walk_files(tree, include=["*.txt"], exclude=["skip_me", "sub/deeper"])
+    assert relative_names(tree, found) == {"a.txt", "sub/c.txt"}
+    assert relative_names(tree, walk_files(tree, min_size=100)) == {"big.bin"}
+    assert "big.bin" not in relative_names(tree, walk_files(tree, max_size=100))
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="requires symlinks")
+def test_symlink_policies(tree: Path) -> None:
+    (tree / "link.txt").symlink_to(tree / "a.txt")
+    (tree / "sub" / "loop").symlink_to(tree)
+    assert "link.txt" not in relative_names(tree, walk_files(tree))
+    files_policy = relative_names(tree, walk_files(tree, symlinks="files"))
+    assert "link.txt" in files_policy
+    assert not any(name.startswith("sub/loop") for name in files_policy)
+    # The loop back to the root is detected, not followed forever.
+    follow_policy = relative_names(tree, walk_files(tree, symlinks="follow"))
+    assert follow_policy == files_policy
+
+
+def test_unreadable_directory_reported(tree: Path) -> None:
+    errors = []
+    list(walk_files(tree / "missing", on_error=errors.append))
+    assert isinstance(errors[0], FileNotFoundError)
+
+
+def test_hash_tree(tree: Path) -> None:
+    results = list(hash_tree(tree, hash_method="sha1", include=["*.txt"]))
+    assert len(results) == 4
+    for result in results:
+        assert result.hash_method == "sha1"
+
+
+def test_hash_tree_command(tree: Path) -> None:
+    result = CliRunner().invoke(
+        app, ["hash-tree", "--include", "*.txt", "--exclude", "sub", str(tree)]
+    )
+    assert result.exit_code == 0
+    assert f"{md5(b'a.txt').hexdigest()}  {tree / 'a.txt'}" in result.stdout
+    assert "c.txt" not in result.stdout
+    assert result.stdout.count(str(tree)) == 2
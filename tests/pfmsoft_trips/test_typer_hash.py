@@ -1,5 +1,6 @@
 """Test cases for the console module."""
 
+from hashlib import md5, sha256
 from importlib import resources
 
 import pytest
@@ -30,3 +31,153 @@ def test_hash_md5(runner: CliRunner) -> None:
         if result.stderr_bytes is not None:
             print(result.stderr)
         assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("mmap_option", ["--mmap", "--no-mmap"])
+def test_hash_md5_mmap_option(runner: CliRunner, mmap_option: str) -> None:
+    file_resource = resources.files(RESOURCES_ANCHOR).joinpath(DATA_FILE_ANCHOR)
+    with resources.as_file(file_resource) as input_path:
+        result = runner.invoke(
+            app, ["--debug", "hash-md5", mmap_option, str(input_path)]
+        )
+        print(result.stdout)
+        print(result.stderr)
+        assert result.exit_code == 0
+        assert md5(input_path.read_bytes()).hexdigest() in result.stdout
+        expected = "'mmap'" if mmap_option == "--mmap" else "'readinto'"
+        assert f"with the {expected} strategy" in result.stderr
+
+
+@pytest.mark.parametrize("pool_option", ["--threads", "--processes"])
+def test_hash_files(runner: CliRunner, tmp_path, pool_option: str) -> None:
+    (tmp_path / "sub").mkdir()
+    contents = {"a.txt": b"alpha", "sub/b.txt": b"bravo", "sub/c.txt": b"charlie"}
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+    result = runner.invoke(
+        app, ["hash-files", pool_option, "--ordered", "--workers", "2", str(tmp_path)]
+    )
+    print(result.stdout)
+    assert result.exit_code == 0
+    for name, data in contents.items():
+        assert f"{md5(data).hexdigest()}  {tmp_path / name}" in result.stdout
+
+
+def test_hash_files_missing_file(runner: CliRunner, tmp_path) -> None:
+    result = runner.invoke(app, ["hash-files", str(tmp_path / "missing.txt")])
+    assert result.exit_code == 1
+    assert "missing.txt" in result.stderr
+
+
+def test_hash_files_bad_algo(runner: CliRunner, tmp_path) -> None:
+    result = runner.invoke(app, ["hash-files", "--algo", "nope", str(tmp_path)])
+    assert result.exit_code != 0
+
+
+def test_hash_multiple_algorithms(runner: CliRunner, tmp_path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    result = runner.invoke(app, ["hash", "--algo", "md5,sha256", str(file_path)])
+    print(result.stdout)
+    assert result.exit_code == 0
+    assert f"MD5 ({file_path}) = {md5(b'some data').hexdigest()}" in result.stdout
+    assert f"SHA256 ({file_path}) = {sha256(b'some data').hexdigest()}" in result.stdout
+
+
+def test_hash_multiple_algorithms_errors(runner: CliRunner, tmp_path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    result = runner.invoke(app, ["hash", str(tmp_path / "missing.txt"), str(file_path)])
+    assert result.exit_code == 1
+    assert "missing.txt" in result.stderr
+    assert f"MD5 ({file_path}) = {md5(b'some data').hexdigest()}" in result.stdout
+
+    result = runner.invoke(app, ["hash", "--algo", "md5,md5", str(file_path)])
+    assert result.exit_code == 2
+    assert "only be given once" in result.stderr
+
+
+def test_hash_md5_cache(runner: CliRunner, tmp_path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    result = runner.invoke(app, ["hash-md5", "--cache-stats", str(file_path)])
+    assert "Digest cache: 0 hits, 1 misses" in result.stderr
+    result = runner.invoke(app, ["hash-md5", "--cache-stats", str(file_path)])
+    assert "Digest cache: 1 hits, 0 misses" in result.stderr
+    assert md5(b"some data").hexdigest() in result.stdout
+    result = runner.invoke(
+        app, ["hash-md5", "--cache-stats", "--refresh", str(file_path)]
+    )
+    assert "Digest cache: 0 hits, 1 misses" in result.stderr
+    result = runner.invoke(app, ["hash-md5", str(file_path)])
+    assert "Digest cache" not in result.stderr
+    result = runner.invoke(
+        app, ["hash-md5", "--cache-stats", "--no-cache", str(file_path)]
+    )
+    assert "Digest cache" not in result.stderr
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("separator", ["\0", "\n"])
+def test_hash_md5_files_from_stdin(runner: CliRunner, tmp_path, separator) -> None:
+    file_paths = []
+    for index in range(3):
+        file_path = tmp_path / f"data {index}.txt"
+        file_path.write_bytes(f"data {index}".encode())
+        file_paths.append(file_path)
+    list_in = separator.join(str(path) for path in file_paths) + separator
+    list_in += str(tmp_path / "missing.txt")
+    result = runner.invoke(app, ["hash-md5", "--files-from", "-"], input=list_in)
+    assert result.exit_code == 1
+    for file_path in file_paths:
+        expected = md5(file_path.read_bytes()).hexdigest()
+        assert f"{expected}  {file_path}" in result.stdout
+    assert "missing.txt" in result.stderr
+
+
+def test_hash_md5_files_from_file(runner: CliRunner, tmp_path) -> None:
+    file_path = tmp_path / "data.txt"
+    file_path.write_bytes(b"some data")
+    list_file = tmp_path / "files.txt"
+    list_file.write_text(f"{file_path}\n\n")
+    result = runner.invoke(app, ["hash-md5", "--files-from", str(list_file)])
+    assert result.exit_code == 0
+    assert f"{md5(b'some data').hexdigest()}  {file_path}" in result.stdout
+    result = runner.invoke(app, ["hash-md5"])
+    assert result.exit_code == 2
+
+
+def test_hash_md5_stdin(runner: CliRunner, tmp_path) -> None:
+    data = b"streamed data" * 1000
+    tee_file = tmp_path / "copy.bin"
+    result = runner.invoke(
+        app, ["hash-md5", "--tee", str(tee_file), "--throughput", "-"], input=data
+    )
+    assert result.exit_code == 0
+    assert f"{md5(data).hexdigest()}  -" in result.stdout
+    assert f"{len(data)} bytes in" in result.stderr
+    assert tee_file.read_bytes() == data
+
+
+def test_hash_files_resume(runner: CliRunner, tmp_path) -> None:
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    contents = {f"{name}.txt": name.encode() for name in ("a", "b", "c", "d")}
+    for name, data in contents.items():
+        (data_dir / name).write_bytes(data)
+    journal_file = tmp_path / "job.journal"
+    args = ["hash-files", "--no-cache", "--journal", str(journal_file), str(data_dir)]
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    result = runner.invoke(app, args)
+    assert result.exit_code == 2
+    assert "--resume" in result.stderr
+
+    # Keep the header and two results, and tear the third, like a crash.
+    lines = journal_file.read_bytes().splitlines(keepends=True)
+    journal_file.write_bytes(b"".join(lines[:3]) + lines[3][:10])
+    result = runner.invoke(app, [*args, "--resume"])
+    assert result.exit_code == 0
+    for name, data in contents.items():
+        assert result.stdout.count(f"{md5(data).hexdigest()}  {data_dir / name}") == 1
+    assert len(journal_file.read_bytes().splitlines()) == 5
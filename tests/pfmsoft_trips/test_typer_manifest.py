@@ -0,0 +1,65 @@
+"""Test cases for the manifest commands."""
+
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+from pfmsoft_trips.cli.main_typer import app
+
+
+@pytest.fixture
+def runner() -> CliRunner:
+    """Fixture for invoking command-line interfaces."""
+    return CliRunner()
+
+
+@pytest.fixture
+def manifest_file(runner: CliRunner, tmp_path: Path) -> Path:
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for index in range(5):
+        (data_dir / f"file_{index}.txt").write_text(f"data {index}")
+    # Inside the hashed directory, it must not list itself.
+    manifest_path = data_dir / "manifest.md5"
+    result = runner.invoke(
+        app, ["manifest", "create", "-o", str(manifest_path), str(data_dir)]
+    )
+    assert result.exit_code == 0
+    return manifest_path
+
+
+def test_create_and_verify(runner: CliRunner, manifest_file: Path) -> None:
+    assert len(manifest_file.read_text().splitlines()) == 5
+    result = runner.invoke(app, ["manifest", "verify", str(manifest_file)])
+    print(result.stdout)
+    assert result.exit_code == 0
+    assert result.stdout.count(": OK") == 5
+
+
+def test_verify_failures(runner: CliRunner, manifest_file: Path) -> None:
+    (manifest_file.parent / "file_1.txt").write_text("changed")
+    result = runner.invoke(app, ["manifest", "verify", "--quiet", str(manifest_file)])
+    assert result.exit_code == 1
+    assert "file_1.txt: FAILED" in result.stdout
+    assert ": OK" not in result.stdout
+    assert "1 computed checksum(s) did NOT match" in result.stderr
+
+
+def test_verify_fail_fast(runner: CliRunner, manifest_file: Path) -> None:
+    for index in range(5):
+        (manifest_file.parent / f"file_{index}.txt").write_text("changed")
+    result = runner.invoke(
+        app, ["manifest", "verify", "--fail-fast", "--workers", "1", str(manifest_file)]
+    )
+    assert result.exit_code == 1
+    assert result.stdout.count("FAILED") == 1
+
+
+def test_verify_precheck(runner: CliRunner, manifest_file: Path) -> None:
+    (manifest_file.parent / "file_2.txt").unlink()
+    result = runner.invoke(
+        app, ["manifest", "verify", "--precheck", str(manifest_file)]
+    )
+    assert result.exit_code == 1
+    assert "file_2.txt: FAILED open or read" in result.stdout
+    assert ": OK" not in result.stdout
@@ -0,0 +1,158 @@
+"""Test cases for the watch module."""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable
+from hashlib import md5
+from pathlib import Path
+
+import pytest
+from pfmsoft_trips.snippets.hash.watch import (
+    Changes,
+    InotifyWatcher,
+    PollingWatcher,
+    inotify_available,
+    watch_tree,
+)
+
+ROOT = Path(__file__).parents[2]
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.05)
+
+
+def test_changes_update():
+    changes = Changes(changed={Path("a")}, removed={Path("b")})
+    changes.update(Changes(changed={Path("b")}, removed={Path("a")}))
+    assert changes.changed == {Path("b")}
+    assert changes.removed == {Path("a")}
+    assert not Changes()
+
+
+@pytest.mark.skipif(not inotify_available(), reason="inotify is not available")
+def test_inotify_watcher(tmp_path: Path):
+    (tmp_path / "old.txt").write_text("old")
+    with InotifyWatcher(tmp_path) as watcher:
+        assert not watcher.read(timeout=0)
+        (tmp_path / "new.txt").write_text("new")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "deep.txt").write_text("deep")
+        (tmp_path / "old.txt").unlink()
+        changes = Changes()
+        while more := watcher.read(timeout=0.2):
+            changes.update(more)
+    assert changes.changed == {tmp_path / "new.txt", tmp_path / "sub" / "deep.txt"}
+    assert changes.removed == {tmp_path / "old.txt"}
+
+
+def test_watch_tree_polling(tmp_path: Path):
+    (tmp_path / "a.txt").write_text("alpha")
+    (tmp_path / "b.txt").write_text("bravo")
+    stop = threading.Event()
+    updates = watch_tree(
+        tmp_path,
+        watcher=PollingWatcher(tmp_path, interval=0.05),
+        debounce=0.05,
+        stop=stop,
+    )
+    try:
+        update = next(updates)
+        assert {result.file_path for result in update.hashed} == {
+            tmp_path / "a.txt",
+            tmp_path / "b.txt",
+        }
+        # Polling compares mtimes, make sure the rewrite is seen as a change.
+        time.sleep(0.01)
+        (tmp_path / "a.txt").write_text("changed")
+        (tmp_path / "b.txt").unlink()
+        update = next(updates)
+        assert [result.file_hash for result in update.hashed] == [
+            md5(b"changed").hexdigest()
+        ]
+        assert update.removed == [tmp_path / "b.txt"]
+        assert set(update.index) == {tmp_path / "a.txt"}
+    finally:
+        stop.set()
+        updates.close()
+
+
+def test_watch_tree_idle_updates(tmp_path: Path):
+    (tmp_path / "a.txt").write_text("alpha")
+    (tmp_path / "index.md5").write_text("skipped")
+    stop = threading.Event()
+    updates = watch_tree(
+        tmp_path,
+        watcher=PollingWatcher(tmp_path, interval=0.05),
+        debounce=0.05,
+        stop=stop,
+        idle_interval=0.1,
+        skip_paths={tmp_path / "index.md5"},
+    )
+    try:
+        update = next(updates)
+        assert set(update.index) == {tmp_path / "a.txt"}
+        time.sleep(0.01)
+        (tmp_path / "index.md5").write_text("rewritten")
+        start = time.monotonic()
+        update = next(updates)
+        assert time.monotonic() - start < 5
+        assert not update.hashed and not update.removed
+        assert set(update.index) == {tmp_path / "a.txt"}
+    finally:
+        stop.set()
+        updates.close()
+
+
+def test_watch_command_index_in_root(tmp_path: Path):
+    (tmp_path / "a.txt").write_text("alpha")
+    index_file = tmp_path / "index.md5"
+    env = dict(os.environ, PYTHONPATH=str(ROOT / "src"))
+    args = [sys.executable, "-m", "pfmsoft_trips.cli.main_typer", "watch"]
+    args += ["--no-cache", "--index", str(index_file), "--index-interval", "1"]
+    args += ["--debounce", "0.05", str(tmp_path)]
+    with subprocess.Popen(args, env=env, stdout=subprocess.PIPE) as process:
+        try:
+            wait_for(index_file.exists)
+            # Within the interval of the first write, so it is held back, and
+            # written once the interval has passed, with no further changes.
+            (tmp_path / "b.txt").write_text("bravo")
+            wait_for(lambda: "b.txt" in index_file.read_text(), timeout=5)
+            time.sleep(1.5)
+            index_text = index_file.read_text()
+        finally:
+            process.send_signal(signal.SIGTERM)
+            stdout, _ = process.communicate(timeout=10)
+    assert process.returncode == 0
+    assert "index.md5" not in index_text
+    assert "index.md5" not in stdout.decode()
+    assert index_text.count("\n") == 2
+
+
+def test_watch_command(tmp_path: Path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.txt").write_text("alpha")
+    index_file = tmp_path / "index.md5"
+    env = dict(os.environ, PYTHONPATH=str(ROOT / "src"))
+    args = [sys.executable, "-m", "pfmsoft_trips.cli.main_typer", "watch"]
+    args += ["--no-cache", "--index", str(index_file), "--index-interval", "0"]
+    args += ["--debounce", "0.05", str(data_dir)]
+    with subprocess.Popen(args, env=env, stdout=subprocess.PIPE) as process:
+        try:
+            wait_for(index_file.exists)
+            (data_dir / "b.txt").write_text("bravo")
+            wait_for(lambda: "b.txt" in index_file.read_text())
+        finally:
+            process.send_signal(signal.SIGTERM)
+            stdout, _ = process.communicate(timeout=10)
+    assert process.returncode == 0
+    assert f"{md5(b'bravo').hexdigest()}  {data_dir / 'b.txt'}" in stdout.decode()
+    assert index_file.read_text().count("\n") == 2